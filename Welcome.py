@@ -4,23 +4,27 @@ from __future__ import annotations
 from datetime import datetime, timezone
 
 import streamlit as st
-from supabase import create_client
 
-from lib.ui import apply_speakeasy_theme, card
-from lib.device_token import get_or_create_device_token
+from lib.catalog import get_catalog
+from lib.digest import get_digest
+from lib.metrics import track_rerun
+from lib.ui import apply_speakeasy_theme, card, since_last_visit
+from lib.ratelimit import SESSION_LIMITER, rejection_message
+from lib.resilience import execute
+from lib.session import remember_display_name, resolve_identity
+from lib.supabase_client import get_client
+from lib.warmup import warm_start
 
 
 # ============================================================
 # SETUP
 # ============================================================
+track_rerun("welcome")
 st.set_page_config(page_title="Welcome", page_icon="🥃", layout="centered")
 apply_speakeasy_theme()
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
-sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-
-device_token = get_or_create_device_token()
+sb = get_client()
+warm = warm_start()
 
 
 def utc_now_iso() -> str:
@@ -30,29 +34,8 @@ def utc_now_iso() -> str:
 # ============================================================
 # IDENTITY RESTORE (device_sessions -> display_name)
 # ============================================================
-if "display_name" not in st.session_state or not (st.session_state.get("display_name") or "").strip():
-    try:
-        rows = (
-            sb.table("device_sessions")
-            .select("display_name")
-            .eq("token", device_token)
-            .limit(1)
-            .execute()
-            .data
-        ) or []
-
-        if rows and (rows[0].get("display_name") or "").strip():
-            st.session_state["display_name"] = rows[0]["display_name"].strip()
-
-            # best-effort touch
-            try:
-                sb.table("device_sessions").update(
-                    {"last_seen_at": utc_now_iso()}
-                ).eq("token", device_token).execute()
-            except Exception:
-                pass
-    except Exception:
-        pass
+identity = resolve_identity()
+device_token = identity.device_token
 
 
 # ============================================================
@@ -68,6 +51,14 @@ if display_name:
 else:
     st.sidebar.warning("No drinking name set")
 
+if identity.error:
+    st.sidebar.caption("Couldn't reach the server to restore your drinking name.")
+
+if warm["running"]:
+    st.sidebar.caption("Some shared data is still loading; pages may be slower at first.")
+elif warm["failed"]:
+    st.sidebar.caption("Some shared data couldn't be preloaded; it will load when first used.")
+
 
 # ============================================================
 # MAIN
@@ -77,6 +68,12 @@ st.caption(
     "Walk into a good bar, overhear what’s worth ordering, "
     "and leave a note for the next person."
 )
+
+try:
+    since_last_visit(get_digest(device_token, identity.last_visit_at), get_catalog().label_of)
+except Exception:
+    pass  # the digest is a nicety; Welcome must load without the backend
+
 st.divider()
 
 # ------------------------------------------------------------
@@ -96,36 +93,56 @@ if st.button("Save name", disabled=save_disabled):
     clean = name_input.strip()
     st.session_state["display_name"] = clean
 
-    # Upsert device_sessions row keyed by token
-    try:
-        existing = (
-            sb.table("device_sessions")
-            .select("id")
-            .eq("token", device_token)
-            .limit(1)
-            .execute()
-            .data
-        ) or []
-
-        if existing:
-            sb.table("device_sessions").update(
-                {
-                    "display_name": clean,
-                    "last_seen_at": utc_now_iso(),
-                }
-            ).eq("token", device_token).execute()
-        else:
-            sb.table("device_sessions").insert(
-                {
-                    "token": device_token,
-                    "display_name": clean,
-                    "last_seen_at": utc_now_iso(),
-                }
-            ).execute()
-
-    except Exception:
-        # If Supabase write fails, keep local session value
-        pass
+    decision = SESSION_LIMITER.admit(device_token, {"display_name": clean})
+    if not decision.allowed and decision.reason != "duplicate":
+        st.warning(rejection_message(decision))
+        st.stop()
+
+    # Upsert device_sessions row keyed by token (a repeat of the same save is coalesced)
+    if decision.allowed:
+        try:
+            existing = (
+                execute(
+                    sb.table("device_sessions")
+                    .select("id")
+                    .eq("token", device_token)
+                    .limit(1),
+                    table="device_sessions",
+                ).data
+            ) or []
+
+            if existing:
+                execute(
+                    sb.table("device_sessions")
+                    .update(
+                        {
+                            "display_name": clean,
+                            "last_seen_at": utc_now_iso(),
+                        }
+                    )
+                    .eq("token", device_token),
+                    table="device_sessions",
+                    op="update",
+                )
+            else:
+                execute(
+                    sb.table("device_sessions").insert(
+                        {
+                            "token": device_token,
+                            "display_name": clean,
+                            "last_seen_at": utc_now_iso(),
+                        }
+                    ),
+                    table="device_sessions",
+                    op="insert",
+                )
+
+            SESSION_LIMITER.record(device_token, {"display_name": clean})
+            remember_display_name(device_token, clean)
+        except Exception as e:
+            # Keep the local session value; it just won't follow this device yet
+            st.warning(f"Name kept for this visit, but couldn't save it to the server: {e}")
+            st.stop()
 
     st.success("Name saved.")
     st.rerun()
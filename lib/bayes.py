@@ -0,0 +1,89 @@
+# lib/bayes.py
+# Bayesian-shrunk bottle scores for Rankings.
+#
+# Normal-normal empirical Bayes over the per-bottle aggregate table:
+#   prior        bottle mean ~ N(mu, tau^2), mu = pour-weighted global mean
+#   likelihood   pour ratings ~ N(bottle mean, sigma^2)
+#   posterior    score = (m * mu + n * avg) / (m + n), sd = sigma / sqrt(m + n), m = sigma^2 / tau^2
+# sigma^2 is the pooled within-bottle variance (default when the aggregates carry no
+# sum of squares) and tau^2 comes from the method of moments. One NumPy pass over all
+# bottles; the result is memoized on the aggregates dict, i.e. once per cached version.
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Used when the aggregates have no rating_sumsq (per-device / per-location tables)
+DEFAULT_RATING_SD = 1.5
+# Two-sided 95% normal quantile
+Z_95 = 1.959963984540054
+RATING_MIN, RATING_MAX = 1.0, 10.0
+
+_MEMO_KEY = "_shrunk"
+
+
+@dataclass(frozen=True)
+class Shrunk:
+    prior_mean: float
+    # Pseudo-pours of prior weight every bottle starts with
+    prior_strength: float
+    # Aligned with the aggregate rows
+    score: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+def shrink(n: np.ndarray, avg: np.ndarray, sumsq: np.ndarray | None = None, z: float = Z_95) -> Shrunk:
+    n = np.asarray(n, dtype=np.float64)
+    avg = np.asarray(avg, dtype=np.float64)
+    total = n.sum()
+    if total <= 0:
+        empty = np.empty(0)
+        return Shrunk(float("nan"), 0.0, empty, empty, empty)
+
+    mu = float(np.dot(n, avg) / total)
+
+    if sumsq is not None and total > len(n):
+        within = float((np.asarray(sumsq, dtype=np.float64) - n * avg**2).sum() / (total - len(n)))
+    else:
+        within = DEFAULT_RATING_SD**2
+    within = max(within, 1e-6)
+
+    # Pour-weighted spread of bottle means is tau^2 + sigma^2 * (bottles / pours)
+    spread = float(np.dot(n, (avg - mu) ** 2) / total)
+    tau2 = max(spread - within * len(n) / total, within / 100)
+    m = within / tau2
+
+    post_n = m + n
+    score = (m * mu + n * avg) / post_n
+    half = z * np.sqrt(within / post_n)
+    return Shrunk(
+        prior_mean=mu,
+        prior_strength=m,
+        score=score,
+        lower=np.clip(score - half, RATING_MIN, RATING_MAX),
+        upper=np.clip(score + half, RATING_MIN, RATING_MAX),
+    )
+
+
+def shrink_aggregates(aggs: dict) -> Shrunk:
+    """
+    Shrunk scores for get_ranking_aggregates() output, aligned with aggs["rows"].
+    Cached aggregates are shared objects, so the arrays are computed once per version.
+    """
+    memo = aggs.get(_MEMO_KEY)
+    if memo is not None:
+        return memo
+
+    rows = aggs["rows"]
+    count = len(rows)
+    n = np.fromiter((r["rating_count"] for r in rows), dtype=np.float64, count=count)
+    avg = np.fromiter((r["avg_rating"] for r in rows), dtype=np.float64, count=count)
+    sumsq = None
+    if count and "rating_sumsq" in rows[0]:
+        sumsq = np.fromiter((r["rating_sumsq"] for r in rows), dtype=np.float64, count=count)
+
+    memo = shrink(n, avg, sumsq)
+    aggs[_MEMO_KEY] = memo
+    return memo
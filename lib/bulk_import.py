@@ -0,0 +1,178 @@
+# lib/bulk_import.py
+# Bulk pour import (tasting nights): CSV -> validated event payloads -> batched inserts.
+#
+# Expected columns (header names are matched loosely):
+#   bottle (required), rating (required, 1-10), notes, location
+#
+# Each row gets a client_ref derived from the device, the file's hash and the line
+# number, and rows are upserted on it with ignore_duplicates (the write-behind queue's
+# events.client_ref). Re-uploading a file after a partial failure posts only the rows
+# that are missing.
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from lib.cache import get_cache
+from lib.catalog import Catalog, clean_text
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+INSERT_CHUNK_SIZE = 100
+MAX_ROWS = 500
+PLAN_TTL_SECONDS = 900
+
+# Plans by (file hash, catalog version, name, device): an upload is parsed and matched
+# once, not on every rerun of the page it sits on
+_plan_cache = get_cache("import_plans", ttl=PLAN_TTL_SECONDS, max_entries=64)
+
+HEADER_ALIASES = {
+    "bottle": ("bottle", "bottle name", "bottle_name", "name", "label"),
+    "rating": ("rating", "score"),
+    "notes": ("notes", "note", "message", "comments"),
+    "location": ("location", "where", "bar"),
+}
+
+
+class ImportInterrupted(RuntimeError):
+    """A chunk failed. `saved` rows from earlier chunks are posted; re-running is safe."""
+
+    def __init__(self, saved: int, cause: BaseException):
+        super().__init__(str(cause))
+        self.saved = saved
+        self.cause = cause
+
+
+@dataclass
+class ImportPlan:
+    # Ready-to-insert event payloads, in file order
+    payloads: list[dict] = field(default_factory=list)
+    # (line number, message) for rows that were skipped
+    problems: list[tuple[int, str]] = field(default_factory=list)
+    # (line number, typed name, resolved label) where the name was not an exact match
+    fuzzy: list[tuple[int, str, str]] = field(default_factory=list)
+
+
+def _column_map(fieldnames: list[str]) -> dict[str, Optional[str]]:
+    normalized = {clean_text(f).lower(): f for f in fieldnames if f}
+    out: dict[str, Optional[str]] = {}
+    for col, aliases in HEADER_ALIASES.items():
+        out[col] = next((normalized[a] for a in aliases if a in normalized), None)
+    return out
+
+
+def _parse_rating(raw: str) -> Optional[int]:
+    try:
+        val = float(clean_text(raw))
+    except ValueError:
+        return None
+    if val != int(val) or not 1 <= val <= 10:
+        return None
+    return int(val)
+
+
+def import_ref(device_token: str, file_hash: str, line: int) -> str:
+    """Same device, same file, same line -> same client_ref, so a re-upload is ignored."""
+    return "import-" + hashlib.sha1(f"{device_token}:{file_hash}:{line}".encode("utf-8")).hexdigest()[:32]
+
+
+def plan_import(
+    csv_text: str,
+    catalog: Catalog,
+    display_name: str,
+    device_token: str,
+) -> ImportPlan:
+    """
+    Validate the whole file up front. Bottle names resolve against the catalog in one
+    pass (normalized exact match, then a confident fuzzy match); nothing is written.
+    """
+    plan = ImportPlan()
+    reader = csv.DictReader(io.StringIO(csv_text))
+    cols = _column_map(reader.fieldnames or [])
+
+    if not cols["bottle"] or not cols["rating"]:
+        plan.problems.append((1, "Header must include a bottle name column and a rating column."))
+        return plan
+
+    # Spread created_at by a microsecond per row so the import keeps file order
+    base = datetime.now(timezone.utc)
+    file_hash = hashlib.sha1(csv_text.encode("utf-8")).hexdigest()
+
+    for i, row in enumerate(reader):
+        line = i + 2  # 1-based, after the header
+        if i >= MAX_ROWS:
+            plan.problems.append((line, f"Only the first {MAX_ROWS} rows are imported."))
+            break
+
+        name = clean_text(row.get(cols["bottle"]))
+        raw_rating = row.get(cols["rating"]) or ""
+        if not name and not clean_text(raw_rating):
+            continue  # blank line
+
+        bottle_id, suggestions = catalog.resolve(name)
+        if bottle_id is None:
+            hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+            plan.problems.append((line, f"No catalog bottle matches '{name}'.{hint}"))
+            continue
+
+        rating = _parse_rating(raw_rating)
+        if rating is None:
+            plan.problems.append((line, f"Rating '{clean_text(raw_rating)}' is not a whole number from 1 to 10."))
+            continue
+
+        label = catalog.label_of(bottle_id)
+        if name.lower() != label.lower():
+            plan.fuzzy.append((line, name, label))
+
+        notes = (row.get(cols["notes"]) or "").strip() if cols["notes"] else ""
+        location = clean_text(row.get(cols["location"])) if cols["location"] else ""
+
+        plan.payloads.append(
+            {
+                "event_type": "having_a_glass",
+                "bottle_id": bottle_id,
+                "message": notes or None,
+                "rating": rating,
+                "location": location or None,
+                "author_display_name": display_name,
+                "author_device_token": device_token,
+                "created_at": (base + timedelta(microseconds=i)).isoformat(),
+                "client_ref": import_ref(device_token, file_hash, line),
+            }
+        )
+
+    return plan
+
+
+def get_import_plan(raw: bytes, catalog: Catalog, display_name: str, device_token: str) -> ImportPlan:
+    """plan_import for an uploaded file, cached until the file or the catalog changes."""
+    key = (hashlib.sha1(raw).hexdigest(), catalog.version, len(catalog), display_name, device_token)
+    return _plan_cache.get_or_load(
+        key,
+        lambda: plan_import(raw.decode("utf-8-sig", errors="replace"), catalog, display_name, device_token),
+    )
+
+
+def insert_pours(payloads: list[dict]) -> int:
+    """
+    Upsert in chunks of INSERT_CHUNK_SIZE, skipping rows already posted. Returns the rows
+    newly inserted; raises ImportInterrupted (with the count saved so far) if a chunk fails.
+    """
+    sb = get_client()
+    inserted = 0
+    for i in range(0, len(payloads), INSERT_CHUNK_SIZE):
+        chunk = payloads[i : i + INSERT_CHUNK_SIZE]
+        try:
+            res = execute(
+                sb.table("events").upsert(chunk, on_conflict="client_ref", ignore_duplicates=True),
+                table="events",
+                op="insert",
+            )
+        except Exception as e:
+            raise ImportInterrupted(inserted, e) from e
+        inserted += len(res.data or [])
+    return inserted
@@ -0,0 +1,230 @@
+# lib/cache.py
+# Process-wide caches shared by every Streamlit session.
+#
+# lib modules are imported once per server process, so module-level state here
+# outlives reruns and sessions. Page scripts re-execute on every rerun and must not
+# hold caches themselves.
+#
+# Caches created with shared=True are also backed by lib/shared_cache.py, so several
+# server processes on one host load each entry from the backend once between them.
+#
+# When a refresh fails and an older value exists, get_or_load() serves that value and
+# records a stale notice (lib.resilience) instead of raising to the page.
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from lib.resilience import note_stale
+from lib.shared_cache import SharedStore
+
+_MISSING = object()
+
+# Shared caches sweep entries older than a few TTLs once every this many writes
+_PRUNE_EVERY = 200
+
+
+class TTLCache:
+    """
+    Thread-safe TTL cache with optional LRU bound.
+
+    get_or_load() is single-flight per key: concurrent misses for the same key wait
+    for one loader call instead of each hitting the backend. With a shared store the
+    same holds across processes, and a local entry is dropped as soon as another
+    process replaces or invalidates the shared copy.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: Optional[float] = 60.0,
+        max_entries: Optional[int] = None,
+        shared: bool = False,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._shared = SharedStore(name) if shared else None
+
+        # key -> (value, stored_at monotonic, shared file token or None)
+        self._data: OrderedDict[Hashable, tuple[Any, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: dict[Hashable, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self.stale_served = 0
+        self._writes = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and (time.monotonic() - stored_at) > self.ttl
+
+    def _fresh(self, key: Hashable, entry) -> bool:
+        if entry is _MISSING or self._expired(entry[1]):
+            return False
+        # Another process refreshed or invalidated the shared copy
+        if self._shared is not None and self._shared.token(key) != entry[2]:
+            return False
+        return True
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        fresh = self._fresh(key, entry)
+        with self._lock:
+            if not fresh:
+                self.misses += 1
+                return default
+            if key in self._data:
+                self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a value even if expired (for stale fallbacks). Does not touch stats."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        token = None
+        if self._shared is not None:
+            _, token = self._shared.write(key, value)
+            self._writes += 1
+            if self.ttl is not None and self._writes % _PRUNE_EVERY == 0:
+                self._shared.prune(older_than=self.ttl * 4)
+        self._set_local(key, value, time.monotonic(), token)
+
+    def _set_local(self, key: Hashable, value: Any, stored_at: float, token) -> None:
+        with self._lock:
+            self._data[key] = (value, stored_at, token)
+            self._data.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have finished the load while we waited
+            with self._lock:
+                entry = self._data.get(key, _MISSING)
+            if self._fresh(key, entry):
+                return entry[0]
+            try:
+                return self._load(key, loader)
+            except Exception:
+                stale = self._last_good(key)
+                if stale is _MISSING:
+                    raise
+                value, age = stale
+                with self._lock:
+                    self.stale_served += 1
+                note_stale(self.name, age)
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        if self._shared is None:
+            value = loader()
+            self.set(key, value)
+            return value
+
+        value = self._adopt_shared(key)
+        if value is not _MISSING:
+            return value
+        with self._shared.lock(key):
+            # Another process may have finished the load while we waited
+            value = self._adopt_shared(key)
+            if value is _MISSING:
+                value = loader()
+                self.set(key, value)
+            return value
+
+    def _last_good(self, key: Hashable) -> Any:
+        """(value, age seconds) of the newest copy regardless of TTL, or _MISSING."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            return entry[0], time.monotonic() - entry[1]
+        if self._shared is not None:
+            found = self._shared.read(key)
+            if found is not None:
+                return found[2], max(0.0, time.time() - found[1])
+        return _MISSING
+
+    def _adopt_shared(self, key: Hashable) -> Any:
+        """Copy a still-fresh shared entry into this process, or return _MISSING."""
+        found = self._shared.read(key)
+        if found is None:
+            return _MISSING
+        _, stored_at, value, token = found
+        age = max(0.0, time.time() - stored_at)
+        if self.ttl is not None and age > self.ttl:
+            return _MISSING
+        self._set_local(key, value, time.monotonic() - age, token)
+        with self._lock:
+            self.shared_hits += 1
+        return value
+
+    def invalidate(self, key: Hashable = _MISSING) -> None:
+        """Drop entries here and, for shared caches, in every process on the host."""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        if self._shared is not None:
+            if key is _MISSING:
+                self._shared.clear()
+            else:
+                self._shared.delete(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared_hits": self.shared_hits,
+                "stale_served": self.stale_served,
+            }
+
+
+_registry: dict[str, TTLCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(
+    name: str,
+    ttl: Optional[float] = 60.0,
+    max_entries: Optional[int] = None,
+    shared: bool = False,
+) -> TTLCache:
+    """Return the process-wide cache called `name`, creating it on first use."""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = TTLCache(name, ttl=ttl, max_entries=max_entries, shared=shared)
+            _registry[name] = cache
+        return cache
+
+
+def all_caches() -> list[TTLCache]:
+    with _registry_lock:
+        return list(_registry.values())
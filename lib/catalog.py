@@ -0,0 +1,357 @@
+# lib/catalog.py
+# Bottle catalog shared by all sessions: compact columns, sorted labels, search and match keys.
+from __future__ import annotations
+
+import bisect
+import difflib
+import math
+import re
+import sys
+import threading
+from array import array
+from dataclasses import dataclass, field
+from typing import Container, Iterator, Optional, Sequence
+
+from postgrest.exceptions import APIError
+
+from lib.cache import get_cache
+from lib.db import iter_keyset_rows
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+CATALOG_COLUMNS = (
+    "id, brand, expression, category, mashbill_style, proof, "
+    "distillery, distillery_location, barrel_type"
+)
+# Freshness comes from the version check; the TTL is only a backstop
+CATALOG_TTL_SECONDS = 3600
+# How long a catalog_version read is trusted before asking again
+VERSION_TTL_SECONDS = 5
+
+# difflib ratio a free-typed name must reach to auto-resolve to a catalog bottle
+FUZZY_CUTOFF = 0.88
+
+_catalog_cache = get_cache("catalog", ttl=CATALOG_TTL_SECONDS, max_entries=1, shared=True)
+_version_cache = get_cache("catalog_version", ttl=VERSION_TTL_SECONDS, max_entries=1, shared=True)
+_refresh_lock = threading.Lock()
+
+
+def clean_text(s: str | None) -> str:
+    s = (s or "").strip()
+    s = re.sub(r"\s+", " ", s)
+    return s
+
+
+def norm_key(s: str | None) -> str:
+    return clean_text(s).lower()
+
+
+def match_key(s: str | None) -> str:
+    """Looser than norm_key: drops punctuation, so "Maker's Mark - 46" == "makers mark 46"."""
+    s = re.sub(r"[^0-9a-z ]+", "", norm_key(s).replace("-", " "))
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def bottle_label(b: dict) -> str:
+    brand = clean_text(b.get("brand"))
+    expr = clean_text(b.get("expression"))
+    return f"{brand} - {expr}" if expr else brand
+
+
+# Catalog text columns, stored as indexes into one interned string pool
+TEXT_COLUMNS = (
+    "brand",
+    "expression",
+    "category",
+    "mashbill_style",
+    "distillery",
+    "distillery_location",
+    "barrel_type",
+)
+
+# Separator for the packed label/key blobs; clean_text() never leaves one in a label
+_SEP = "\n"
+
+
+def _pack(texts: list[str]) -> tuple[str, array]:
+    """Join texts into one blob; text i is blob[off[i]:off[i + 1] - 1]."""
+    offsets = array("I", [0])
+    pos = 0
+    for t in texts:
+        pos += len(t) + 1
+        offsets.append(pos)
+    return _SEP.join(texts) + _SEP if texts else "", offsets
+
+
+def _bisect_packed(blob: str, offsets: array, target: str) -> Optional[int]:
+    """Position of `target` in a packed, sorted blob, or None."""
+    lo, hi = 0, len(offsets) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if blob[offsets[mid] : offsets[mid + 1] - 1] < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(offsets) - 1 and blob[offsets[lo] : offsets[lo + 1] - 1] == target:
+        return lo
+    return None
+
+
+@dataclass(frozen=True)
+class Catalog:
+    """
+    Immutable, columnar catalog. One copy per cache version is shared by every session
+    (and pickled as-is into the cross-process store), so nothing here is per-row Python
+    objects: rows are positions into arrays, ordered by id.
+    """
+
+    # Bottle ids in ascending order: array("q") for integer ids, a tuple otherwise
+    ids: Sequence = field(repr=False)
+    # Interned string pool; index 0 is None
+    strings: tuple = field(repr=False)
+    # column -> array("I") of pool indexes, aligned with ids
+    text_columns: dict = field(repr=False)
+    # Proof per row, NaN when missing
+    proof: array = field(repr=False)
+    # Unique labels in sorted order, packed, with the row each one points to
+    label_blob: str = field(repr=False)
+    label_offsets: array = field(repr=False)
+    label_rows: array = field(repr=False)
+    # Lower-cased labels aligned with the sorted labels, for substring search
+    search_blob: str = field(repr=False)
+    search_offsets: array = field(repr=False)
+    # match_key(label) in sorted order, for resolving free-typed names
+    key_blob: str = field(repr=False)
+    key_offsets: array = field(repr=False)
+    key_rows: array = field(repr=False)
+    # catalog_version.version this catalog reflects; -1 when unknown
+    version: int = -1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, bottle_id) -> bool:
+        return self.row_index(bottle_id) is not None
+
+    def row_index(self, bottle_id) -> Optional[int]:
+        """Position of the bottle in the id-ordered columns, or None."""
+        try:
+            i = bisect.bisect_left(self.ids, bottle_id)
+        except TypeError:
+            return None
+        if i < len(self.ids) and self.ids[i] == bottle_id:
+            return i
+        return None
+
+    def _text(self, column: str, i: int) -> Optional[str]:
+        return self.strings[self.text_columns[column][i]]
+
+    def _row_dict(self, i: int) -> dict:
+        out = {"id": self.ids[i]}
+        for col in TEXT_COLUMNS:
+            out[col] = self._text(col, i)
+        proof = self.proof[i]
+        out["proof"] = None if math.isnan(proof) else proof
+        return out
+
+    def rows(self) -> Iterator[dict]:
+        for i in range(len(self.ids)):
+            yield self._row_dict(i)
+
+    def row(self, bottle_id) -> Optional[dict]:
+        """The bottle as a plain dict (built on demand), or None if not in the catalog."""
+        i = self.row_index(bottle_id)
+        return None if i is None else self._row_dict(i)
+
+    def label_of(self, bottle_id) -> Optional[str]:
+        i = self.row_index(bottle_id)
+        if i is None:
+            return None
+        return bottle_label({"brand": self._text("brand", i), "expression": self._text("expression", i)})
+
+    def id_for_label(self, label: str) -> Optional[object]:
+        pos = _bisect_packed(self.label_blob, self.label_offsets, label)
+        return None if pos is None else self.ids[self.label_rows[pos]]
+
+    def id_for_key(self, key: str) -> Optional[object]:
+        """Exact lookup by match_key(label), e.g. to dedupe incoming bottles."""
+        pos = _bisect_packed(self.key_blob, self.key_offsets, key)
+        return None if pos is None else self.ids[self.key_rows[pos]]
+
+    @property
+    def labels(self) -> list[str]:
+        """All unique labels, sorted. Built per call; use search() for a subset."""
+        return self.label_blob.split(_SEP)[:-1]
+
+    def search(self, text: str, rows: Optional[Container[int]] = None) -> list[str]:
+        """Labels containing `text`; only those whose row is in `rows` if given (e.g. a facet match)."""
+        s = norm_key(text)
+        if not s:
+            if rows is None:
+                return self.labels
+            return [lab for lab, r in zip(self.labels, self.label_rows) if r in rows]
+        blob, offs = self.search_blob, self.search_offsets
+        out = []
+        pos = blob.find(s)
+        while pos != -1:
+            i = bisect.bisect_right(offs, pos) - 1
+            if rows is None or self.label_rows[i] in rows:
+                out.append(self.label_blob[self.label_offsets[i] : self.label_offsets[i + 1] - 1])
+            # Skip the rest of this label; one hit per label
+            pos = blob.find(s, offs[i + 1])
+        return out
+
+    def resolve(self, name: str) -> tuple[Optional[object], list[str]]:
+        """
+        Map a typed bottle name to (bottle_id, suggestions).
+        Exact normalized match first, then a single confident fuzzy match.
+        bottle_id is None when nothing (or more than one thing) fits; suggestions
+        then lists the closest labels.
+        """
+        k = match_key(name)
+        if not k:
+            return None, []
+        exact = self.id_for_key(k)
+        if exact is not None:
+            return exact, []
+
+        keys = self.key_blob.split(_SEP)[:-1]
+        close = difflib.get_close_matches(k, keys, n=3, cutoff=0.6)
+        rows = [self.key_rows[_bisect_packed(self.key_blob, self.key_offsets, c)] for c in close]
+        if close:
+            best = difflib.SequenceMatcher(None, k, close[0]).ratio()
+            runner_up = difflib.SequenceMatcher(None, k, close[1]).ratio() if len(close) > 1 else 0.0
+            if best >= FUZZY_CUTOFF and best - runner_up > 0.03:
+                return self.ids[rows[0]], []
+        return None, [self.label_of(self.ids[r]) for r in rows]
+
+
+def build_catalog(bottles: list[dict], version: int = -1) -> Catalog:
+    rows = sorted(bottles, key=lambda b: b["id"])
+    raw_ids = [b["id"] for b in rows]
+    if all(isinstance(x, int) for x in raw_ids):
+        ids: Sequence = array("q", raw_ids)
+    else:
+        ids = tuple(raw_ids)
+
+    pool: dict[str, int] = {}
+    strings: list[Optional[str]] = [None]
+
+    def intern_idx(v) -> int:
+        if v is None:
+            return 0
+        v = sys.intern(str(v))
+        idx = pool.get(v)
+        if idx is None:
+            idx = pool[v] = len(strings)
+            strings.append(v)
+        return idx
+
+    text_columns = {col: array("I", (intern_idx(b.get(col)) for b in rows)) for col in TEXT_COLUMNS}
+    proof = array("d", (float(b["proof"]) if b.get("proof") is not None else math.nan for b in rows))
+
+    # Later rows win on duplicate labels / keys, as a dict build would
+    label_row: dict[str, int] = {}
+    for i, b in enumerate(rows):
+        label_row[bottle_label(b)] = i
+    labels = sorted(label_row)
+    key_row = {match_key(lab): label_row[lab] for lab in labels}
+    keys = sorted(key_row)
+
+    label_blob, label_offsets = _pack(labels)
+    search_blob, search_offsets = _pack([lab.lower() for lab in labels])
+    key_blob, key_offsets = _pack(keys)
+    return Catalog(
+        ids=ids,
+        strings=tuple(strings),
+        text_columns=text_columns,
+        proof=proof,
+        label_blob=label_blob,
+        label_offsets=label_offsets,
+        label_rows=array("I", (label_row[lab] for lab in labels)),
+        search_blob=search_blob,
+        search_offsets=search_offsets,
+        key_blob=key_blob,
+        key_offsets=key_offsets,
+        key_rows=array("I", (key_row[k] for k in keys)),
+        version=version,
+    )
+
+
+def fetch_catalog_version() -> Optional[tuple[int, int]]:
+    """(version, row_count) from catalog_version, or None if the table is not there."""
+    try:
+        res = execute(
+            get_client().table("catalog_version").select("version, row_count").limit(1),
+            table="catalog_version",
+        )
+    except APIError:
+        return None
+    row = (res.data or [None])[0]
+    return (int(row["version"]), int(row["row_count"])) if row else None
+
+
+def get_catalog_version() -> Optional[tuple[int, int]]:
+    return _version_cache.get_or_load("version", fetch_catalog_version)
+
+
+def fetch_catalog() -> Catalog:
+    # Version first: rows written after it are fetched again next time, never missed
+    current = fetch_catalog_version()
+    # Paged so the catalog is not truncated at PostgREST's max-rows
+    rows = list(iter_keyset_rows(get_client(), "bottles", CATALOG_COLUMNS, keys=("id",)))
+    return build_catalog(rows, version=current[0] if current else -1)
+
+
+def refresh_catalog(prev: Catalog, version: int, row_count: int) -> Catalog:
+    """
+    Bring `prev` up to `version`: fetch only rows with a newer row_version and merge.
+    Falls back to a full fetch when rows were deleted (the merged count does not match).
+    """
+    if prev.version < 0:
+        return fetch_catalog()
+    changed = list(
+        iter_keyset_rows(
+            get_client(),
+            "bottles",
+            CATALOG_COLUMNS,
+            keys=("id",),
+            filters=lambda q: q.gt("row_version", prev.version),
+        )
+    )
+    merged = {b["id"]: b for b in prev.rows()}
+    merged.update((b["id"], b) for b in changed)
+    if len(merged) != row_count:
+        return fetch_catalog()
+    return build_catalog(list(merged.values()), version=version)
+
+
+def get_catalog() -> Catalog:
+    """
+    The shared catalog, refreshed when catalog_version moves (checked at most every
+    VERSION_TTL_SECONDS). If the check or the refresh fails, the catalog in hand is served.
+    """
+    catalog = _catalog_cache.get_or_load("catalog", fetch_catalog)
+    try:
+        current = get_catalog_version()
+    except Exception:
+        return catalog
+    if current is None or current == (catalog.version, len(catalog)):
+        return catalog
+
+    with _refresh_lock:
+        # Another thread (or process, via the shared store) may have refreshed already
+        catalog = _catalog_cache.get("catalog") or catalog
+        if current == (catalog.version, len(catalog)):
+            return catalog
+        try:
+            catalog = refresh_catalog(catalog, *current)
+        except Exception:
+            return catalog
+        _catalog_cache.set("catalog", catalog)
+        return catalog
+
+
+def invalidate_catalog() -> None:
+    """After a bottles write: the next get_catalog() re-checks the version and fetches the delta."""
+    _version_cache.invalidate()
@@ -0,0 +1,76 @@
+# lib/db.py
+from __future__ import annotations
+
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+from lib.resilience import execute
+
+PAGE_SIZE = 1000
+
+
+def _pg_value(v: Any) -> str:
+    # PostgREST filter strings reserve , . : ( ) so quote anything that is not a plain number
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return str(v)
+    s = str(v).replace('"', '\\"')
+    return f'"{s}"'
+
+
+def iter_keyset_pages(
+    sb,
+    table: str,
+    columns: str,
+    keys: Sequence[str] = ("created_at", "id"),
+    after: Optional[Sequence[Any]] = None,
+    page_size: int = PAGE_SIZE,
+    filters: Optional[Callable[[Any], Any]] = None,
+) -> Iterator[list[dict]]:
+    """
+    Page through a table in key order without OFFSET.
+
+    Each page starts strictly after the last row of the previous one:
+      - one key:  key > last
+      - two keys: (k1, k2) > (last1, last2), i.e. k1 > a OR (k1 = a AND k2 > b)
+
+    `filters` receives the query builder and returns it with extra filters applied.
+    `after` resumes from a saved cursor (a tuple of key values).
+    The key columns must be part of `columns`.
+    """
+    if len(keys) not in (1, 2):
+        raise ValueError("keyset pagination supports one or two key columns")
+
+    cursor = tuple(after) if after else None
+
+    while True:
+        q = sb.table(table).select(columns)
+        if filters is not None:
+            q = filters(q)
+
+        if cursor is not None:
+            if len(keys) == 1:
+                q = q.gt(keys[0], cursor[0])
+            else:
+                k1, k2 = keys
+                a, b = _pg_value(cursor[0]), _pg_value(cursor[1])
+                q = q.or_(f"{k1}.gt.{a},and({k1}.eq.{a},{k2}.gt.{b})")
+
+        for k in keys:
+            q = q.order(k)
+
+        rows = (execute(q.limit(page_size), table=table).data) or []
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < page_size:
+            return
+
+        last = rows[-1]
+        cursor = tuple(last.get(k) for k in keys)
+
+
+def iter_keyset_rows(sb, table: str, columns: str, **kwargs) -> Iterator[dict]:
+    """Row-at-a-time view over iter_keyset_pages."""
+    for page in iter_keyset_pages(sb, table, columns, **kwargs):
+        yield from page
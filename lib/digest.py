@@ -0,0 +1,140 @@
+# lib/digest.py
+# "Since your last visit": new pours, new bottles and rank movement since the device's
+# previous device_sessions.last_seen_at (read once per browser session, lib/session.py).
+#
+# Every read goes forward from that cursor on an index: a head count over
+# events.created_at, the bottles created after it, and bottle_daily_stats from its day
+# on. The daily sums are shared by every device whose last visit fell on that day.
+# Rank movement subtracts them from the materialized all-time board, so no event is
+# scanned; it is day-granular (earlier pours on the day of the last visit count as new).
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from lib.cache import get_cache
+from lib.db import iter_keyset_rows
+from lib.rankings import get_ranking_aggregates
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+DIGEST_TTL_SECONDS = 600
+# A longer absence is summarized as "the last 30 days"
+DIGEST_MAX_DAYS = 30
+# Rank movement is tracked for the top of the all-time average board
+MOVERS_TOP_N = 25
+MOVERS_MIN_RATINGS = 3
+MOVERS_MAX = 5
+BUSIEST_MAX = 5
+NEW_BOTTLES_MAX = 5
+
+_digest_cache = get_cache("visit_digest", ttl=DIGEST_TTL_SECONDS, max_entries=5000)
+_daily_since_cache = get_cache("daily_since", ttl=DIGEST_TTL_SECONDS, max_entries=DIGEST_MAX_DAYS + 1, shared=True)
+
+
+def digest_cursor(last_visit_at: Optional[str]) -> Optional[datetime]:
+    """The digest's start: the previous visit, clamped to DIGEST_MAX_DAYS ago."""
+    try:
+        prev = datetime.fromisoformat(str(last_visit_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if prev.tzinfo is None:
+        prev = prev.replace(tzinfo=timezone.utc)
+    return max(prev, datetime.now(timezone.utc) - timedelta(days=DIGEST_MAX_DAYS))
+
+
+def fetch_pour_count_since(since_iso: str) -> int:
+    q = get_client().table("events").select("id", count="exact").gt("created_at", since_iso).limit(1)
+    return int(execute(q, table="events").count or 0)
+
+
+def fetch_new_bottles(since_iso: str) -> tuple[int, list]:
+    """(how many bottles were added after the cursor, newest NEW_BOTTLES_MAX ids)."""
+    q = (
+        get_client()
+        .table("bottles")
+        .select("id", count="exact")
+        .gt("created_at", since_iso)
+        .order("created_at", desc=True)
+        .limit(NEW_BOTTLES_MAX)
+    )
+    res = execute(q, table="bottles")
+    return int(res.count or 0), [r["id"] for r in res.data or []]
+
+
+def fetch_daily_sums_since(day: str) -> dict:
+    """bottle_id -> [pours, rated, rating_sum] over bottle_daily_stats rows from `day` on."""
+    sums: dict = {}
+    rows = iter_keyset_rows(
+        get_client(),
+        "bottle_daily_stats",
+        "bottle_id, day, pour_count, rated_count, rating_sum",
+        keys=("day", "bottle_id"),
+        filters=lambda q: q.gte("day", day),
+    )
+    for r in rows:
+        s = sums.setdefault(r["bottle_id"], [0, 0, 0.0])
+        s[0] += int(r.get("pour_count") or 0)
+        s[1] += int(r.get("rated_count") or 0)
+        s[2] += float(r.get("rating_sum") or 0)
+    return sums
+
+
+def _top(board: dict) -> list:
+    """Bottle ids of the top MOVERS_TOP_N by average, for a {bottle_id: (n, rating_sum)} board."""
+    ranked = sorted(
+        ((s / n, n, bid) for bid, (n, s) in board.items() if n >= MOVERS_MIN_RATINGS),
+        key=lambda t: (-t[0], -t[1]),
+    )
+    return [bid for _, _, bid in ranked[:MOVERS_TOP_N]]
+
+
+def rank_movers(board_rows: list[dict], since_sums: dict) -> list[dict]:
+    """
+    [{bottle_id, rank, prev_rank}] for bottles that climbed into or within the top
+    MOVERS_TOP_N; prev_rank is None for a new entry. Biggest climbs first.
+    """
+    now = {r["bottle_id"]: (r["rating_count"], r["avg_rating"] * r["rating_count"]) for r in board_rows}
+    before = dict(now)
+    for bid, (_, rated, rating_sum) in since_sums.items():
+        if bid in before and rated:
+            n, s = before[bid]
+            before[bid] = (n - rated, s - rating_sum)
+
+    prev_rank = {bid: i + 1 for i, bid in enumerate(_top(before))}
+    movers = []
+    for i, bid in enumerate(_top(now)):
+        prev = prev_rank.get(bid)
+        if prev is None or prev > i + 1:
+            movers.append({"bottle_id": bid, "rank": i + 1, "prev_rank": prev})
+    movers.sort(key=lambda m: (m["prev_rank"] or MOVERS_TOP_N + 1) - m["rank"], reverse=True)
+    return movers[:MOVERS_MAX]
+
+
+def build_digest(since: datetime) -> dict:
+    since_iso = since.isoformat()
+    day = since.date().isoformat()
+    sums = _daily_since_cache.get_or_load(day, lambda: fetch_daily_sums_since(day))
+    new_bottle_count, new_bottles = fetch_new_bottles(since_iso)
+    busiest = sorted(((s[0], bid) for bid, s in sums.items() if s[0]), reverse=True)[:BUSIEST_MAX]
+    return {
+        "since": since_iso,
+        "new_pours": fetch_pour_count_since(since_iso),
+        "new_bottle_count": new_bottle_count,
+        "new_bottles": new_bottles,
+        "busiest": [{"bottle_id": bid, "pours": n} for n, bid in busiest],
+        "movers": rank_movers(get_ranking_aggregates("All time")["rows"], sums),
+    }
+
+
+def get_digest(device_token: str, last_visit_at: Optional[str]) -> Optional[dict]:
+    """The device's digest, or None on a first visit. Cached per device until new pours land."""
+    since = digest_cursor(last_visit_at) if last_visit_at else None
+    if since is None:
+        return None
+    return _digest_cache.get_or_load((device_token, since.isoformat()), lambda: build_digest(since))
+
+
+def invalidate_digests() -> None:
+    _digest_cache.invalidate()
+    _daily_since_cache.invalidate()
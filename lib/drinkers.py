@@ -0,0 +1,95 @@
+# lib/drinkers.py
+# Per-device (drinker) aggregates. The tables are maintained by a trigger on events
+# (supabase/migrations/*_device_stats.sql), so reads are one small indexed query.
+# A device's own rows come through device_stats_for(token); the tables themselves are
+# not readable with the anon key.
+from __future__ import annotations
+
+from lib.cache import get_cache
+from lib.materialize import SCHEDULER
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+DRINKERS_TTL_SECONDS = 60
+FAVORITES_N = 3
+
+_leaderboard_cache = get_cache("drinker_leaderboard", ttl=DRINKERS_TTL_SECONDS, max_entries=1, shared=True)
+_device_cache = get_cache("device_stats", ttl=DRINKERS_TTL_SECONDS, max_entries=2048)
+
+
+def fetch_drinker_leaderboard(limit: int = 200) -> list[dict]:
+    sb = get_client()
+    q = (
+        sb.table("drinker_leaderboard")
+        .select("drinker_id, display_name, pour_count, rated_count, avg_rating, last_pour_at")
+        .order("pour_count", desc=True)
+        .limit(limit)
+    )
+    return (execute(q, table="drinker_leaderboard").data) or []
+
+
+def get_drinker_leaderboard() -> list[dict]:
+    """Drinkers by pour count (all time), without device tokens. Materialized in the background."""
+    return SCHEDULER.read("drinkers")
+
+
+SCHEDULER.register(
+    "drinkers",
+    compute=lambda: _leaderboard_cache.get_or_load("top", fetch_drinker_leaderboard),
+    every=DRINKERS_TTL_SECONDS,
+    depends_on=("events",),
+    on_dirty=lambda: _leaderboard_cache.invalidate("top"),
+)
+
+
+def fetch_device_stats(device_token: str) -> dict:
+    """
+    {"bottles": [{bottle_id, avg_rating, rating_count, pour_count}], "pour_count", "rated_count",
+     "avg_rating", "favorites": [bottle_id], "categories": [{category, pour_count}]}
+    """
+    # The per-device tables are not readable by anon (they would list every token)
+    res = execute(get_client().rpc("device_stats_for", {"token": device_token}), table="device_stats")
+    data = res.data or {}
+    bottle_rows = data.get("bottles") or []
+    category_rows = data.get("categories") or []
+
+    bottles = []
+    pours = rated = 0
+    rating_sum = 0.0
+    for r in bottle_rows:
+        n = int(r.get("rated_count") or 0)
+        pours += int(r.get("pour_count") or 0)
+        rated += n
+        rating_sum += float(r.get("rating_sum") or 0)
+        if n:
+            bottles.append(
+                {
+                    "bottle_id": r["bottle_id"],
+                    "avg_rating": float(r["rating_sum"]) / n,
+                    "rating_count": n,
+                    "pour_count": int(r.get("pour_count") or 0),
+                }
+            )
+
+    favorites = sorted(bottles, key=lambda b: (-b["avg_rating"], -b["rating_count"]))[:FAVORITES_N]
+    return {
+        "bottles": bottles,
+        "pour_count": pours,
+        "rated_count": rated,
+        "avg_rating": (rating_sum / rated) if rated else None,
+        "favorites": [b["bottle_id"] for b in favorites],
+        "categories": category_rows,
+    }
+
+
+def get_device_stats(device_token: str) -> dict:
+    return _device_cache.get_or_load(device_token, lambda: fetch_device_stats(device_token))
+
+
+def invalidate_drinker(device_token: str | None = None) -> None:
+    """Call after a pour is posted so the next read sees the trigger's update. No token = every device."""
+    _leaderboard_cache.invalidate()
+    if device_token:
+        _device_cache.invalidate(device_token)
+    else:
+        _device_cache.invalidate()
@@ -0,0 +1,181 @@
+# lib/facets.py
+# Faceted bottle filtering over the shared catalog.
+#
+# Every facet value owns a bitmap (a Python int, bit i = catalog row i). A filter is
+# OR within a facet and AND across facets, so any combination is a handful of big-int
+# ANDs/ORs. Live counts histogram each facet's value codes over the matching rows
+# (one NumPy bincount per distinct mask) and are memoized per selection. The index is
+# built once per catalog instance and shared by every session.
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+
+from lib.catalog import Catalog, clean_text
+
+# facet -> display name, in UI order
+FACETS = {
+    "category": "Category",
+    "mashbill_style": "Mashbill",
+    "distillery": "Distillery",
+    "distillery_location": "Distillery location",
+    "barrel_type": "Barrel",
+    "proof_band": "Proof",
+}
+
+# (upper bound exclusive, label); the last band is open-ended
+PROOF_BANDS = [
+    (90.0, "Under 90"),
+    (100.0, "90-99"),
+    (110.0, "100-109"),
+    (120.0, "110-119"),
+    (math.inf, "120+"),
+]
+
+# facet -> set of selected values; missing or empty means "any"
+Selection = Mapping[str, Iterable[str]]
+
+# Memoized count results per index (selection x universe)
+COUNTS_MEMO_SIZE = 256
+
+
+def bits_from_rows(rows: Iterable[int], n: int) -> int:
+    buf = bytearray((n + 7) // 8)
+    for r in rows:
+        buf[r >> 3] |= 1 << (r & 7)
+    return int.from_bytes(buf, "little")
+
+
+class BitTest:
+    """O(1) membership for one bitmap (shifting a 100k-bit int per lookup is not)."""
+
+    def __init__(self, bits: int, n: int):
+        self._buf = bits.to_bytes((n + 7) // 8 or 1, "little")
+
+    def __contains__(self, row: Optional[int]) -> bool:
+        return row is not None and bool(self._buf[row >> 3] >> (row & 7) & 1)
+
+
+def _proof_band(proof: float) -> Optional[str]:
+    if proof != proof:  # NaN = no proof
+        return None
+    return next(label for bound, label in PROOF_BANDS if proof < bound)
+
+
+class FacetIndex:
+    def __init__(self, catalog: Catalog):
+        n = len(catalog)
+        self.n = n
+        self.all_bits = (1 << n) - 1
+        # facet -> {value: bitmap}
+        self.values: dict[str, dict[str, int]] = {}
+        # facet -> value code per row (-1 = no value), codes follow self.values order
+        self._codes: dict[str, np.ndarray] = {}
+        self._memo: OrderedDict = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+        for facet in FACETS:
+            rows_by_value: dict[str, list[int]] = {}
+            if facet == "proof_band":
+                for i, proof in enumerate(catalog.proof):
+                    band = _proof_band(proof)
+                    if band:
+                        rows_by_value.setdefault(band, []).append(i)
+                order = [label for _, label in PROOF_BANDS]
+            else:
+                # Group on the pool index first: one clean_text per distinct string
+                by_idx: dict[int, list[int]] = {}
+                for i, s_idx in enumerate(catalog.text_columns[facet]):
+                    by_idx.setdefault(s_idx, []).append(i)
+                for s_idx, rows in by_idx.items():
+                    value = clean_text(catalog.strings[s_idx])
+                    if value:
+                        rows_by_value.setdefault(value, []).extend(rows)
+                order = sorted(rows_by_value, key=str.lower)
+            order = [v for v in order if v in rows_by_value]
+            self.values[facet] = {v: bits_from_rows(rows_by_value[v], n) for v in order}
+            codes = np.full(n, -1, dtype=np.int32)
+            for code, v in enumerate(order):
+                codes[rows_by_value[v]] = code
+            self._codes[facet] = codes
+
+        # Unfiltered counts are what most reruns ask for first
+        self.counts({})
+
+    def _facet_mask(self, facet: str, chosen: Iterable[str]) -> Optional[int]:
+        """OR of the chosen values' bitmaps, or None when nothing is chosen."""
+        chosen = list(chosen or ())
+        if not chosen:
+            return None
+        bitmaps = self.values.get(facet, {})
+        mask = 0
+        for v in chosen:
+            mask |= bitmaps.get(v, 0)
+        return mask
+
+    def match(self, selection: Selection, universe: Optional[int] = None) -> int:
+        bits = self.all_bits if universe is None else universe
+        for facet, chosen in selection.items():
+            mask = self._facet_mask(facet, chosen)
+            if mask is not None:
+                bits &= mask
+        return bits
+
+    def counts(self, selection: Selection, universe: Optional[int] = None) -> dict[str, dict[str, int]]:
+        """
+        Live counts: for each facet, how many rows each value would match given the
+        selections on every *other* facet (so picking a value never zeroes its siblings).
+        """
+        memo_key = (tuple(sorted((f, frozenset(v)) for f, v in selection.items() if v)), universe)
+        with self._memo_lock:
+            hit = self._memo.get(memo_key)
+            if hit is not None:
+                self._memo.move_to_end(memo_key)
+                return hit
+
+        base = self.all_bits if universe is None else universe
+        masks = {f: self._facet_mask(f, selection.get(f, ())) for f in FACETS}
+        # Facets without a selection of their own share one "everything else" mask
+        rows_for: dict[int, np.ndarray] = {}
+        out: dict[str, dict[str, int]] = {}
+        for facet, bitmaps in self.values.items():
+            others = base
+            for f, mask in masks.items():
+                if f != facet and mask is not None:
+                    others &= mask
+            rows = rows_for.get(others)
+            if rows is None:
+                rows = rows_for[others] = self._rows(others)
+            codes = self._codes[facet][rows]
+            hist = np.bincount(codes[codes >= 0], minlength=len(bitmaps))
+            out[facet] = dict(zip(bitmaps, hist.tolist()))
+
+        with self._memo_lock:
+            self._memo[memo_key] = out
+            while len(self._memo) > COUNTS_MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return out
+
+    def _rows(self, bits: int) -> np.ndarray:
+        raw = np.frombuffer(bits.to_bytes((self.n + 7) // 8 or 1, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little", count=self.n))
+
+
+_lock = threading.Lock()
+_latest: Optional[tuple[Catalog, FacetIndex]] = None
+
+
+def get_facet_index(catalog: Catalog) -> FacetIndex:
+    """The index for this catalog instance, built on first use (one live version at a time)."""
+    global _latest
+    latest = _latest
+    if latest is not None and latest[0] is catalog:
+        return latest[1]
+    with _lock:
+        if _latest is None or _latest[0] is not catalog:
+            _latest = (catalog, FacetIndex(catalog))
+        return _latest[1]
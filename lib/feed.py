@@ -0,0 +1,53 @@
+# lib/feed.py
+# Room feed (most recent pours across all bottles) and per-bottle recent pours.
+from __future__ import annotations
+
+from lib.cache import get_cache
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+FEED_COLUMNS = "id, client_ref, created_at, message, bottle_id, rating, location, author_display_name"
+FEED_MAX = 200
+FEED_TTL_SECONDS = 15
+
+BOTTLE_EVENTS_COLUMNS = "id, client_ref, created_at, message, rating, location, author_display_name"
+BOTTLE_EVENTS_MAX = 50
+
+_feed_cache = get_cache("room_feed", ttl=FEED_TTL_SECONDS, max_entries=1, shared=True)
+_bottle_events_cache = get_cache("bottle_events", ttl=FEED_TTL_SECONDS, max_entries=512, shared=True)
+
+
+def fetch_recent_events() -> list[dict]:
+    sb = get_client()
+    q = sb.table("events").select(FEED_COLUMNS).order("created_at", desc=True).limit(FEED_MAX)
+    return (execute(q, table="events").data) or []
+
+
+def get_recent_events(limit: int = 50) -> list[dict]:
+    """Newest first. One cached fetch of FEED_MAX rows serves every page size."""
+    rows = _feed_cache.get_or_load("recent", fetch_recent_events)
+    return rows[: max(0, int(limit))]
+
+
+def fetch_bottle_events(bottle_id) -> list[dict]:
+    sb = get_client()
+    q = (
+        sb.table("events")
+        .select(BOTTLE_EVENTS_COLUMNS)
+        .eq("bottle_id", bottle_id)
+        .order("created_at", desc=True)
+        .limit(BOTTLE_EVENTS_MAX)
+    )
+    return (execute(q, table="events").data) or []
+
+
+def get_bottle_events(bottle_id) -> list[dict]:
+    """Newest BOTTLE_EVENTS_MAX pours for one bottle."""
+    return _bottle_events_cache.get_or_load(bottle_id, lambda: fetch_bottle_events(bottle_id))
+
+
+def invalidate_feed(bottle_id=None) -> None:
+    """Drop the Room feed, and the recent pours of `bottle_id` if given."""
+    _feed_cache.invalidate()
+    if bottle_id is not None:
+        _bottle_events_cache.invalidate(bottle_id)
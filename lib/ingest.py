@@ -0,0 +1,208 @@
+# lib/ingest.py
+# Streaming catalog ingestion: distributor lists (Excel / CSV / JSON lines) -> bottles.
+#
+# Each source is declared in a JSON manifest (see scripts/ingest_sources.example.json):
+#   {"name": "rye", "path": "data/rye.csv", "columns": {"brand": "Label", ...}, "defaults": {...}}
+# `columns` maps catalog fields to the source's headers (matched case-insensitively);
+# `defaults` fills fields the source does not carry. Rows flow through generators
+# (read -> normalize -> dedupe -> insert in chunks), so memory does not grow with the
+# size of a list: dedupe checks the live catalog's key index and an 8-byte digest per
+# bottle added in this run. Duplicates are judged on match_key(label), the key the app
+# resolves typed names with.
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from lib.catalog import TEXT_COLUMNS, Catalog, bottle_label, clean_text, match_key, norm_key
+from lib.resilience import execute
+
+CHUNK_SIZE = 200
+
+# Catalog fields a source can map; proof is numeric, the rest are text
+FIELDS = TEXT_COLUMNS + ("parent_company", "proof")
+
+FORMATS = {".xlsx": "excel", ".xlsm": "excel", ".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+@dataclass
+class SourceSpec:
+    name: str
+    path: Path
+    # catalog field -> source header
+    columns: dict[str, str]
+    defaults: dict[str, object] = field(default_factory=dict)
+    # Excel only; None = first sheet
+    sheet: Optional[str] = None
+    # "excel" / "csv" / "jsonl"; inferred from the file suffix when not given
+    format: Optional[str] = None
+
+    def __post_init__(self):
+        unknown = (set(self.columns) | set(self.defaults)) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"{self.name}: unknown catalog field(s) {sorted(unknown)}")
+        if "brand" not in self.columns and "brand" not in self.defaults:
+            raise ValueError(f"{self.name}: a brand column is required")
+        self.format = self.format or FORMATS.get(self.path.suffix.lower())
+        if self.format not in FORMATS.values():
+            raise ValueError(f"{self.name}: can't tell the format of {self.path.name}; set \"format\"")
+
+
+@dataclass
+class SourceReport:
+    name: str
+    read: int = 0
+    # No brand after mapping
+    skipped: int = 0
+    # Already in the live catalog
+    in_catalog: int = 0
+    # Seen earlier in this run (same or another source)
+    repeated: int = 0
+    inserted: int = 0
+
+
+def load_manifest(path: Path) -> list[SourceSpec]:
+    """Sources from a JSON manifest; relative paths are resolved against the manifest's folder."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    specs = []
+    for s in data["sources"]:
+        src = Path(s["path"])
+        specs.append(
+            SourceSpec(
+                name=s.get("name") or src.stem,
+                path=src if src.is_absolute() else Path(path).parent / src,
+                columns=s.get("columns", {}),
+                defaults=s.get("defaults", {}),
+                sheet=s.get("sheet"),
+                format=s.get("format"),
+            )
+        )
+    return specs
+
+
+# ------------------------------------------------------------
+# Readers: one dict per source row, keyed by header
+# ------------------------------------------------------------
+def read_excel(path: Path, sheet: Optional[str] = None) -> Iterator[dict]:
+    # Imported here so CSV / JSON-lines runs don't need openpyxl
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        headers = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        for values in rows:
+            yield dict(zip(headers, values))
+    finally:
+        wb.close()
+
+
+def read_csv(path: Path) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        yield from csv.DictReader(fh)
+
+
+def read_jsonl(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_source(spec: SourceSpec) -> Iterator[dict]:
+    if spec.format == "excel":
+        return read_excel(spec.path, spec.sheet)
+    if spec.format == "csv":
+        return read_csv(spec.path)
+    return read_jsonl(spec.path)
+
+
+# ------------------------------------------------------------
+# Pipeline stages
+# ------------------------------------------------------------
+def _parse_proof(v) -> Optional[float]:
+    try:
+        proof = float(str(v).strip().rstrip("°").strip())
+    except (TypeError, ValueError):
+        return None
+    return proof if 0 < proof <= 200 else None
+
+
+def normalize(row: dict, spec: SourceSpec, header_index: dict[str, str]) -> Optional[dict]:
+    """Source row -> bottles payload (cleaned text, numeric proof), or None without a brand."""
+    out: dict = {}
+    for f in FIELDS:
+        header = spec.columns.get(f)
+        raw = row.get(header_index.get(norm_key(header), header)) if header else None
+        if raw is None or clean_text(str(raw)) == "":
+            raw = spec.defaults.get(f)
+        if f == "proof":
+            out[f] = _parse_proof(raw)
+        else:
+            out[f] = clean_text(str(raw)) if raw is not None else None
+            out[f] = out[f] or None
+    return out if out["brand"] else None
+
+
+def normalized_rows(spec: SourceSpec, report: SourceReport) -> Iterator[dict]:
+    header_index: dict[str, str] = {}
+    for row in read_source(spec):
+        report.read += 1
+        if not header_index:
+            # Source headers by norm_key, so mappings survive case / spacing differences
+            header_index = {norm_key(h): h for h in row if h}
+        rec = normalize(row, spec, header_index)
+        if rec is None:
+            report.skipped += 1
+            continue
+        yield rec
+
+
+def new_bottles(
+    records: Iterable[tuple[SourceReport, dict]],
+    catalog: Catalog,
+    seen: set[bytes],
+) -> Iterator[tuple[SourceReport, dict]]:
+    """Drop records whose label key is in the catalog or was already emitted in this run."""
+    for report, rec in records:
+        key = match_key(bottle_label(rec))
+        if catalog.id_for_key(key) is not None:
+            report.in_catalog += 1
+            continue
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        if digest in seen:
+            report.repeated += 1
+            continue
+        seen.add(digest)
+        yield report, rec
+
+
+def ingest(
+    sources: list[SourceSpec],
+    catalog: Catalog,
+    sb=None,
+    dry_run: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> list[SourceReport]:
+    """Stream every source into `bottles` in one pass. With dry_run, nothing is written."""
+    reports = [SourceReport(s.name) for s in sources]
+    tagged = (
+        (report, rec) for spec, report in zip(sources, reports) for rec in normalized_rows(spec, report)
+    )
+    stream = new_bottles(tagged, catalog, set())
+
+    while True:
+        chunk = list(islice(stream, chunk_size))
+        if not chunk:
+            break
+        if not dry_run:
+            execute(sb.table("bottles").insert([rec for _, rec in chunk]), table="bottles", op="insert")
+        for report, _ in chunk:
+            report.inserted += 1
+    return reports
@@ -0,0 +1,651 @@
+# lib/local_backend.py
+# In-memory stand-in for the Supabase client, for load tests and offline development.
+#
+#   VISCOSITY_BACKEND=local streamlit run Welcome.py
+#
+# Implements the slice of the postgrest query builder this app uses (select/insert/
+# update, eq/neq/gt/gte/lt/lte/in_/ilike/is_/not_/or_, order, limit, rpc) and emulates
+# the database triggers, views and functions from supabase/migrations/. Every execute()
+# is counted per (table, op) so harnesses can report backend calls per second.
+from __future__ import annotations
+
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+from typing import Any, Callable, Optional
+
+from lib.locations import location_keys
+
+LATENCY_SECONDS = 0.0
+
+
+@dataclass
+class _Response:
+    data: list[dict]
+    count: Optional[int] = None
+
+
+def _split_top_level(expr: str) -> list[str]:
+    parts, depth, quoted, cur = [], 0, False, []
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+    if cur:
+        parts.append("".join(cur))
+    return parts
+
+
+def _unquote(v: str) -> str:
+    v = v.strip()
+    if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+        return v[1:-1].replace('\\"', '"')
+    return v
+
+
+def _comparable(row_val: Any, val: Any) -> tuple[Any, Any]:
+    # Filter values arrive as strings from or_() and as Python values otherwise
+    if row_val is None or val is None or type(row_val) is type(val):
+        return row_val, val
+    try:
+        if isinstance(row_val, bool):
+            return row_val, str(val).lower() == "true"
+        if isinstance(row_val, int):
+            return row_val, int(val)
+        if isinstance(row_val, float):
+            return row_val, float(val)
+    except (TypeError, ValueError):
+        pass
+    return str(row_val), str(val)
+
+
+def _ilike_regex(pattern: str) -> re.Pattern:
+    out = []
+    for ch in pattern:
+        if ch == "%" or ch == "*":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("^" + "".join(out) + "$", re.IGNORECASE | re.DOTALL)
+
+
+def _leaf(col: str, op: str, val: Any) -> Callable[[dict], bool]:
+    def pred(row: dict) -> bool:
+        rv = row.get(col)
+        if op == "is":
+            target = None if str(val).lower() == "null" else val
+            return rv is target if target is None else rv == target
+        if op == "in":
+            return any(_comparable(rv, v)[0] == _comparable(rv, v)[1] for v in val)
+        if op in ("like", "ilike"):
+            return rv is not None and bool(_ilike_regex(str(val)).match(str(rv)))
+        if rv is None:
+            return False
+        a, b = _comparable(rv, val)
+        try:
+            return {
+                "eq": a == b,
+                "neq": a != b,
+                "gt": a > b,
+                "gte": a >= b,
+                "lt": a < b,
+                "lte": a <= b,
+            }[op]
+        except TypeError:
+            return False
+
+    return pred
+
+
+def _parse_logic(expr: str, mode: str = "or") -> Callable[[dict], bool]:
+    """PostgREST logic tree: 'a.gt.1,and(a.eq.1,b.gt.2)'."""
+    preds = []
+    for part in _split_top_level(expr):
+        part = part.strip()
+        m = re.match(r"^(and|or)\((.*)\)$", part, re.DOTALL)
+        if m:
+            preds.append(_parse_logic(m.group(2), m.group(1)))
+            continue
+        col, op, val = part.split(".", 2)
+        negate = False
+        if op == "not":
+            negate = True
+            op, val = val.split(".", 1)
+        if op == "in":
+            val = [_unquote(v) for v in _split_top_level(val.strip("()"))]
+        else:
+            val = _unquote(val)
+        p = _leaf(col, op, val)
+        preds.append((lambda p: lambda r: not p(r))(p) if negate else p)
+
+    if mode == "and":
+        return lambda r: all(p(r) for p in preds)
+    return lambda r: any(p(r) for p in preds)
+
+
+class _Query:
+    def __init__(self, backend: "LocalBackend", table: str):
+        self._backend = backend
+        self._table = table
+        self._op = "select"
+        self._columns: Optional[list[str]] = None
+        self._payload: Any = None
+        self._filters: list[Callable[[dict], bool]] = []
+        self._orders: list[tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._count: Optional[str] = None
+        self._on_conflict: Optional[str] = None
+        self._negate_next = False
+
+    # ---- operations ----
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "_Query":
+        self._op = "select"
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        self._columns = None if cols == ["*"] else cols
+        self._count = count
+        return self
+
+    def insert(self, rows) -> "_Query":
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", ignore_duplicates: bool = False) -> "_Query":
+        # Only the insert-or-ignore form is emulated (what the pour queue uses)
+        if not (on_conflict and ignore_duplicates):
+            raise NotImplementedError("local backend supports upsert(..., on_conflict=col, ignore_duplicates=True)")
+        self.insert(rows)
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, values: dict) -> "_Query":
+        self._op = "update"
+        self._payload = values
+        return self
+
+    def delete(self) -> "_Query":
+        self._op = "delete"
+        return self
+
+    # ---- filters ----
+    def _add(self, pred: Callable[[dict], bool]) -> "_Query":
+        if self._negate_next:
+            self._negate_next = False
+            self._filters.append(lambda r: not pred(r))
+        else:
+            self._filters.append(pred)
+        return self
+
+    @property
+    def not_(self) -> "_Query":
+        self._negate_next = True
+        return self
+
+    def eq(self, col, val):
+        return self._add(_leaf(col, "eq", val))
+
+    def neq(self, col, val):
+        return self._add(_leaf(col, "neq", val))
+
+    def gt(self, col, val):
+        return self._add(_leaf(col, "gt", val))
+
+    def gte(self, col, val):
+        return self._add(_leaf(col, "gte", val))
+
+    def lt(self, col, val):
+        return self._add(_leaf(col, "lt", val))
+
+    def lte(self, col, val):
+        return self._add(_leaf(col, "lte", val))
+
+    def in_(self, col, values):
+        return self._add(_leaf(col, "in", list(values)))
+
+    def ilike(self, col, pattern):
+        return self._add(_leaf(col, "ilike", pattern))
+
+    def is_(self, col, val):
+        return self._add(_leaf(col, "is", val))
+
+    def or_(self, expr: str):
+        return self._add(_parse_logic(expr, "or"))
+
+    def order(self, col: str, desc: bool = False):
+        self._orders.append((col, desc))
+        return self
+
+    def limit(self, n: int):
+        self._limit = int(n)
+        return self
+
+    def execute(self) -> _Response:
+        return self._backend._execute(self)
+
+
+class _Rpc:
+    def __init__(self, backend: "LocalBackend", name: str, params: dict):
+        self._backend = backend
+        self._name = name
+        self._params = params
+
+    def execute(self) -> _Response:
+        db = self._backend
+        if db.latency_seconds:
+            time.sleep(db.latency_seconds)
+        with db._lock:
+            db.calls[(self._name, "rpc")] += 1
+            return _Response(db.functions[self._name](**self._params))
+
+
+class LocalBackend:
+    def __init__(self, latency_seconds: float = LATENCY_SECONDS):
+        self.latency_seconds = latency_seconds
+        self.tables: dict[str, list[dict]] = defaultdict(list)
+        self.calls: Counter = Counter()
+        self._ids: dict[str, itertools.count] = defaultdict(lambda: itertools.count(1))
+        # table -> {id: row} and table -> {key tuple: row}, so trigger emulation stays O(1)
+        self.by_id: dict[str, dict] = defaultdict(dict)
+        self.keyed: dict[str, dict[tuple, dict]] = defaultdict(dict)
+        self._lock = threading.RLock()
+        # table -> callables(row) run after each inserted row (trigger emulation)
+        self.after_insert: dict[str, list[Callable[[dict], None]]] = defaultdict(list)
+        # view name -> callable() returning rows
+        self.views: dict[str, Callable[[], list[dict]]] = {}
+        # function name -> callable(**params) returning the rpc result
+        self.functions: dict[str, Callable[..., Any]] = {}
+        # (table, column) -> values seen, for upsert(on_conflict=column)
+        self.unique: dict[tuple[str, str], set] = {}
+        _install_schema(self)
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> _Rpc:
+        return _Rpc(self, name, params or {})
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _unique_values(self, table: str, col: str) -> set:
+        key = (table, col)
+        if key not in self.unique:
+            self.unique[key] = {r.get(col) for r in self.tables[table] if r.get(col) is not None}
+        return self.unique[key]
+
+    def _rows(self, table: str) -> list[dict]:
+        view = self.views.get(table)
+        return view() if view is not None else self.tables[table]
+
+    def _execute(self, q: _Query) -> _Response:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        with self._lock:
+            self.calls[(q._table, q._op)] += 1
+
+            if q._op == "insert":
+                out = []
+                seen = self._unique_values(q._table, q._on_conflict) if q._on_conflict else None
+                for r in q._payload:
+                    if seen is not None:
+                        if r.get(q._on_conflict) in seen:
+                            continue
+                        seen.add(r.get(q._on_conflict))
+                    row = dict(r)
+                    row.setdefault("id", next(self._ids[q._table]))
+                    row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                    self.tables[q._table].append(row)
+                    self.by_id[q._table][row["id"]] = row
+                    for (t, c), values in self.unique.items():
+                        if t == q._table and row.get(c) is not None:
+                            values.add(row[c])
+                    for hook in self.after_insert.get(q._table, []):
+                        hook(row)
+                    out.append(dict(row))
+                return _Response(out)
+
+            rows = [r for r in self._rows(q._table) if all(f(r) for f in q._filters)]
+
+            if q._op == "update":
+                for r in rows:
+                    r.update(q._payload)
+                return _Response([dict(r) for r in rows])
+
+            if q._op == "delete":
+                keep = [r for r in self.tables[q._table] if not all(f(r) for f in q._filters)]
+                self.tables[q._table] = keep
+                self.by_id[q._table] = {r["id"]: r for r in keep if "id" in r}
+                for key in [k for k in self.unique if k[0] == q._table]:
+                    del self.unique[key]
+                return _Response([dict(r) for r in rows])
+
+            for col, desc in reversed(q._orders):
+                rows.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            count = len(rows) if q._count else None
+            if q._limit is not None:
+                rows = rows[: q._limit]
+            if q._columns is not None:
+                rows = [{c: r.get(c) for c in q._columns} for r in rows]
+            else:
+                rows = [dict(r) for r in rows]
+            return _Response(rows, count)
+
+
+# ------------------------------------------------------------
+# Schema emulation (triggers and views from supabase/migrations)
+# ------------------------------------------------------------
+def _install_schema(db: LocalBackend) -> None:
+    def device_stats_trigger(e: dict) -> None:
+        token = e.get("author_device_token")
+        if not token:
+            return
+        rating = e.get("rating")
+        rated = 0 if rating is None else 1
+
+        stats = _upsert(db, "device_stats", {"device_token": token}, pour_count=0, rated_count=0, rating_sum=0.0)
+        stats["display_name"] = e.get("author_display_name") or stats.get("display_name")
+        stats["pour_count"] += 1
+        stats["rated_count"] += rated
+        stats["rating_sum"] += float(rating or 0)
+        stats["first_pour_at"] = min(filter(None, [stats.get("first_pour_at"), e["created_at"]]))
+        stats["last_pour_at"] = max(filter(None, [stats.get("last_pour_at"), e["created_at"]]))
+
+        bid = e.get("bottle_id")
+        if bid is None:
+            return
+        per_bottle = _upsert(
+            db, "device_bottle_stats", {"device_token": token, "bottle_id": bid},
+            pour_count=0, rated_count=0, rating_sum=0.0,
+        )
+        per_bottle["pour_count"] += 1
+        per_bottle["rated_count"] += rated
+        per_bottle["rating_sum"] += float(rating or 0)
+        per_bottle["last_pour_at"] = max(filter(None, [per_bottle.get("last_pour_at"), e["created_at"]]))
+
+        bottle = db.by_id["bottles"].get(bid, {})
+        category = (bottle.get("category") or "").strip() or "Uncategorized"
+        _upsert(db, "device_category_stats", {"device_token": token, "category": category}, pour_count=0)[
+            "pour_count"
+        ] += 1
+
+    def drinker_leaderboard() -> list[dict]:
+        return [
+            {
+                "drinker_id": md5(s["device_token"].encode()).hexdigest(),
+                "display_name": (s.get("display_name") or "").strip() or "Someone",
+                "pour_count": s["pour_count"],
+                "rated_count": s["rated_count"],
+                "avg_rating": (s["rating_sum"] / s["rated_count"]) if s["rated_count"] else None,
+                "first_pour_at": s.get("first_pour_at"),
+                "last_pour_at": s.get("last_pour_at"),
+            }
+            for s in db.tables["device_stats"]
+        ]
+
+    def device_stats_for(token: str) -> dict:
+        bottles = [
+            {k: r[k] for k in ("bottle_id", "pour_count", "rated_count", "rating_sum")}
+            for r in db.tables["device_bottle_stats"]
+            if r["device_token"] == token
+        ]
+        categories = sorted(
+            ({"category": r["category"], "pour_count": r["pour_count"]}
+             for r in db.tables["device_category_stats"] if r["device_token"] == token),
+            key=lambda r: -r["pour_count"],
+        )
+        return {"bottles": bottles, "categories": categories}
+
+    def catalog_version_trigger(b: dict) -> None:
+        # Inserts only; the app never updates or deletes bottles through the stand-in
+        version = _upsert(db, "catalog_version", {"id": True}, version=0, row_count=0)
+        version["version"] += 1
+        version["row_count"] += 1
+        b["row_version"] = version["version"]
+
+    def bottle_daily_trigger(e: dict) -> None:
+        bid = e.get("bottle_id")
+        if bid is None:
+            return
+        day = datetime.fromisoformat(e["created_at"].replace("Z", "+00:00")).astimezone(timezone.utc).date()
+        daily = _upsert(
+            db, "bottle_daily_stats", {"bottle_id": bid, "day": day.isoformat()},
+            pour_count=0, rated_count=0, rating_sum=0.0,
+        )
+        daily["pour_count"] += 1
+        daily["rated_count"] += 0 if e.get("rating") is None else 1
+        daily["rating_sum"] += float(e.get("rating") or 0)
+
+    def location_trigger(e: dict) -> None:
+        keys = dict(location_keys(e.get("location")))
+        e["location_key"] = keys.get("place")
+        e["city_key"] = keys.get("city")
+        for kind, key in keys.items():
+            label = e["location"].strip() if kind == "place" else e["location"].rsplit(",", 1)[1].strip()
+            loc = _upsert(db, "locations", {"kind": kind, "location_key": key}, pour_count=0)
+            loc["label"] = label
+            loc["pour_count"] += 1
+            loc["last_pour_at"] = max(filter(None, [loc.get("last_pour_at"), e["created_at"]]))
+            if e.get("bottle_id") is None:
+                continue
+            per_bottle = _upsert(
+                db, "location_bottle_stats", {"kind": kind, "location_key": key, "bottle_id": e["bottle_id"]},
+                pour_count=0, rated_count=0, rating_sum=0.0,
+            )
+            per_bottle["pour_count"] += 1
+            per_bottle["rated_count"] += 0 if e.get("rating") is None else 1
+            per_bottle["rating_sum"] += float(e.get("rating") or 0)
+
+    def archive_events(horizon_days: int = 180, batch_size: int = 5000, through_id: Optional[int] = None) -> int:
+        if horizon_days < 91:
+            raise ValueError("archive horizon must exceed the 90-day rankings window")
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=horizon_days)).isoformat()
+        old = sorted(
+            (e for e in db.tables["events"] if e["created_at"] < cutoff and (through_id is None or e["id"] <= through_id)),
+            key=lambda e: (e["created_at"], e["id"]),
+        )
+        batch = old[:batch_size]
+        moved = {e["id"] for e in batch}
+        db.tables["events"] = [e for e in db.tables["events"] if e["id"] not in moved]
+        for e in batch:
+            db.by_id["events"].pop(e["id"], None)
+            db.tables["events_archive"].append(e)
+            if e.get("bottle_id") is None:
+                continue
+            rollup = _upsert(
+                db, "bottle_rating_archive", {"bottle_id": e["bottle_id"]},
+                pour_count=0, rated_count=0, rating_sum=0.0, rating_sumsq=0.0,
+            )
+            rating = e.get("rating")
+            rollup["pour_count"] += 1
+            rollup["rated_count"] += 0 if rating is None else 1
+            rollup["rating_sum"] += float(rating or 0)
+            rollup["rating_sumsq"] += float(rating or 0) ** 2
+            rollup["archived_through"] = max(filter(None, [rollup.get("archived_through"), e["created_at"]]))
+        return len(batch)
+
+    def merge_bottle_events(winner: int, losers: list, batch_size: int = 5000) -> int:
+        if winner in losers:
+            raise ValueError(f"winner {winner} is also listed as a loser")
+        n = 0
+        for table in ("events", "events_archive"):
+            for e in db.tables[table]:
+                if n >= batch_size:
+                    return n
+                if e.get("bottle_id") in losers:
+                    e["bottle_id"] = winner
+                    n += 1
+        return n
+
+    def finish_bottle_merge(winner: int, losers: list) -> int:
+        if winner in losers:
+            raise ValueError(f"winner {winner} is also listed as a loser")
+        if winner not in db.by_id["bottles"]:
+            raise ValueError(f"winner bottle {winner} not found")
+        merge_bottle_events(winner, losers, batch_size=len(db.tables["events"]) + len(db.tables["events_archive"]))
+
+        def category(bid) -> str:
+            return (db.by_id["bottles"].get(bid, {}).get("category") or "").strip() or "Uncategorized"
+
+        for per_bottle in [r for r in db.tables["device_bottle_stats"] if r["bottle_id"] in losers]:
+            token, n = per_bottle["device_token"], per_bottle["pour_count"]
+            _upsert(db, "device_category_stats", {"device_token": token, "category": category(per_bottle["bottle_id"])},
+                    pour_count=0)["pour_count"] -= n
+            _upsert(db, "device_category_stats", {"device_token": token, "category": category(winner)},
+                    pour_count=0)["pour_count"] += n
+        _drop(db, "device_category_stats", lambda r: r["pour_count"] <= 0)
+
+        sums = ("pour_count", "rated_count", "rating_sum", "rating_sumsq")
+        latest = ("last_pour_at", "archived_through")
+        for table in ("device_bottle_stats", "bottle_daily_stats", "location_bottle_stats", "bottle_rating_archive"):
+            for r in [r for r in db.tables[table] if r["bottle_id"] in losers]:
+                key = {k: v for k, v in r.items() if k not in sums + latest}
+                into = _upsert(db, table, {**key, "bottle_id": winner}, **{c: 0 for c in sums if c in r})
+                for c in sums:
+                    if c in r:
+                        into[c] += r[c]
+                for c in latest:
+                    if r.get(c):
+                        into[c] = max(filter(None, [into.get(c), r[c]]))
+            _drop(db, table, lambda r: r["bottle_id"] in losers)
+
+        now = datetime.now(timezone.utc).isoformat()
+        for m in db.tables["bottle_merges"]:
+            if m["winner_id"] in losers:
+                m.update(winner_id=winner, merged_at=now)
+        for loser in losers:
+            _upsert(db, "bottle_merges", {"loser_id": loser}).update(winner_id=winner, merged_at=now)
+
+        removed = [b for b in db.tables["bottles"] if b["id"] in losers]
+        _drop(db, "bottles", lambda b: b["id"] in losers)
+        for b in removed:
+            db.by_id["bottles"].pop(b["id"], None)
+        version = _upsert(db, "catalog_version", {"id": True}, version=0, row_count=0)
+        version["version"] += len(removed)
+        version["row_count"] -= len(removed)
+        return len(removed)
+
+    db.after_insert["events"].append(device_stats_trigger)
+    db.after_insert["events"].append(bottle_daily_trigger)
+    db.after_insert["events"].append(location_trigger)
+    db.after_insert["bottles"].append(catalog_version_trigger)
+    db.views["drinker_leaderboard"] = drinker_leaderboard
+    db.functions["device_stats_for"] = device_stats_for
+    db.functions["archive_events"] = archive_events
+    db.functions["merge_bottle_events"] = merge_bottle_events
+    db.functions["finish_bottle_merge"] = finish_bottle_merge
+
+
+def _upsert(db: LocalBackend, table: str, key: dict, **defaults) -> dict:
+    k = tuple(sorted(key.items()))
+    row = db.keyed[table].get(k)
+    if row is None:
+        row = {**key, **defaults}
+        db.tables[table].append(row)
+        db.keyed[table][k] = row
+    return row
+
+
+def _drop(db: LocalBackend, table: str, pred: Callable[[dict], bool]) -> None:
+    db.tables[table] = [r for r in db.tables[table] if not pred(r)]
+    db.keyed[table] = {k: r for k, r in db.keyed[table].items() if not pred(r)}
+
+
+# ------------------------------------------------------------
+# Demo data
+# ------------------------------------------------------------
+_BRANDS = [
+    "Buffalo Trace", "Four Roses", "Maker's Mark", "Wild Turkey", "Woodford Reserve",
+    "Elijah Craig", "Old Forester", "Heaven Hill", "Knob Creek", "Eagle Rare",
+    "Weller", "Russell's Reserve", "Larceny", "Michter's", "1792",
+]
+_EXPRESSIONS = ["", "Small Batch", "Single Barrel", "Bottled in Bond", "Barrel Proof", "Rye", "12 Year", "Toasted"]
+_CATEGORIES = ["Core", "Limited", "Allocated", "Craft", "Sourced"]
+_MASHBILLS = ["Low Rye", "High Rye", "Wheated", "Rye"]
+_LOCATIONS = ["The Oak Room", "Barrel House, Louisville", "Couch", "Bourbon Bar, Chicago", None]
+
+
+def seed_demo_data(db: LocalBackend, n_bottles: int = 500, n_events: int = 5000, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    names = set()
+    for i in range(n_bottles):
+        brand = rng.choice(_BRANDS)
+        expr = f"{rng.choice(_EXPRESSIONS)} #{i}".strip()
+        if (brand, expr) in names:
+            continue
+        names.add((brand, expr))
+        db.table("bottles").insert(
+            {
+                "brand": brand,
+                "expression": expr,
+                "category": rng.choice(_CATEGORIES),
+                "mashbill_style": rng.choice(_MASHBILLS),
+                "proof": round(rng.uniform(80, 130), 1),
+                "distillery": brand,
+                "distillery_location": "Kentucky",
+                "barrel_type": "New Charred Oak",
+                # Like rows that predate bottles.created_at (visit_digest migration)
+                "created_at": None,
+            }
+        ).execute()
+
+    bottle_ids = [b["id"] for b in db.tables["bottles"]]
+    devices = [f"demo-device-{i}" for i in range(max(1, n_events // 50))]
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / max(1, n_events)
+    for i in range(n_events):
+        dev = rng.choice(devices)
+        db.table("events").insert(
+            {
+                "event_type": "having_a_glass",
+                "bottle_id": rng.choice(bottle_ids),
+                "rating": rng.randint(3, 10),
+                "message": None,
+                "location": rng.choice(_LOCATIONS),
+                "author_display_name": f"Drinker {dev.rsplit('-', 1)[-1]}",
+                "author_device_token": dev,
+                "created_at": (start + step * i).isoformat(),
+            }
+        ).execute()
+
+    db.calls.clear()
+
+
+_backend: Optional[LocalBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_local_backend() -> LocalBackend:
+    """One stand-in per process, seeded with demo data on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                db = LocalBackend()
+                seed_demo_data(db)
+                _backend = db
+    return _backend
+
+
+def set_local_backend(db: LocalBackend) -> None:
+    """Install a prepared stand-in (e.g. larger seed, added latency) before pages run."""
+    global _backend
+    with _backend_lock:
+        _backend = db
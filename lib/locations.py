@@ -0,0 +1,115 @@
+# lib/locations.py
+# Pour locations: free text -> canonical keys, plus the per-location aggregates.
+#
+#   "The Oak Room"              -> place "oak room"
+#   "Barrel House, Louisville"  -> place "barrel house louisville", city "louisville"
+#
+# normalize_location() must match public.normalize_location() in
+# supabase/migrations/20261019000400_location_index.sql: the trigger stamps
+# events.location_key / city_key with it, and queries filter on those indexed keys.
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from lib.cache import get_cache
+from lib.db import iter_keyset_rows
+from lib.materialize import SCHEDULER
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+LOCATIONS_TTL_SECONDS = 300
+LOCATION_STATS_TTL_SECONDS = 60
+# Locations offered in pickers, busiest first
+LOCATIONS_MAX = 500
+
+# Location kind -> events column holding its key
+KIND_COLUMNS = {"place": "location_key", "city": "city_key"}
+
+_locations_cache = get_cache("locations", ttl=LOCATIONS_TTL_SECONDS, max_entries=1, shared=True)
+_location_stats_cache = get_cache("location_stats", ttl=LOCATION_STATS_TTL_SECONDS, max_entries=256, shared=True)
+
+
+def normalize_location(raw: Optional[str]) -> Optional[str]:
+    s = re.sub(r"[^a-z0-9]+", " ", (raw or "").lower())
+    s = re.sub(r"\s+", " ", s).strip()
+    s = re.sub(r"^the ", "", s)
+    return s or None
+
+
+def city_of(raw: Optional[str]) -> Optional[str]:
+    """Normalized text after the last comma ("Bar, City"), if any."""
+    if not raw or "," not in raw:
+        return None
+    return normalize_location(raw.rsplit(",", 1)[1])
+
+
+def location_keys(raw: Optional[str]) -> list[tuple[str, str]]:
+    """[(kind, key)] a pour at `raw` is indexed under."""
+    out = []
+    place = normalize_location(raw)
+    if place:
+        out.append(("place", place))
+    city = city_of(raw)
+    if city and city != place:
+        out.append(("city", city))
+    return out
+
+
+def fetch_locations() -> list[dict]:
+    sb = get_client()
+    q = (
+        sb.table("locations")
+        .select("kind, location_key, label, pour_count")
+        .order("pour_count", desc=True)
+        .limit(LOCATIONS_MAX)
+    )
+    return (execute(q, table="locations").data) or []
+
+
+def get_locations() -> list[dict]:
+    """[{kind, location_key, label, pour_count}], busiest first. Materialized in the background."""
+    return SCHEDULER.read("locations")
+
+
+def location_label(loc: dict) -> str:
+    label = (loc.get("label") or loc["location_key"]).strip()
+    return f"{label} (city)" if loc["kind"] == "city" else label
+
+
+def fetch_location_bottle_stats(kind: str, key: str) -> dict:
+    """All-time per-bottle aggregates at one location, in rankings shape."""
+    rows = iter_keyset_rows(
+        get_client(),
+        "location_bottle_stats",
+        "bottle_id, rated_count, rating_sum",
+        keys=("bottle_id",),
+        filters=lambda q: q.eq("kind", kind).eq("location_key", key),
+    )
+    out = []
+    rated = 0
+    for r in rows:
+        n = int(r.get("rated_count") or 0)
+        if not n:
+            continue
+        out.append({"bottle_id": r["bottle_id"], "avg_rating": float(r["rating_sum"]) / n, "rating_count": n})
+        rated += n
+    return {"rows": out, "rated_pours": rated}
+
+
+def get_location_bottle_stats(kind: str, key: str) -> dict:
+    return _location_stats_cache.get_or_load((kind, key), lambda: fetch_location_bottle_stats(kind, key))
+
+
+def invalidate_locations() -> None:
+    _locations_cache.invalidate()
+    _location_stats_cache.invalidate()
+
+
+SCHEDULER.register(
+    "locations",
+    compute=lambda: _locations_cache.get_or_load("all", fetch_locations),
+    every=LOCATIONS_TTL_SECONDS,
+    depends_on=("events",),
+    on_dirty=lambda: _locations_cache.invalidate("all"),
+)
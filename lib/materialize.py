@@ -0,0 +1,238 @@
+# lib/materialize.py
+# In-process scheduler for materialized views (leaderboards and other derived data).
+#
+# A view is a named compute function with a cadence and the input sources it depends
+# on. One scheduler thread per process recomputes a view when its cadence comes round,
+# or soon after mark_dirty(source) for one of its inputs. Pages call read(), which
+# returns the last finished result from memory; they never run the aggregation
+# themselves except for the very first result after a cold start.
+#
+#   SCHEDULER.register("rankings:All time", compute, every=60, depends_on=("events",))
+#   board = SCHEDULER.read("rankings:All time")
+#
+# A view never has two computes in flight (no stampede), and a failed compute keeps
+# the last good result and retries on the next cadence. A view's min_interval caps how
+# often mark_dirty() can make it recompute, however fast its inputs change.
+#
+# Views registered with takes_progress=True get a progress(*args) callback; a read()
+# waiting for the first result relays the latest report to its own callback on the
+# reader's thread.
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence
+
+WORKERS = 4
+# After mark_dirty, wait this long for more changes before recomputing (debounce)
+DIRTY_DELAY_SECONDS = 2.0
+# How long read() blocks for a view's first result
+FIRST_RESULT_TIMEOUT_SECONDS = 30.0
+# How often a waiting read() relays compute progress
+PROGRESS_POLL_SECONDS = 0.25
+
+_MISSING = object()
+
+
+class ViewNotReady(RuntimeError):
+    """The view has no finished result yet (first compute failed or timed out)."""
+
+    def __init__(self, message: str, building: bool = False):
+        super().__init__(message)
+        # The first compute is still running; a later read will have it
+        self.building = building
+
+
+@dataclass
+class View:
+    name: str
+    compute: Callable[[], Any]
+    every: float
+    depends_on: tuple[str, ...] = ()
+    # Called before a dirty-triggered compute, e.g. to drop a backing shared-cache key
+    on_dirty: Optional[Callable[[], None]] = None
+    # compute(progress) instead of compute()
+    takes_progress: bool = False
+    # A dirty-triggered compute starts no sooner than this after the previous one started
+    min_interval: float = 0.0
+
+    value: Any = _MISSING
+    computed_at: Optional[float] = None  # wall clock, for display
+    duration: float = 0.0
+    error: Optional[str] = None
+    runs: int = 0
+    failures: int = 0
+    next_due: float = 0.0  # monotonic
+    started_at: Optional[float] = None  # monotonic, of the latest compute
+    dirty: bool = False
+    running: bool = False
+    # Latest progress report of the running compute
+    progress: Optional[tuple] = None
+    ready: threading.Event = field(default_factory=threading.Event)
+
+
+class Scheduler:
+    def __init__(self, workers: int = WORKERS):
+        self._views: dict[str, View] = {}
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="materialize")
+        self._thread: Optional[threading.Thread] = None
+
+    def register(
+        self,
+        name: str,
+        compute: Callable[[], Any],
+        every: float,
+        depends_on: Sequence[str] = (),
+        on_dirty: Optional[Callable[[], None]] = None,
+        takes_progress: bool = False,
+        min_interval: float = 0.0,
+    ) -> None:
+        with self._cond:
+            if name in self._views:
+                return
+            self._views[name] = View(
+                name, compute, every, tuple(depends_on), on_dirty, takes_progress, min_interval
+            )
+            self._cond.notify()
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="materialize-scheduler", daemon=True)
+                self._thread.start()
+
+    def mark_dirty(self, source: str) -> None:
+        """Inputs changed: recompute dependent views after DIRTY_DELAY_SECONDS (and min_interval)."""
+        due = time.monotonic() + DIRTY_DELAY_SECONDS
+        with self._cond:
+            for v in self._views.values():
+                if source in v.depends_on:
+                    v.dirty = True
+                    v.next_due = min(v.next_due, max(due, self._earliest(v)))
+            self._cond.notify()
+
+    def read(
+        self,
+        name: str,
+        timeout: float = FIRST_RESULT_TIMEOUT_SECONDS,
+        progress: Optional[Callable[..., None]] = None,
+    ) -> Any:
+        """
+        The last finished result. Blocks only until the first one exists, relaying the
+        compute's progress reports to `progress` meanwhile.
+        """
+        with self._cond:
+            view = self._views[name]
+            value = view.value
+        if value is not _MISSING:
+            return value
+
+        self.start()
+        self._kick(view)
+        deadline = time.monotonic() + timeout
+        reported = None
+        while not view.ready.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            view.ready.wait(min(remaining, PROGRESS_POLL_SECONDS) if progress else remaining)
+            with self._cond:
+                latest = view.progress
+            if progress is not None and latest is not None and latest != reported:
+                reported = latest
+                progress(*latest)
+        with self._cond:
+            if view.value is _MISSING:
+                raise ViewNotReady(f"{name}: {view.error or 'no result yet'}", building=view.running)
+            return view.value
+
+    def freshness(self, name: str) -> dict:
+        with self._cond:
+            v = self._views[name]
+            age = None if v.computed_at is None else time.time() - v.computed_at
+            return {
+                "computed_at": v.computed_at,
+                "age_seconds": age,
+                "duration_seconds": v.duration,
+                "error": v.error,
+                "runs": v.runs,
+                "failures": v.failures,
+                "running": v.running,
+            }
+
+    def names(self) -> list[str]:
+        with self._cond:
+            return list(self._views)
+
+    # ---- internals ----
+    def _kick(self, view: View) -> None:
+        with self._cond:
+            if view.value is _MISSING:
+                view.ready.clear()
+            view.next_due = 0.0
+            self._cond.notify()
+
+    @staticmethod
+    def _earliest(view: View) -> float:
+        """When min_interval allows the next compute to start."""
+        return 0.0 if view.started_at is None else view.started_at + view.min_interval
+
+    def _report(self, view: View, args: tuple) -> None:
+        with self._cond:
+            view.progress = args
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [v for v in self._views.values() if not v.running and v.next_due <= now]
+                for v in due:
+                    v.running = True
+                if not due:
+                    waits = [v.next_due - now for v in self._views.values() if not v.running]
+                    self._cond.wait(timeout=max(0.05, min(waits)) if waits else None)
+                    continue
+            for v in due:
+                self._pool.submit(self._run, v)
+
+    def _run(self, view: View) -> None:
+        t0 = time.perf_counter()
+        with self._cond:
+            dirty = view.dirty
+            view.dirty = False
+            view.progress = None
+            view.started_at = time.monotonic()
+        try:
+            if dirty and view.on_dirty is not None:
+                view.on_dirty()
+            if view.takes_progress:
+                value = view.compute(lambda *args: self._report(view, args))
+            else:
+                value = view.compute()
+        except Exception as e:
+            with self._cond:
+                view.error = str(e)
+                view.failures += 1
+        else:
+            with self._cond:
+                view.value = value
+                view.computed_at = time.time()
+                view.error = None
+        finally:
+            with self._cond:
+                view.duration = time.perf_counter() - t0
+                view.runs += 1
+                view.running = False
+                # A change that arrived mid-compute keeps its earlier due time, within min_interval
+                if view.dirty:
+                    view.next_due = max(view.next_due, self._earliest(view))
+                else:
+                    view.next_due = time.monotonic() + view.every
+                self._cond.notify()
+            view.ready.set()
+
+
+SCHEDULER = Scheduler()
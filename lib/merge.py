@@ -0,0 +1,168 @@
+# lib/merge.py
+# Consolidate duplicate bottles: every pour of the losers moves to the winner.
+#
+#   merge_bottles(winner_id, [dup_id, ...], progress=...)
+#
+# Pours are re-pointed in batches (merge_bottle_events, one short transaction each),
+# then finish_bottle_merge adds the losers' rollup rows into the winner's and deletes
+# the losers. See supabase/migrations/20261019000700_merge_bottles.sql. Both functions
+# need the service key, so merges run from scripts/merge_bottles.py or the admin
+# section of the Bottles page (enabled by an ADMIN_PASSCODE secret). Wrong passcodes
+# are throttled per device and per process, and logged.
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+import streamlit as st
+
+from lib.catalog import invalidate_catalog
+from lib.digest import invalidate_digests
+from lib.drinkers import invalidate_drinker
+from lib.feed import invalidate_feed
+from lib.locations import invalidate_locations
+from lib.materialize import SCHEDULER
+from lib.pour_queue import POUR_WRITER
+from lib.rankings import invalidate_rankings
+from lib.ratelimit import get_limiter
+from lib.resilience import execute
+from lib.supabase_client import get_admin_client
+from lib.trends import invalidate_trends
+
+MERGE_BATCH_SIZE = 5000
+FINISH_TIMEOUT_SECONDS = 60.0
+
+# progress(pours_moved, pours_total)
+MergeProgressFn = Callable[[int, int], None]
+
+log = logging.getLogger(__name__)
+
+# Wrong passcodes: 5 per device, then one per 5 minutes; 20 per process, then one a minute.
+# Repeating the same wrong guess (e.g. on every rerun) is coalesced and not counted again.
+PASSCODE_LIMITER = get_limiter(
+    "admin_passcode",
+    per_device_rate=1 / 300,
+    per_device_burst=5,
+    global_rate=1 / 60,
+    global_burst=20,
+    fingerprint_keys=("guess",),
+    coalesce_seconds=300,
+)
+
+
+@dataclass
+class MergeResult:
+    winner: int
+    losers: list[int]
+    pours_moved: int
+    bottles_removed: int
+    seconds: float
+
+
+@dataclass(frozen=True)
+class PasscodeCheck:
+    ok: bool
+    # Seconds until another guess is accepted; 0 unless locked out
+    locked_for: float = 0.0
+
+
+def admin_passcode() -> Optional[str]:
+    """None (admin section hidden) when no passcode is configured, including no secrets.toml."""
+    env = os.environ.get("VISCOSITY_ADMIN_PASSCODE")
+    if env:
+        return env
+    try:
+        return st.secrets.get("ADMIN_PASSCODE")
+    except FileNotFoundError:
+        # No secrets.toml at all (local backend, load test); StreamlitSecretNotFoundError subclasses it
+        return None
+
+
+def check_admin_passcode(entered: str, device_token: str) -> PasscodeCheck:
+    """A locked-out device (or process) is refused before the passcode is even compared."""
+    blocked = PASSCODE_LIMITER.check(device_token)
+    if not blocked.allowed:
+        return PasscodeCheck(False, blocked.retry_after)
+
+    expected = admin_passcode()
+    if expected and entered and hmac.compare_digest(entered.encode(), expected.encode()):
+        return PasscodeCheck(True)
+
+    guess = {"guess": hashlib.sha256(entered.encode()).hexdigest()}
+    decision = PASSCODE_LIMITER.admit(device_token, guess)
+    if decision.reason == "duplicate":
+        return PasscodeCheck(False)
+    if decision.allowed:
+        PASSCODE_LIMITER.record(device_token, guess)
+    device = hashlib.sha256(device_token.encode()).hexdigest()[:12]
+    log.warning("admin passcode: wrong guess from device %s", device)
+    return PasscodeCheck(False, 0.0 if decision.allowed else decision.retry_after)
+
+
+def count_pours(sb, bottle_ids: list[int]) -> int:
+    """Hot pours for these bottles (index-only count); archived pours are not counted."""
+    q = sb.table("events").select("id", count="exact").in_("bottle_id", bottle_ids).limit(1)
+    return int(execute(q, table="events").count or 0)
+
+
+def merge_bottles(
+    winner: int,
+    losers: Iterable[int],
+    progress: Optional[MergeProgressFn] = None,
+    batch_size: int = MERGE_BATCH_SIZE,
+) -> MergeResult:
+    """Fold `losers` into `winner`. Safe to re-run if interrupted part way."""
+    winner = int(winner)
+    losers = sorted({int(b) for b in losers} - {winner})
+    if not losers:
+        raise ValueError("Pick at least one other bottle to merge.")
+    sb = get_admin_client()
+    if sb is None:
+        raise RuntimeError("Merging needs SUPABASE_SERVICE_KEY.")
+
+    t0 = time.perf_counter()
+    # Queued pours for a loser would fail once it is deleted; this process's move now
+    POUR_WRITER.repoint(losers, winner)
+    total = count_pours(sb, losers) if progress else 0
+    moved = 0
+    while True:
+        res = execute(
+            sb.rpc("merge_bottle_events", {"winner": winner, "losers": losers, "batch_size": batch_size}),
+            table="events",
+            op="merge",
+        )
+        n = int(res.data or 0)
+        if not n:
+            break
+        moved += n
+        if progress:
+            progress(moved, max(total, moved))
+
+    POUR_WRITER.repoint(losers, winner)
+    res = execute(
+        sb.rpc("finish_bottle_merge", {"winner": winner, "losers": losers}),
+        table="bottles",
+        op="merge",
+        timeout=FINISH_TIMEOUT_SECONDS,
+    )
+    refresh_after_merge(winner, losers)
+    return MergeResult(winner, losers, moved, int(res.data or 0), time.perf_counter() - t0)
+
+
+def refresh_after_merge(winner: int, losers: list[int]) -> None:
+    """One invalidation pass for everything a merge touches."""
+    invalidate_catalog()
+    invalidate_feed()
+    for bid in [winner, *losers]:
+        invalidate_feed(bid)
+        invalidate_trends(bid)
+    invalidate_rankings()
+    invalidate_locations()
+    invalidate_drinker()
+    invalidate_digests()
+    SCHEDULER.mark_dirty("events")
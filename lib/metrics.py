@@ -0,0 +1,338 @@
+# lib/metrics.py
+# Process-level metrics in the Prometheus text exposition format (no client library).
+#
+#   VISCOSITY_METRICS_PORT=9464     serve http://127.0.0.1:9464/metrics; with several
+#                                   server processes each takes the next free port
+#                                   (9464, 9465, ... up to PORT_RANGE), so scrape them all
+#   VISCOSITY_METRICS_FILE=/dir/viscosity.prom
+#                                   each process rewrites /dir/viscosity-<pid>.prom every
+#                                   METRICS_FILE_SECONDS (e.g. for node_exporter's textfile
+#                                   collector) and removes it on exit
+#
+# Every sample carries a pid label, so series from different processes never collide
+# or look like counter resets.
+#
+# Histograms are recorded where things happen (backend calls in
+# lib/resilience.py, page reruns via track_rerun()). Everything that already keeps its
+# own counters (caches, the pour queue, limiters, the breaker, materialized views) is
+# read at scrape time, and only for modules this process has imported.
+from __future__ import annotations
+
+import atexit
+import logging
+import math
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable, Optional
+
+import streamlit as st
+
+METRICS_PORT = os.environ.get("VISCOSITY_METRICS_PORT")
+METRICS_FILE = os.environ.get("VISCOSITY_METRICS_FILE")
+METRICS_FILE_SECONDS = 15.0
+# Ports tried from VISCOSITY_METRICS_PORT upwards, one per server process
+PORT_RANGE = 16
+# A session counts as active if it reran within this window
+ACTIVE_SESSION_SECONDS = 300.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RERUN_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (metric name, labels, value)
+Sample = tuple[str, dict, float]
+
+log = logging.getLogger(__name__)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    labels = {"pid": os.getpid(), **labels}
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _num(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        with self._lock:
+            v = self._values.get(labelvalues)
+            if v is None:
+                v = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+                    break
+            else:
+                v[len(self.buckets)] += 1
+            v[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, v in items:
+            labels = dict(zip(self.labelnames, k))
+            running = 0.0
+            for bound, n in zip((*self.buckets, math.inf), v):
+                running += n
+                out.append(f"{self.name}_bucket{_labels({**labels, 'le': _num(bound)})} {_num(running)}")
+            out.append(f"{self.name}_sum{_labels(labels)} {_num(v[-1])}")
+            out.append(f"{self.name}_count{_labels(labels)} {_num(running)}")
+        return out
+
+
+BACKEND_SECONDS = Histogram(
+    "viscosity_backend_call_seconds", "Backend call latency per attempt.", ("table", "op", "outcome")
+)
+RERUN_SECONDS = Histogram(
+    "viscosity_rerun_seconds", "Page script rerun duration.", ("page",), buckets=RERUN_BUCKETS
+)
+_METRICS = (BACKEND_SECONDS, RERUN_SECONDS)
+
+
+# ------------------------------------------------------------
+# Reruns and sessions
+# ------------------------------------------------------------
+_sessions: dict[str, float] = {}
+_sessions_lock = threading.Lock()
+_open_rerun = threading.local()
+
+
+class _RerunTimer:
+    def __init__(self, page: str):
+        self.page = page
+        self.t0 = time.perf_counter()
+        self.closed = False
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            RERUN_SECONDS.observe(time.perf_counter() - self.t0, self.page)
+
+    def __del__(self):
+        self.close()
+
+
+def track_rerun(page: str) -> None:
+    """
+    Call at the top of a page. The rerun is timed until its script thread moves on to the
+    next rerun or exits (thread-local state is released then), so st.stop(), st.rerun()
+    and exceptions end the measurement too without any call at the bottom of the page.
+    """
+    prev = getattr(_open_rerun, "timer", None)
+    if prev is not None:
+        prev.close()
+    _open_rerun.timer = _RerunTimer(page)
+
+    sid = st.session_state.setdefault("_metrics_session_id", uuid.uuid4().hex)
+    now = time.monotonic()
+    with _sessions_lock:
+        _sessions[sid] = now
+        if len(_sessions) > 1000:
+            for k in [k for k, t in _sessions.items() if now - t > ACTIVE_SESSION_SECONDS]:
+                del _sessions[k]
+
+
+def active_sessions() -> int:
+    now = time.monotonic()
+    with _sessions_lock:
+        return sum(1 for t in _sessions.values() if now - t <= ACTIVE_SESSION_SECONDS)
+
+
+# ------------------------------------------------------------
+# Scrape-time collection
+# ------------------------------------------------------------
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak RSS: KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _gauge(name: str, help: str, samples: Iterable[Sample], kind: str = "gauge") -> list[str]:
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    out += [f"{n}{_labels(labels)} {_num(v)}" for n, labels, v in samples]
+    return out
+
+
+def _single(name: str, help: str, value: float, kind: str = "gauge") -> list[str]:
+    return _gauge(name, help, [(name, {}, value)], kind)
+
+
+def _collect() -> list[str]:
+    out: list[str] = []
+    out += _single("viscosity_process_resident_memory_bytes", "Resident set size.", rss_bytes())
+    active_help = f"Sessions that reran in the last {int(ACTIVE_SESSION_SECONDS)}s."
+    out += _single("viscosity_active_sessions", active_help, active_sessions())
+
+    cache = sys.modules.get("lib.cache")
+    if cache is not None:
+        stats = [c.stats() for c in cache.all_caches()]
+        for field, kind, help in (
+            ("hits", "counter", "Cache lookups served from memory."),
+            ("misses", "counter", "Cache lookups that had to load."),
+            ("evictions", "counter", "Entries dropped to stay under max_entries."),
+            ("shared_hits", "counter", "Loads satisfied from the cross-process store."),
+            ("stale_served", "counter", "Stale values served because a refresh failed."),
+            ("entries", "gauge", "Entries held in this process."),
+        ):
+            name = f"viscosity_cache_{field}" + ("_total" if kind == "counter" else "")
+            out += _gauge(name, help, [(name, {"cache": s["name"]}, s[field]) for s in stats], kind)
+
+    pour_queue = sys.modules.get("lib.pour_queue")
+    if pour_queue is not None:
+        s = pour_queue.POUR_WRITER.stats()
+        out += _single("viscosity_pour_queue_depth", "Pours not yet written (queued, in flight or retrying).", s["pending"])
+        name = "viscosity_pour_queue_pours_total"
+        samples = [(name, {"outcome": k}, s[k]) for k in ("submitted", "written", "retries", "failed")]
+        out += _gauge(name, "Pours by outcome.", samples, "counter")
+
+    resilience = sys.modules.get("lib.resilience")
+    if resilience is not None:
+        b = resilience.BREAKER
+        out += _single("viscosity_breaker_open", "1 while the backend circuit breaker is open.", int(b.state == "open"))
+        out += _single("viscosity_breaker_opened_total", "Times the breaker has opened.", b.times_opened, "counter")
+
+    ratelimit = sys.modules.get("lib.ratelimit")
+    if ratelimit is not None:
+        name = "viscosity_limiter_decisions_total"
+        samples = [
+            (name, {"limiter": s["name"], "decision": k}, s[k])
+            for s in (lim.stats() for lim in ratelimit.all_limiters())
+            for k in ("admitted", "coalesced", "rejected_device", "rejected_global")
+        ]
+        out += _gauge(name, "Write limiter decisions.", samples, "counter")
+
+    materialize = sys.modules.get("lib.materialize")
+    if materialize is not None:
+        views = {n: materialize.SCHEDULER.freshness(n) for n in materialize.SCHEDULER.names()}
+        for name, field, help, kind in (
+            ("viscosity_view_age_seconds", "age_seconds", "Seconds since a view last computed.", "gauge"),
+            ("viscosity_view_compute_seconds", "duration_seconds", "Duration of a view's last compute.", "gauge"),
+            ("viscosity_view_failures_total", "failures", "Failed view computes.", "counter"),
+        ):
+            samples = [(name, {"view": n}, f[field]) for n, f in views.items() if f[field] is not None]
+            out += _gauge(name, help, samples, kind)
+    return out
+
+
+def render() -> str:
+    lines = []
+    for m in _METRICS:
+        lines += m.render()
+    lines += _collect()
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# Exporters
+# ------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def write_file(path: Path) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(render(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def process_file(path: Path) -> Path:
+    """This process's file: /dir/name.prom -> /dir/name-<pid>.prom."""
+    return path.with_name(f"{path.stem}-{os.getpid()}{path.suffix}")
+
+
+def _remove_dead_files(path: Path) -> None:
+    """Drop files left by processes that are gone, so their last values aren't scraped forever."""
+    for p in path.parent.glob(f"{path.stem}-*{path.suffix}"):
+        pid = p.stem.rsplit("-", 1)[-1]
+        if not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            p.unlink(missing_ok=True)
+        except OSError:
+            pass  # alive but not ours to signal
+
+
+def _file_loop(path: Path) -> None:
+    while True:
+        try:
+            write_file(path)
+        except OSError:
+            pass  # e.g. the directory went away; try again next round
+        time.sleep(METRICS_FILE_SECONDS)
+
+
+def _bind(port: int) -> Optional[ThreadingHTTPServer]:
+    """The first free port from `port` up, one per process; None (logged) if all are taken."""
+    for candidate in range(port, port + PORT_RANGE):
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", candidate), _Handler)
+        except OSError:
+            continue
+        log.info("Serving metrics on http://127.0.0.1:%d/metrics (pid %d)", candidate, os.getpid())
+        return server
+    log.error("Metrics not exported: ports %d-%d are all in use", port, port + PORT_RANGE - 1)
+    return None
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_exporters(port: Optional[str] = METRICS_PORT, path: Optional[str] = METRICS_FILE) -> None:
+    """Start the configured exporters once per process, each process on its own port and file."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    if port:
+        server = _bind(int(port))
+        if server is not None:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if path:
+        own = process_file(Path(path))
+        _remove_dead_files(Path(path))
+        atexit.register(lambda: own.unlink(missing_ok=True))
+        threading.Thread(target=_file_loop, args=(own,), name="metrics-file", daemon=True).start()
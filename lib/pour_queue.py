@@ -0,0 +1,264 @@
+# lib/pour_queue.py
+# Write-behind queue for pours: Post Pour returns as soon as the pour is queued.
+#
+# One writer thread per process drains the queue in batches (up to BATCH_MAX rows, or
+# whatever arrived within BATCH_WINDOW_SECONDS), upserts them on events.client_ref so a
+# retried batch can't double-post, then refreshes the feed / rankings / trends caches.
+# Until a pour is written it is "pending": pages merge pending pours into what they
+# show, so the poster sees it immediately.
+#
+# A batch PostgREST rejects (e.g. a pour for a bottle merged away meanwhile) is split in
+# halves until only the offending rows fail, so one bad row never costs the others.
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from postgrest.exceptions import APIError
+
+from lib.digest import invalidate_digests
+from lib.drinkers import invalidate_drinker
+from lib.feed import invalidate_feed
+from lib.locations import invalidate_locations
+from lib.materialize import SCHEDULER
+from lib.rankings import invalidate_rankings
+from lib.resilience import execute
+from lib.supabase_client import get_client
+from lib.trends import invalidate_trends
+
+BATCH_MAX = 100
+BATCH_WINDOW_SECONDS = 0.25
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 0.5
+RETRY_CAP_SECONDS = 15.0
+# Failed pours kept per device until the page shows them
+MAX_FAILED_PER_DEVICE = 20
+# How long the exit hook waits for the queue to drain
+DRAIN_ON_EXIT_SECONDS = 5.0
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingPour:
+    payload: dict
+    attempts: int = 0
+    error: Optional[str] = None
+    # Set once this flush has dealt with it: written, given up, or handed to a retry timer
+    settled: bool = False
+
+
+class PourWriter:
+    def __init__(self):
+        self._queue: queue.Queue[PendingPour] = queue.Queue()
+        # client_ref -> pour not yet written (queued, in flight, or waiting to retry)
+        self._pending: OrderedDict[str, PendingPour] = OrderedDict()
+        # device_token -> pours that gave up
+        self._failed: dict[str, list[PendingPour]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+    # ---- producer side (script threads) ----
+    def submit(self, payload: dict) -> dict:
+        """Queue a pour. Returns the payload as it will be written (with client_ref)."""
+        payload = dict(payload)
+        payload.setdefault("client_ref", uuid.uuid4().hex)
+        pour = PendingPour(payload)
+        with self._lock:
+            self._pending[payload["client_ref"]] = pour
+            self.submitted += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pour-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(pour)
+        return dict(payload)
+
+    def pending(self, bottle_id=None) -> list[dict]:
+        """Pours not yet written, newest first; only `bottle_id`'s if given."""
+        with self._lock:
+            pours = [p.payload for p in reversed(self._pending.values())]
+        if bottle_id is not None:
+            pours = [p for p in pours if p.get("bottle_id") == bottle_id]
+        return [dict(p) for p in pours]
+
+    def repoint(self, losers: list, winner) -> int:
+        """Move pours still waiting to be written from merged-away bottles to the winner."""
+        n = 0
+        with self._lock:
+            for p in self._pending.values():
+                if p.payload.get("bottle_id") in losers:
+                    p.payload["bottle_id"] = winner
+                    n += 1
+        return n
+
+    def pop_failed(self, device_token: str) -> list[dict]:
+        """Pours from this device that could not be written; each is returned once."""
+        with self._lock:
+            failed = self._failed.pop(device_token, [])
+        return [{**p.payload, "error": p.error} for p in failed]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "retries": self.retries,
+                "failed": self.failed,
+                "pending": len(self._pending),
+                "queued": self._queue.qsize(),
+            }
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for every pending pour to be written or given up."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    # ---- writer thread ----
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            try:
+                deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+                while len(batch) < BATCH_MAX:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                for p in batch:
+                    p.settled = False
+                self._flush(batch)
+            except Exception:
+                log.exception("pour writer: batch of %d failed", len(batch))
+            finally:
+                # Nothing in this batch may stay "posting…" forever
+                leftover = [p for p in batch if not p.settled]
+                if leftover:
+                    self._give_up(leftover, "internal error while posting")
+
+    def _flush(self, batch: list[PendingPour]) -> None:
+        written: list[PendingPour] = []
+        self._write(batch, written)
+        if not written:
+            return
+        rows = [p.payload for p in written]
+        try:
+            # Refresh caches before dropping the pending copies, so readers never see neither
+            refresh_after_pours(rows)
+        except Exception:
+            log.exception("pour writer: cache refresh failed after %d pours", len(rows))
+        with self._lock:
+            for p in written:
+                self._pending.pop(p.payload["client_ref"], None)
+                p.settled = True
+            self.written += len(written)
+            self.batches += 1
+
+    def _write(self, batch: list[PendingPour], written: list[PendingPour]) -> None:
+        """Upsert `batch`; a rejected batch is halved until only the rejected rows fail."""
+        try:
+            execute(
+                get_client().table("events").upsert(
+                    [p.payload for p in batch], on_conflict="client_ref", ignore_duplicates=True
+                ),
+                table="events",
+                op="insert",
+            )
+        except APIError as e:
+            # PostgREST rejected rows themselves; retrying the same row won't change that
+            if len(batch) == 1:
+                self._give_up(batch, str(e))
+                return
+            mid = len(batch) // 2
+            self._write(batch[:mid], written)
+            self._write(batch[mid:], written)
+            return
+        except Exception as e:
+            self._retry_later(batch, str(e))
+            return
+        written.extend(batch)
+
+    def _retry_later(self, batch: list[PendingPour], error: str) -> None:
+        retry, give_up = [], []
+        for p in batch:
+            p.attempts += 1
+            p.error = error
+            p.settled = True
+            (retry if p.attempts < MAX_ATTEMPTS else give_up).append(p)
+        if give_up:
+            self._give_up(give_up, error)
+        if not retry:
+            return
+        with self._lock:
+            self.retries += len(retry)
+        attempt = max(p.attempts for p in retry)
+        delay = random.uniform(0, min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * (2**attempt)))
+        # Off the writer thread, so new pours keep flowing while these wait
+        timer = threading.Timer(delay, lambda: [self._queue.put(p) for p in retry])
+        timer.daemon = True
+        timer.start()
+
+    def _give_up(self, batch: list[PendingPour], error: str) -> None:
+        with self._lock:
+            for p in batch:
+                p.error = error
+                p.settled = True
+                self._pending.pop(p.payload["client_ref"], None)
+                token = p.payload.get("author_device_token") or ""
+                failed = self._failed.setdefault(token, [])
+                failed.append(p)
+                del failed[:-MAX_FAILED_PER_DEVICE]
+            self.failed += len(batch)
+
+
+def refresh_after_pours(rows: list[dict]) -> None:
+    """Invalidate every cache a batch of new pours makes stale."""
+    invalidate_feed()
+    for bid in {r.get("bottle_id") for r in rows if r.get("bottle_id") is not None}:
+        invalidate_feed(bid)
+        invalidate_trends(bid)
+    invalidate_rankings()
+    if any(r.get("location") for r in rows):
+        invalidate_locations()
+    for token in {r.get("author_device_token") for r in rows if r.get("author_device_token")}:
+        invalidate_drinker(token)
+    invalidate_digests()
+    # Materialized boards recompute shortly; until then readers keep the last result
+    SCHEDULER.mark_dirty("events")
+
+
+def with_pending(rows: list[dict], pending: list[dict], limit: Optional[int] = None) -> list[dict]:
+    """Pending pours (marked pending=True) ahead of fetched rows, minus any already written."""
+    written = {r.get("client_ref") for r in rows if r.get("client_ref")}
+    merged = [{**p, "pending": True} for p in pending if p["client_ref"] not in written] + rows
+    return merged if limit is None else merged[:limit]
+
+
+POUR_WRITER = PourWriter()
+
+
+@atexit.register
+def _drain_on_exit() -> None:
+    POUR_WRITER.drain(DRAIN_ON_EXIT_SECONDS)
@@ -0,0 +1,48 @@
+# lib/prefetch.py
+# Speculative loads for the Bottle page, so "Open" lands on a warm cache.
+#
+# Pages call prefetch_bottles() for bottles the user is likely to open next (the top of
+# a board, the newest pours, the one just clicked). Loads run on a small background pool
+# through the same shared caches the Bottle page reads, so a page that asks while a
+# prefetch is still in flight waits for it instead of fetching twice.
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from lib.feed import get_bottle_events
+from lib.trends import get_bottle_trend
+
+PREFETCH_WORKERS = 4
+# Bottles per call; the rest of a long board is not worth the backend calls
+PREFETCH_MAX = 5
+
+# What the Bottle page reads on open (details come from the in-memory catalog)
+_LOADERS: tuple[Callable, ...] = (get_bottle_events, get_bottle_trend)
+
+_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_inflight: set = set()
+_lock = threading.Lock()
+
+
+def _load(loader: Callable, bottle_id) -> None:
+    try:
+        loader(bottle_id)
+    except Exception:
+        pass  # speculative; the Bottle page loads (and reports) it for real
+    finally:
+        with _lock:
+            _inflight.discard((loader, bottle_id))
+
+
+def prefetch_bottles(bottle_ids: Iterable, limit: int = PREFETCH_MAX) -> None:
+    """Warm recent pours and the default trend for up to `limit` bottles. Returns at once."""
+    ids = [b for b in dict.fromkeys(bottle_ids) if b is not None][:limit]
+    for bid in ids:
+        for loader in _LOADERS:
+            with _lock:
+                if (loader, bid) in _inflight:
+                    continue
+                _inflight.add((loader, bid))
+            _pool.submit(_load, loader, bid)
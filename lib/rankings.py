@@ -0,0 +1,230 @@
+# lib/rankings.py
+# Per-bottle rating aggregates behind the Rankings page.
+# Pure Python on purpose: pages that only need aggregates don't pay for importing pandas.
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, Optional
+
+from lib.cache import get_cache
+from lib.db import iter_keyset_pages, iter_keyset_rows
+from lib.drinkers import get_device_stats
+from lib.locations import KIND_COLUMNS, get_location_bottle_stats
+from lib.materialize import SCHEDULER
+from lib.supabase_client import get_client
+
+WINDOW_DAYS = {
+    "All time": None,
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+}
+RANKINGS_TTL_SECONDS = 60
+# Global boards rescan the hot table at most this often, however busy the room is; the
+# longer the window, the less one more pour moves it
+RANKINGS_MIN_RECOMPUTE_SECONDS = {
+    "All time": 180,
+    "Last 7 days": 30,
+    "Last 30 days": 60,
+    "Last 90 days": 120,
+}
+
+_rankings_cache = get_cache("ranking_aggregates", ttl=RANKINGS_TTL_SECONDS, max_entries=256, shared=True)
+
+
+def window_start_iso(window_choice: str) -> Optional[str]:
+    days = WINDOW_DAYS.get(window_choice)
+    if days is None:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+RATED_EVENT_COLUMNS = "id, bottle_id, rating, created_at"
+
+# progress(rated_pours_scanned, fraction_of_window_done)
+ProgressFn = Callable[[int, float], None]
+
+# (kind, location_key) from lib.locations, e.g. ("city", "louisville")
+Location = tuple[str, str]
+
+
+def iter_rated_event_pages(
+    window_choice: str,
+    device_token: Optional[str] = None,
+    location: Optional[Location] = None,
+) -> Iterator[list[dict]]:
+    """Rated events in (created_at, id) order, one keyset page at a time. No row cap."""
+
+    def filters(q):
+        q = q.not_.is_("rating", "null")
+        if device_token:
+            q = q.eq("author_device_token", device_token)
+        if location:
+            kind, key = location
+            q = q.eq(KIND_COLUMNS[kind], key)
+        time_min_iso = window_start_iso(window_choice)
+        if time_min_iso:
+            q = q.gte("created_at", time_min_iso)
+        return q
+
+    return iter_keyset_pages(get_client(), "events", RATED_EVENT_COLUMNS, filters=filters)
+
+
+class BottleTally:
+    """Running per-bottle rating sums. Memory grows with bottles, not with events."""
+
+    def __init__(self):
+        self.sums: dict = {}
+        self.counts: dict = {}
+        self.sumsq: dict = {}
+        self.rated = 0
+
+    def add(self, rows: Iterable[dict]) -> None:
+        """Rows with a missing bottle or non-numeric rating are skipped."""
+        sums, counts, sumsq = self.sums, self.counts, self.sumsq
+        for r in rows:
+            bid = r.get("bottle_id")
+            try:
+                rating = float(r.get("rating"))
+            except (TypeError, ValueError):
+                continue
+            if bid is None or rating != rating:  # NaN
+                continue
+            sums[bid] = sums.get(bid, 0.0) + rating
+            counts[bid] = counts.get(bid, 0) + 1
+            sumsq[bid] = sumsq.get(bid, 0.0) + rating * rating
+            self.rated += 1
+
+    def add_rollup(self, rows: Iterable[dict]) -> None:
+        """Pre-aggregated rows (bottle_id, rated_count, rating_sum, rating_sumsq), e.g. the archive."""
+        sums, counts, sumsq = self.sums, self.counts, self.sumsq
+        for r in rows:
+            bid = r.get("bottle_id")
+            n = int(r.get("rated_count") or 0)
+            if bid is None or not n:
+                continue
+            sums[bid] = sums.get(bid, 0.0) + float(r.get("rating_sum") or 0)
+            counts[bid] = counts.get(bid, 0) + n
+            sumsq[bid] = sumsq.get(bid, 0.0) + float(r.get("rating_sumsq") or 0)
+            self.rated += n
+
+    def result(self) -> dict:
+        """{"rows": [{bottle_id, avg_rating, rating_count, rating_sumsq}], "rated_pours": n}"""
+        out = [
+            {"bottle_id": bid, "avg_rating": self.sums[bid] / n, "rating_count": n, "rating_sumsq": self.sumsq[bid]}
+            for bid, n in self.counts.items()
+        ]
+        return {"rows": out, "rated_pours": self.rated}
+
+
+def aggregate_by_bottle(rows: Iterable[dict]) -> dict:
+    tally = BottleTally()
+    tally.add(rows)
+    return tally.result()
+
+
+def iter_archived_rollup() -> Iterator[dict]:
+    """Per-bottle rating rollup of events moved to events_archive (see scripts/archive_events.py)."""
+    return iter_keyset_rows(
+        get_client(),
+        "bottle_rating_archive",
+        "bottle_id, rated_count, rating_sum, rating_sumsq",
+        keys=("bottle_id",),
+    )
+
+
+def _parse_ts(iso: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def scan_rated_events(
+    window_choice: str,
+    device_token: Optional[str] = None,
+    progress: Optional[ProgressFn] = None,
+    location: Optional[Location] = None,
+) -> dict:
+    """
+    Stream every rated event in the window into a BottleTally, page by page.
+    Progress is estimated from how far the keyset cursor has moved through the window.
+    The global all-time board starts from the archived rollup; windows are shorter than
+    the archive horizon, so they only need the hot table.
+    """
+    tally = BottleTally()
+    if WINDOW_DAYS.get(window_choice) is None and not device_token and not location:
+        tally.add_rollup(iter_archived_rollup())
+    end = datetime.now(timezone.utc)
+    start = _parse_ts(window_start_iso(window_choice))
+
+    for page in iter_rated_event_pages(window_choice, device_token, location):
+        tally.add(page)
+        if progress is None:
+            continue
+        last = _parse_ts(page[-1].get("created_at"))
+        if start is None:
+            start = _parse_ts(page[0].get("created_at"))
+        fraction = 0.0
+        if start and last and end > start:
+            fraction = min(1.0, max(0.0, (last - start) / (end - start)))
+        progress(tally.rated, fraction)
+
+    return tally.result()
+
+
+def get_ranking_aggregates(
+    window_choice: str = "All time",
+    device_token: Optional[str] = None,
+    progress: Optional[ProgressFn] = None,
+    location: Optional[Location] = None,
+) -> dict:
+    if not device_token and not location:
+        # Global boards are materialized in the background; a cold read shows the scan's progress
+        return SCHEDULER.read(_view_name(window_choice), progress=progress)
+
+    all_time = WINDOW_DAYS.get(window_choice) is None
+    if all_time and location and not device_token:
+        # All-time "what's good here" is maintained per location; no event scan needed
+        return get_location_bottle_stats(*location)
+    if all_time and device_token and not location:
+        # All-time My Stats is maintained per device; no event scan needed
+        stats = get_device_stats(device_token)
+        return {"rows": stats["bottles"], "rated_pours": stats["rated_count"]}
+
+    # Anything else scans events, narrowed by the indexed location key when given
+    key = (window_choice, device_token, location)
+    return _rankings_cache.get_or_load(
+        key, lambda: scan_rated_events(window_choice, device_token, progress, location)
+    )
+
+
+def ranking_freshness(window_choice: str) -> dict:
+    """computed_at / age_seconds / error of the global board for this window."""
+    return SCHEDULER.freshness(_view_name(window_choice))
+
+
+def invalidate_rankings() -> None:
+    _rankings_cache.invalidate()
+
+
+# ------------------------------------------------------------
+# Materialized global boards, one per window
+# ------------------------------------------------------------
+def _view_name(window_choice: str) -> str:
+    return f"rankings:{window_choice}"
+
+
+for _window in WINDOW_DAYS:
+    # Backed by the shared cache, so a board another process just built is adopted, not rescanned
+    SCHEDULER.register(
+        _view_name(_window),
+        compute=lambda progress, w=_window: _rankings_cache.get_or_load(
+            (w, None, None), lambda: scan_rated_events(w, progress=progress)
+        ),
+        every=max(RANKINGS_TTL_SECONDS, RANKINGS_MIN_RECOMPUTE_SECONDS[_window]),
+        depends_on=("events",),
+        on_dirty=lambda w=_window: _rankings_cache.invalidate((w, None, None)),
+        takes_progress=True,
+        min_interval=RANKINGS_MIN_RECOMPUTE_SECONDS[_window],
+    )
@@ -0,0 +1,244 @@
+# lib/ratelimit.py
+# In-process admission control for backend writes.
+#
+# Every write path asks a WriteLimiter first. A write is admitted only if
+#   1) it is not a near-identical repeat of the same device's last writes, and
+#   2) the device's token bucket has a token, and
+#   3) the process-wide token bucket has a token.
+# Limits are per server process; with N replicas the global ceiling is N x global_rate.
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from lib.catalog import norm_key
+
+# Per-device buckets kept in memory; least recently active devices are dropped first
+MAX_TRACKED_DEVICES = 10000
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def refund(self, n: float = 1.0) -> None:
+        self.tokens = min(self.capacity, self.tokens + n)
+
+    def retry_after(self, n: float = 1.0) -> float:
+        """Seconds until `n` tokens are available."""
+        self._refill(time.monotonic())
+        missing = n - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    # "ok", "duplicate", "device_limit" or "global_limit"
+    reason: str = "ok"
+    retry_after: float = 0.0
+
+
+class WriteLimiter:
+    def __init__(
+        self,
+        name: str,
+        per_device_rate: float,
+        per_device_burst: float,
+        global_rate: float,
+        global_burst: float,
+        fingerprint_keys: Sequence[str] = (),
+        coalesce_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.per_device_rate = per_device_rate
+        self.per_device_burst = per_device_burst
+        self.fingerprint_keys = tuple(fingerprint_keys)
+        self.coalesce_seconds = coalesce_seconds
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._devices: OrderedDict[str, TokenBucket] = OrderedDict()
+        # device_token -> {fingerprint: monotonic time of last accepted write}
+        self._recent: OrderedDict[str, dict[tuple, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.coalesced = 0
+        self.rejected_device = 0
+        self.rejected_global = 0
+
+    def _fingerprint(self, payload: dict) -> tuple:
+        out = []
+        for k in self.fingerprint_keys:
+            v = payload.get(k)
+            out.append(norm_key(v) if isinstance(v, str) else v)
+        return tuple(out)
+
+    def _device_bucket(self, device_token: str) -> TokenBucket:
+        bucket = self._devices.get(device_token)
+        if bucket is None:
+            bucket = TokenBucket(self.per_device_rate, self.per_device_burst)
+            self._devices[device_token] = bucket
+            while len(self._devices) > MAX_TRACKED_DEVICES:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_token)
+        return bucket
+
+    def _is_duplicate(self, device_token: str, fp: tuple, now: float) -> bool:
+        seen = self._recent.get(device_token)
+        if not seen:
+            return False
+        for k in [k for k, t in seen.items() if now - t > self.coalesce_seconds]:
+            del seen[k]
+        return fp in seen
+
+    def admit(self, device_token: str, payload: Optional[dict] = None) -> Decision:
+        """Decide whether this write may go to the backend. Consumes tokens if allowed."""
+        now = time.monotonic()
+        with self._lock:
+            if payload is not None and self.fingerprint_keys:
+                if self._is_duplicate(device_token, self._fingerprint(payload), now):
+                    self.coalesced += 1
+                    return Decision(False, "duplicate")
+
+            device = self._device_bucket(device_token)
+            if not device.try_acquire():
+                self.rejected_device += 1
+                return Decision(False, "device_limit", device.retry_after())
+
+            if not self._global.try_acquire():
+                device.refund()
+                self.rejected_global += 1
+                return Decision(False, "global_limit", self._global.retry_after())
+
+            self.admitted += 1
+            return Decision(True)
+
+    def check(self, device_token: str) -> Decision:
+        """Would a write from this device be admitted now (ignoring duplicates)? Consumes nothing."""
+        with self._lock:
+            wait = self._device_bucket(device_token).retry_after()
+            if wait > 0:
+                return Decision(False, "device_limit", wait)
+            wait = self._global.retry_after()
+            if wait > 0:
+                return Decision(False, "global_limit", wait)
+            return Decision(True)
+
+    def record(self, device_token: str, payload: dict) -> None:
+        """Remember a write that succeeded, so an identical repeat is coalesced."""
+        if not self.fingerprint_keys:
+            return
+        with self._lock:
+            seen = self._recent.setdefault(device_token, {})
+            seen[self._fingerprint(payload)] = time.monotonic()
+            self._recent.move_to_end(device_token)
+            while len(self._recent) > MAX_TRACKED_DEVICES:
+                self._recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "admitted": self.admitted,
+                "coalesced": self.coalesced,
+                "rejected_device": self.rejected_device,
+                "rejected_global": self.rejected_global,
+                "tracked_devices": len(self._devices),
+            }
+
+
+_registry: dict[str, WriteLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name: str, **kwargs) -> WriteLimiter:
+    """Return the process-wide limiter called `name`, creating it on first use."""
+    with _registry_lock:
+        limiter = _registry.get(name)
+        if limiter is None:
+            limiter = WriteLimiter(name, **kwargs)
+            _registry[name] = limiter
+        return limiter
+
+
+def all_limiters() -> list[WriteLimiter]:
+    with _registry_lock:
+        return list(_registry.values())
+
+
+# ------------------------------------------------------------
+# Write paths
+# ------------------------------------------------------------
+# Pours: a burst of 5, then one every 20s per device; 20/s across the process
+POUR_LIMITER = get_limiter(
+    "pours",
+    per_device_rate=1 / 20,
+    per_device_burst=5,
+    global_rate=20,
+    global_burst=50,
+    fingerprint_keys=("bottle_id", "rating", "message", "location"),
+    coalesce_seconds=120,
+)
+
+# New bottles: a burst of 3, then one a minute per device; 2/s across the process
+BOTTLE_LIMITER = get_limiter(
+    "bottles",
+    per_device_rate=1 / 60,
+    per_device_burst=3,
+    global_rate=2,
+    global_burst=10,
+    fingerprint_keys=("brand", "expression"),
+    coalesce_seconds=300,
+)
+
+# Bulk pour imports: one import counts as one write. Re-uploading the same file is coalesced.
+IMPORT_LIMITER = get_limiter(
+    "pour_imports",
+    per_device_rate=1 / 60,
+    per_device_burst=2,
+    global_rate=1,
+    global_burst=5,
+    fingerprint_keys=("digest",),
+    coalesce_seconds=600,
+)
+
+# device_sessions writes (name saves and last-seen touches)
+SESSION_LIMITER = get_limiter(
+    "device_sessions",
+    per_device_rate=1 / 10,
+    per_device_burst=5,
+    global_rate=20,
+    global_burst=50,
+    fingerprint_keys=("display_name",),
+    coalesce_seconds=10,
+)
+
+
+def rejection_message(decision: Decision) -> str:
+    if decision.reason == "duplicate":
+        return "Looks like you just posted that. Skipped the duplicate."
+    wait = max(1, int(round(decision.retry_after)))
+    if decision.reason == "device_limit":
+        return f"Easy there. Try again in {wait}s."
+    return f"The bar is slammed right now. Try again in {wait}s."
@@ -0,0 +1,184 @@
+# lib/resilience.py
+# Policy layer for backend calls: per-call timeout, jittered retries for idempotent
+# reads, and a circuit breaker that fails fast while Supabase is degraded.
+#
+#   res = execute(sb.table("events").select("*").limit(5), table="events")
+#   res = execute(sb.table("events").insert(payload), table="events", op="insert")
+#
+# Callers that can live with old data should go through a TTLCache: when a refresh
+# fails, the cache serves its last good value and records a stale notice that pages
+# render with lib.ui.staleness_banner().
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Optional
+
+from postgrest.exceptions import APIError
+
+from lib.metrics import BACKEND_SECONDS
+
+READ_TIMEOUT_SECONDS = 5.0
+WRITE_TIMEOUT_SECONDS = 10.0
+READ_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_CAP_SECONDS = 2.0
+
+FAILURE_THRESHOLD = 5
+RESET_AFTER_SECONDS = 20.0
+
+
+class BackendUnavailable(RuntimeError):
+    """The backend timed out, errored, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls pass; FAILURE_THRESHOLD consecutive failures open the circuit
+    open      -> calls fail immediately until RESET_AFTER_SECONDS have passed
+    half_open -> one trial call; success closes the circuit, failure re-opens it
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+BREAKER = CircuitBreaker("supabase")
+
+# Calls run on this pool so a hung request can be abandoned at its deadline.
+# The client's own HTTP timeout eventually frees the worker; until then the abandoned
+# call still holds its slot. When every slot is taken, new calls fail fast instead of
+# queueing behind stalled ones and timing out without reaching the network.
+POOL_WORKERS = 32
+_pool = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="backend")
+_slots = threading.BoundedSemaphore(POOL_WORKERS)
+
+
+def _submit(fn: Callable[[], Any]):
+    """Start fn() on the pool, or return None if every worker is busy."""
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        future = _pool.submit(fn)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def call(
+    fn: Callable[[], Any],
+    table: str = "",
+    op: str = "select",
+    idempotent: Optional[bool] = None,
+    timeout: Optional[float] = None,
+) -> Any:
+    """Run fn() under the policy. Raises BackendUnavailable or the APIError from PostgREST."""
+    if idempotent is None:
+        idempotent = op == "select"
+    if timeout is None:
+        timeout = READ_TIMEOUT_SECONDS if idempotent else WRITE_TIMEOUT_SECONDS
+    attempts = READ_ATTEMPTS if idempotent else 1
+
+    last_exc: Optional[BaseException] = None
+    for attempt in range(attempts):
+        if not BREAKER.allow():
+            raise BackendUnavailable(f"backend circuit open ({table} {op})")
+
+        future = _submit(fn)
+        if future is None:
+            BACKEND_SECONDS.observe(0.0, table, op, "saturated")
+            BREAKER.record_failure()
+            raise BackendUnavailable(f"backend saturated: {POOL_WORKERS} calls in flight ({table} {op})")
+
+        t0 = time.perf_counter()
+        try:
+            result = future.result(timeout=timeout)
+        except APIError:
+            # A definite answer from PostgREST (bad filter, constraint, RLS): retrying
+            # will not help and it says nothing bad about backend health.
+            BACKEND_SECONDS.observe(time.perf_counter() - t0, table, op, "api_error")
+            BREAKER.record_success()
+            raise
+        except Exception as e:  # timeouts, connection errors, 5xx without a body
+            outcome = "timeout" if isinstance(e, FutureTimeout) else "error"
+            BACKEND_SECONDS.observe(time.perf_counter() - t0, table, op, outcome)
+            last_exc = e
+        else:
+            BACKEND_SECONDS.observe(time.perf_counter() - t0, table, op, "ok")
+            BREAKER.record_success()
+            return result
+
+        BREAKER.record_failure()
+        if attempt + 1 < attempts:
+            # Full jitter so retries from many sessions don't line up
+            time.sleep(random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))))
+
+    kind = "timed out" if isinstance(last_exc, FutureTimeout) else "failed"
+    raise BackendUnavailable(f"{table} {op} {kind} after {attempts} attempt(s): {last_exc}") from last_exc
+
+
+def execute(query, table: str, op: str = "select", timeout: Optional[float] = None):
+    """query.execute() under the policy. Selects are retried; writes are not."""
+    return call(query.execute, table=table, op=op, timeout=timeout)
+
+
+# ------------------------------------------------------------
+# Stale notices (per script thread, i.e. per rerun)
+# ------------------------------------------------------------
+_notices = threading.local()
+
+
+def note_stale(source: str, age_seconds: float) -> None:
+    items = getattr(_notices, "items", None)
+    if items is None:
+        items = _notices.items = {}
+    items[source] = max(age_seconds, items.get(source, 0.0))
+
+
+def pop_stale_notices() -> dict[str, float]:
+    """{source: age in seconds} of data served stale in this thread since the last pop."""
+    items = getattr(_notices, "items", None) or {}
+    _notices.items = {}
+    return items
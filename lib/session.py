@@ -1 +1,154 @@
+# lib/session.py
+# Device identity shared by every page: device token -> drinking name.
+#
+# Any page can be the first one a device opens (bookmarks, ?t=... links), so each
+# page calls resolve_identity() instead of relying on Welcome having run first.
+from __future__ import annotations
 
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+import streamlit as st
+
+from lib.cache import get_cache
+from lib.device_token import get_or_create_device_token
+from lib.ratelimit import SESSION_LIMITER
+from lib.resilience import execute
+from lib.supabase_client import get_client
+
+IDENTITY_TTL_SECONDS = 600
+IDENTITY_MAX_ENTRIES = 5000
+# last_seen_at touches are collected and written in one update this often
+TOUCH_FLUSH_SECONDS = 5.0
+
+# Process-wide LRU with TTL, keyed by device token: {display_name, last_seen_at}, or None
+# for a token with no device_sessions row. At most one lookup per token per TTL.
+_identity_cache = get_cache("identity", ttl=IDENTITY_TTL_SECONDS, max_entries=IDENTITY_MAX_ENTRIES)
+
+_touch_lock = threading.Lock()
+_touch_pending: set[str] = set()
+_touch_thread: Optional[threading.Thread] = None
+
+
+@dataclass(frozen=True)
+class Identity:
+    device_token: str
+    display_name: Optional[str]
+    # Set when the lookup failed and no cached identity existed
+    error: Optional[str] = None
+    # device_sessions.last_seen_at as it was when this browser session started
+    last_visit_at: Optional[str] = None
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _touch_last_seen(device_tokens: list[str]) -> None:
+    try:
+        execute(
+            get_client()
+            .table("device_sessions")
+            .update({"last_seen_at": utc_now_iso()})
+            .in_("token", device_tokens),
+            table="device_sessions",
+            op="update",
+        )
+    except Exception:
+        pass  # last_seen_at is informational only
+
+
+def _touch_loop() -> None:
+    while True:
+        time.sleep(TOUCH_FLUSH_SECONDS)
+        with _touch_lock:
+            batch = sorted(_touch_pending)
+            _touch_pending.clear()
+        if batch:
+            _touch_last_seen(batch)
+
+
+def _queue_touch(device_token: str) -> None:
+    """Mark the device seen, off the request path: one batched update per TOUCH_FLUSH_SECONDS."""
+    global _touch_thread
+    # best-effort touch (skipped when rate limited)
+    if not SESSION_LIMITER.admit(device_token).allowed:
+        return
+    with _touch_lock:
+        _touch_pending.add(device_token)
+        if _touch_thread is None:
+            _touch_thread = threading.Thread(target=_touch_loop, name="touch-last-seen", daemon=True)
+            _touch_thread.start()
+
+
+def _lookup_device(device_token: str) -> Optional[dict]:
+    rows = (
+        execute(
+            get_client()
+            .table("device_sessions")
+            .select("display_name, last_seen_at")
+            .eq("token", device_token)
+            .limit(1),
+            table="device_sessions",
+        ).data
+    ) or []
+    if not rows:
+        return None
+    name = (rows[0].get("display_name") or "").strip()
+    return {"display_name": name or None, "last_seen_at": rows[0].get("last_seen_at")}
+
+
+def lookup_device(device_token: str) -> Optional[dict]:
+    """Cached device_sessions lookup. Raises if the backend fails and nothing is cached."""
+    return _identity_cache.get_or_load(device_token, lambda: _lookup_device(device_token))
+
+
+def remember_display_name(device_token: str, display_name: Optional[str]) -> None:
+    """Update the cache after a save so other pages don't look the token up again."""
+    record = _identity_cache.peek(device_token) or {"last_seen_at": None}
+    _identity_cache.set(device_token, {**record, "display_name": (display_name or "").strip() or None})
+
+
+def _begin_visit(device_token: str, record: Optional[dict]) -> Optional[str]:
+    """The previous last_seen_at for this device, then mark it seen now."""
+    if record is None:
+        return None
+    _identity_cache.set(device_token, {**record, "last_seen_at": utc_now_iso()})
+    _queue_touch(device_token)
+    return record.get("last_seen_at")
+
+
+def resolve_identity() -> Identity:
+    """
+    Call once near the top of every page.
+    Restores st.session_state["display_name"] for this device if it is not set yet.
+    """
+    device_token = get_or_create_device_token()
+    current = (st.session_state.get("display_name") or "").strip()
+    new_session = "last_visit_at" not in st.session_state
+
+    # One cached lookup serves both the drinking name and the previous visit
+    record, error = None, None
+    if new_session or not current:
+        try:
+            record = lookup_device(device_token)
+        except Exception as e:
+            error = str(e)
+
+    # Once per browser session: remember when this device was last here, then touch it
+    if new_session:
+        st.session_state["last_visit_at"] = _begin_visit(device_token, record)
+    last_visit_at = st.session_state["last_visit_at"]
+
+    if current:
+        return Identity(device_token, current, last_visit_at=last_visit_at)
+    if error:
+        return Identity(device_token, None, error=error, last_visit_at=last_visit_at)
+
+    name = record["display_name"] if record else None
+    if name:
+        st.session_state["display_name"] = name
+    return Identity(device_token, name, last_visit_at=last_visit_at)
@@ -0,0 +1,223 @@
+# lib/shared_cache.py
+# Host-wide cache tier shared by every Streamlit server process on the machine.
+#
+# Each entry is one file: <dir>/<namespace>/<sha1(key)>.bin holding a fixed header
+# (version, stored_at) followed by the pickled value, so a writer learns the current
+# version from 16 bytes instead of unpickling the old value. Writers replace the file
+# atomically, so readers always see a complete entry, and a replaced or deleted file is
+# how one process tells the others that their in-memory copy is stale. Files live on
+# tmpfs (/dev/shm) when the host has it, so reads are memory-mapped page-cache hits
+# rather than disk I/O.
+#
+# Entries are unpickled, so the directory must be private: it is per-user, mode 0700
+# and must be owned by this uid, or the store falls back to a private temp directory
+# (no sharing, but nobody else can plant a pickle). Entry names include CODE_VERSION,
+# a hash of lib/*.py, so after a deploy old pickles (e.g. an older Catalog shape) are
+# never read; any entry that still fails to load is treated as a miss and deleted.
+# prune() removes each expired entry's .lock file with it, and any lock left behind by
+# an entry deleted some other way.
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import stat
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Hashable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, loads may duplicate across replicas
+    fcntl = None
+
+
+log = logging.getLogger(__name__)
+
+
+def _private_dir(path: Path) -> Path:
+    """`path` as a 0700 directory owned by this user, or a fresh private temp dir if it can't be."""
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if hasattr(os, "getuid"):
+            st = os.lstat(path)
+            if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+                raise PermissionError(f"{path} is not a directory owned by uid {os.getuid()}")
+            if st.st_mode & 0o077:
+                os.chmod(path, 0o700)
+        return path
+    except OSError as e:
+        log.warning("Shared cache disabled across processes: %s", e)
+        return Path(tempfile.mkdtemp(prefix="viscosity-cache-"))
+
+
+def _default_dir() -> Path:
+    env = os.environ.get("VISCOSITY_SHARED_CACHE_DIR")
+    if env:
+        return _private_dir(Path(env))
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return _private_dir(base / f"viscosity-cache-{uid}")
+
+
+def _code_version() -> str:
+    h = hashlib.sha1()
+    for p in sorted(Path(__file__).resolve().parent.glob("*.py")):
+        h.update(p.name.encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()[:12]
+
+
+SHARED_CACHE_DIR = _default_dir()
+# Pickled values are only shared between processes running the same lib/ code
+CODE_VERSION = _code_version()
+
+# (st_ino, st_mtime_ns, st_size) of an entry file; changes whenever a writer replaces it
+FileToken = tuple[int, int, int]
+
+# Entry file header: version, stored_at
+HEADER = struct.Struct("<Qd")
+
+
+class SharedStore:
+    def __init__(self, namespace: str, root: Optional[Path] = None):
+        self.dir = Path(root or SHARED_CACHE_DIR) / namespace
+        self.dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def _path(self, key: Hashable) -> Path:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.dir / f"{CODE_VERSION}-{digest}.bin"
+
+    def token(self, key: Hashable) -> Optional[FileToken]:
+        """Cheap change check: one stat() call, no read."""
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def read(self, key: Hashable) -> Optional[tuple[int, float, Any, FileToken]]:
+        """Return (version, stored_at, value, token) or None if absent/unreadable."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                st = os.fstat(fh.fileno())
+                if st.st_size == 0:
+                    return None
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    version, stored_at = HEADER.unpack_from(mm)
+                    with memoryview(mm) as view, view[HEADER.size :] as body:
+                        value = pickle.loads(body)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated, foreign or stale (classes changed): a miss; the next write replaces it
+            self.delete(key)
+            return None
+        return version, stored_at, value, (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _version(self, path: Path) -> int:
+        """The stored version from the header alone; 0 if absent or unreadable."""
+        try:
+            with open(path, "rb") as fh:
+                return HEADER.unpack(fh.read(HEADER.size))[0]
+        except (OSError, struct.error):
+            return 0
+
+    def write(self, key: Hashable, value: Any, stored_at: Optional[float] = None) -> tuple[int, FileToken]:
+        """Publish a new version of `key` to every process. Returns (version, token)."""
+        path = self._path(key)
+        version = self._version(path) + 1
+
+        fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(HEADER.pack(version, stored_at or time.time()))
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        st = os.stat(path)
+        return version, (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for p in self.dir.glob("*.bin"):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def prune(self, older_than: float) -> int:
+        """
+        Delete entries not rewritten in `older_than` seconds, with their lock files, and
+        locks whose entry is gone. Keeps tmpfs usage bounded. Returns entries removed.
+        """
+        cutoff = time.time() - older_than
+        removed = 0
+        for p in self.dir.glob("*.bin"):
+            try:
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        for p in self.dir.glob("*.lock"):
+            try:
+                if not p.with_suffix(".bin").exists() and p.stat().st_mtime < cutoff:
+                    self._unlink_lock(p)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    @staticmethod
+    def _unlink_lock(lock_path: Path) -> None:
+        """Remove a lock file unless someone holds it right now."""
+        if fcntl is None:
+            lock_path.unlink(missing_ok=True)
+            return
+        with open(lock_path, "a+b") as fh:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            lock_path.unlink(missing_ok=True)
+
+    @contextmanager
+    def lock(self, key: Hashable) -> Iterator[None]:
+        """Cross-process lock for one key, so only one replica refreshes it."""
+        if fcntl is None:
+            yield
+            return
+        lock_path = self._path(key).with_suffix(".lock")
+        while True:
+            fh = open(lock_path, "a+b")
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                # prune() may have unlinked the file we waited on; lock the current one
+                if os.fstat(fh.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            fh.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            fh.close()
@@ -1 +1,215 @@
+# lib/storage.py
+# Local columnar snapshots of backend tables (Parquet, hive-style partitions).
+#
+# Layout:
+#   <SNAPSHOT_DIR>/<dataset>/<partition>=<value>/part-<run_id>.parquet
+#   <SNAPSHOT_DIR>/<dataset>/_state.json   (keyset cursor of the last exported row)
+#
+# Every export run writes new part files only, so earlier partitions are never rewritten.
+# events are keyed by their server-assigned id. bottles are exported by row_version, so
+# an edited bottle appears again with a higher row_version; bottle_merges is copied
+# whole when it changes. load_bottles_snapshot() / load_merge_map() resolve both.
+from __future__ import annotations
 
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = Path(
+    os.environ.get("VISCOSITY_SNAPSHOT_DIR")
+    or Path(__file__).resolve().parents[1] / "data" / "snapshots"
+)
+
+# Ids are stored as strings so int and uuid primary keys snapshot the same way.
+EVENTS_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("created_at", pa.string()),
+        ("event_type", pa.string()),
+        ("bottle_id", pa.string()),
+        ("rating", pa.float64()),
+        ("message", pa.string()),
+        ("location", pa.string()),
+        ("author_display_name", pa.string()),
+        ("author_device_token", pa.string()),
+    ]
+)
+
+BOTTLES_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("brand", pa.string()),
+        ("expression", pa.string()),
+        ("category", pa.string()),
+        ("proof", pa.float64()),
+        ("distillery", pa.string()),
+        ("distillery_location", pa.string()),
+        ("parent_company", pa.string()),
+        ("barrel_type", pa.string()),
+        ("mashbill_style", pa.string()),
+        ("row_version", pa.int64()),
+    ]
+)
+
+BOTTLE_MERGES_SCHEMA = pa.schema(
+    [
+        ("loser_id", pa.string()),
+        ("winner_id", pa.string()),
+        ("merged_at", pa.string()),
+    ]
+)
+
+SCHEMAS = {"events": EVENTS_SCHEMA, "bottles": BOTTLES_SCHEMA, "bottle_merges": BOTTLE_MERGES_SCHEMA}
+
+
+def dataset_dir(dataset: str, root: Optional[Path] = None) -> Path:
+    return Path(root or SNAPSHOT_DIR) / dataset
+
+
+def new_run_id() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+# ------------------------------------------------------------
+# Export state (resume cursor)
+# ------------------------------------------------------------
+def read_state(dataset: str, root: Optional[Path] = None) -> dict:
+    path = dataset_dir(dataset, root) / "_state.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(dataset: str, state: dict, root: Optional[Path] = None) -> None:
+    d = dataset_dir(dataset, root)
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / "_state.json.tmp"
+    tmp.write_text(json.dumps(state, indent=2, default=str), encoding="utf-8")
+    os.replace(tmp, d / "_state.json")
+
+
+# ------------------------------------------------------------
+# Writing
+# ------------------------------------------------------------
+def _coerce(row: dict, schema: pa.Schema) -> dict:
+    out: dict[str, Any] = {}
+    for field in schema:
+        v = row.get(field.name)
+        if v is None:
+            out[field.name] = None
+        elif pa.types.is_string(field.type):
+            out[field.name] = str(v)
+        elif pa.types.is_floating(field.type):
+            try:
+                out[field.name] = float(v)
+            except (TypeError, ValueError):
+                out[field.name] = None
+        else:
+            out[field.name] = v
+    return out
+
+
+def to_table(rows: Iterable[dict], dataset: str) -> pa.Table:
+    schema = SCHEMAS[dataset]
+    return pa.Table.from_pylist([_coerce(r, schema) for r in rows], schema=schema)
+
+
+def write_partition(
+    dataset: str,
+    partition_key: str,
+    partition_value: str,
+    rows: list[dict],
+    run_id: str,
+    root: Optional[Path] = None,
+) -> Optional[Path]:
+    """Write rows as a new part file under <dataset>/<key>=<value>/. Never overwrites."""
+    if not rows:
+        return None
+
+    d = dataset_dir(dataset, root) / f"{partition_key}={partition_value}"
+    d.mkdir(parents=True, exist_ok=True)
+
+    path = d / f"part-{run_id}.parquet"
+    n = 0
+    while path.exists():
+        n += 1
+        path = d / f"part-{run_id}-{n}.parquet"
+
+    # Dot-prefixed temp files are skipped by dataset discovery
+    tmp = d / f".{path.name}.tmp"
+    pq.write_table(to_table(rows, dataset), tmp, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+
+# ------------------------------------------------------------
+# Reading
+# ------------------------------------------------------------
+def open_snapshot(dataset: str, root: Optional[Path] = None) -> Optional[ds.Dataset]:
+    """
+    Lazy Arrow dataset over all partitions, or None if nothing has been exported.
+    Files are opened through a memory-mapped filesystem, so column projections and
+    filters passed to .to_table() only touch the pages they need.
+    """
+    d = dataset_dir(dataset, root)
+    if not d.exists() or not any(d.glob("*/*.parquet")):
+        return None
+    return ds.dataset(
+        str(d),
+        format="parquet",
+        partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def load_snapshot(
+    dataset: str,
+    columns: Optional[list[str]] = None,
+    filter=None,
+    root: Optional[Path] = None,
+) -> Optional[pa.Table]:
+    """
+    Load a snapshot as an Arrow table (None if not exported yet).
+    Use pyarrow.compute or .to_pandas(self_destruct=True) on the result to avoid
+    building per-row Python objects.
+    """
+    snap = open_snapshot(dataset, root)
+    if snap is None:
+        return None
+    return snap.to_table(columns=columns, filter=filter)
+
+
+def load_merge_map(root: Optional[Path] = None) -> dict[str, str]:
+    """loser id -> winner id from the newest bottle_merges copy (ids as strings, like the snapshots)."""
+    snap = open_snapshot("bottle_merges", root)
+    if snap is None:
+        return {}
+    t = snap.to_table(columns=["loser_id", "winner_id", "run"])
+    latest = pc.max(t["run"]).as_py()
+    t = t.filter(pc.equal(t["run"], latest))
+    return dict(zip(t["loser_id"].to_pylist(), t["winner_id"].to_pylist()))
+
+
+def load_bottles_snapshot(root: Optional[Path] = None) -> Optional[pa.Table]:
+    """Bottles as of the last export: the newest row_version of each id, merged-away ids dropped."""
+    t = load_snapshot("bottles", root=root)
+    if t is None:
+        return None
+    t = t.sort_by([("id", "ascending"), ("row_version", "descending")])
+    ids = t["id"].to_pylist()
+    t = t.take([i for i in range(len(ids)) if i == 0 or ids[i] != ids[i - 1]])
+    merged = load_merge_map(root)
+    if merged:
+        t = t.filter(pc.invert(pc.is_in(t["id"], value_set=pa.array(list(merged), pa.string()))))
+    return t
@@ -0,0 +1,63 @@
+# lib/supabase_client.py
+from __future__ import annotations
+
+import os
+import threading
+
+import streamlit as st
+from supabase import Client, ClientOptions, create_client
+
+# VISCOSITY_BACKEND=local swaps in the in-memory stand-in (lib/local_backend.py)
+BACKEND = os.environ.get("VISCOSITY_BACKEND", "supabase")
+
+# Hard ceiling on any HTTP request; lib/resilience.py applies tighter per-call deadlines
+HTTP_TIMEOUT_SECONDS = 15
+
+_client: Client | None = None
+_admin_client: Client | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Client:
+    """
+    One anon-key client per server process.
+    Creating a client per rerun opens a fresh HTTP connection pool every time.
+    """
+    global _client
+    if BACKEND == "local":
+        from lib.local_backend import get_local_backend
+
+        return get_local_backend()
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(
+                    st.secrets["SUPABASE_URL"],
+                    st.secrets["SUPABASE_ANON_KEY"],
+                    options=ClientOptions(postgrest_client_timeout=HTTP_TIMEOUT_SECONDS),
+                )
+    return _client
+
+
+def get_admin_client() -> Client | None:
+    """
+    Service-key client for maintenance actions (e.g. bottle merges), or None when no
+    SUPABASE_SERVICE_KEY is configured. Never use it for ordinary page reads.
+    """
+    global _admin_client
+    if BACKEND == "local":
+        from lib.local_backend import get_local_backend
+
+        return get_local_backend()
+    key = os.environ.get("SUPABASE_SERVICE_KEY") or st.secrets.get("SUPABASE_SERVICE_KEY")
+    if not key:
+        return None
+    if _admin_client is None:
+        with _client_lock:
+            if _admin_client is None:
+                _admin_client = create_client(
+                    st.secrets["SUPABASE_URL"],
+                    key,
+                    options=ClientOptions(postgrest_client_timeout=HTTP_TIMEOUT_SECONDS),
+                )
+    return _admin_client
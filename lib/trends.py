@@ -0,0 +1,116 @@
+# lib/trends.py
+# Rating and pour-volume trends per bottle, from the bottle_daily_stats aggregates.
+#
+# Daily rows are merged into at most TREND_POINTS equal-width buckets for the requested
+# window, so a chart ships the same number of points whether a bottle has ten pours or
+# ten thousand.
+from __future__ import annotations
+
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+from lib.cache import get_cache
+from lib.db import iter_keyset_rows
+from lib.rankings import WINDOW_DAYS
+from lib.supabase_client import get_client
+
+TREND_POINTS = 60
+TRENDS_TTL_SECONDS = 60
+
+DAILY_COLUMNS = "bottle_id, day, pour_count, rated_count, rating_sum"
+
+_trends_cache = get_cache("bottle_trends", ttl=TRENDS_TTL_SECONDS, max_entries=512, shared=True)
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def window_start_day(window_choice: str) -> Optional[date]:
+    days = WINDOW_DAYS.get(window_choice)
+    if days is None:
+        return None
+    return _today() - timedelta(days=days - 1)
+
+
+def fetch_daily_stats(bottle_ids: Sequence, start: Optional[date]) -> list[dict]:
+    def filters(q):
+        q = q.in_("bottle_id", list(bottle_ids))
+        if start is not None:
+            q = q.gte("day", start.isoformat())
+        return q
+
+    return list(
+        iter_keyset_rows(get_client(), "bottle_daily_stats", DAILY_COLUMNS, keys=("bottle_id", "day"), filters=filters)
+    )
+
+
+def downsample(rows: list[dict], start: date, end: date, points: int = TREND_POINTS) -> list[dict]:
+    """
+    Merge daily rows (start..end inclusive) into <= `points` buckets of whole days.
+    Returns [{bucket, pours, rated, avg_rating}] with empty buckets kept (avg_rating None),
+    so every series over the same range lines up.
+    """
+    span = (end - start).days + 1
+    if span <= 0:
+        return []
+    width = max(1, math.ceil(span / points))
+    n = math.ceil(span / width)
+    pours = [0] * n
+    rated = [0] * n
+    sums = [0.0] * n
+
+    for r in rows:
+        day = date.fromisoformat(str(r["day"])[:10])
+        i = (day - start).days // width
+        if not 0 <= i < n:
+            continue
+        pours[i] += int(r.get("pour_count") or 0)
+        rated[i] += int(r.get("rated_count") or 0)
+        sums[i] += float(r.get("rating_sum") or 0)
+
+    return [
+        {
+            "bucket": (start + timedelta(days=i * width)).isoformat(),
+            "pours": pours[i],
+            "rated": rated[i],
+            "avg_rating": sums[i] / rated[i] if rated[i] else None,
+        }
+        for i in range(n)
+    ]
+
+
+def build_trends(bottle_ids: Sequence, window_choice: str, points: int = TREND_POINTS) -> dict:
+    """{bottle_id: downsampled series}, all over one shared date range."""
+    start = window_start_day(window_choice)
+    rows = fetch_daily_stats(bottle_ids, start)
+    end = _today()
+    if start is None:
+        days = [date.fromisoformat(str(r["day"])[:10]) for r in rows]
+        start = min(days) if days else end
+
+    by_bottle: dict = {bid: [] for bid in bottle_ids}
+    for r in rows:
+        by_bottle.setdefault(r["bottle_id"], []).append(r)
+    return {bid: downsample(by_bottle[bid], start, end, points) for bid in bottle_ids}
+
+
+def get_trends(bottle_ids: Sequence, window_choice: str = "Last 90 days") -> dict:
+    ids = tuple(bottle_ids)
+    if not ids:
+        return {}
+    return _trends_cache.get_or_load((ids, window_choice), lambda: build_trends(ids, window_choice))
+
+
+def get_bottle_trend(bottle_id, window_choice: str = "Last 90 days") -> list[dict]:
+    return get_trends((bottle_id,), window_choice)[bottle_id]
+
+
+def invalidate_trends(bottle_id=None) -> None:
+    """Single-bottle series are dropped right away; multi-bottle sets age out on TTL."""
+    if bottle_id is None:
+        _trends_cache.invalidate()
+        return
+    for window in WINDOW_DAYS:
+        _trends_cache.invalidate(((bottle_id,), window))
@@ -1,5 +1,17 @@
+import html
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Optional
+
 import streamlit as st
 
+from lib.prefetch import prefetch_bottles
+from lib.resilience import pop_stale_notices
+
+if TYPE_CHECKING:
+    from lib.facets import FacetIndex
+
+BOTTLE_PAGE = "pages/2_Bottles.py"
+
 SPEAKEASY_CSS = """
 <style>
 /* ---- Layout breathing room ---- */
@@ -81,3 +93,72 @@ def card(title: str, body_md: str) -> None:
         """,
         unsafe_allow_html=True,
     )
+
+def staleness_banner() -> None:
+    """Warn when this rerun was served cached data because the backend was unreachable."""
+    notices = pop_stale_notices()
+    if not notices:
+        return
+    oldest = max(notices.values())
+    mins = int(oldest // 60)
+    age = f"{mins} min" if mins else f"{int(oldest)}s"
+    st.warning(f"Can't reach the server right now. Showing data from about {age} ago.")
+
+def open_bottle(bottle_id, label: str) -> None:
+    """Make `bottle_id` the active bottle and go straight to the Bottle page (no extra rerun)."""
+    # Its pours and trend load in the background while the Bottle page starts up
+    prefetch_bottles([bottle_id])
+    st.session_state["active_bottle_id"] = bottle_id
+    st.session_state["active_bottle_label"] = label
+    st.switch_page(BOTTLE_PAGE)
+
+def since_last_visit(digest: Optional[dict], label_of: Callable[[object], Optional[str]]) -> None:
+    """Digest card from lib.digest.get_digest(); renders nothing on a first or quiet visit."""
+    if not digest or not (digest["new_pours"] or digest["new_bottle_count"] or digest["movers"]):
+        return
+    hours = (datetime.now(timezone.utc) - datetime.fromisoformat(digest["since"])).total_seconds() / 3600
+    ago = f"{int(hours // 24)} days ago" if hours >= 48 else f"{max(1, int(hours))}h ago"
+
+    def name(bid) -> str:
+        return html.escape(label_of(bid) or "a bottle")
+
+    lines = [f"<b>{digest['new_pours']:,}</b> new pours · <b>{digest['new_bottle_count']:,}</b> new bottles"]
+    if digest["busiest"]:
+        lines.append("Most poured: " + ", ".join(f"{name(b['bottle_id'])} ({b['pours']})" for b in digest["busiest"]))
+    if digest["movers"]:
+        lines.append(
+            "Climbing the board: "
+            + ", ".join(
+                f"{name(m['bottle_id'])} "
+                + (f"#{m['prev_rank']} → #{m['rank']}" if m["prev_rank"] else f"new at #{m['rank']}")
+                for m in digest["movers"]
+            )
+        )
+    if digest["new_bottles"]:
+        lines.append("Just added: " + ", ".join(name(bid) for bid in digest["new_bottles"]))
+    card(f"Since your last visit ({ago})", "<br>".join(lines))
+
+def facet_filters(index: "FacetIndex", key_prefix: str, universe: Optional[int] = None) -> dict[str, list[str]]:
+    """
+    One multiselect per facet, options labelled with live counts. Returns the selection.
+    Widget keys are f"{key_prefix}{facet}", so pages can reset them.
+    """
+    # Imported here: lib.facets pulls in numpy, which pages without facets shouldn't pay for
+    from lib.facets import FACETS
+
+    selection = {f: st.session_state.get(f"{key_prefix}{f}") or [] for f in FACETS}
+    counts = index.counts(selection, universe)
+    cols = st.columns(3)
+    for i, (facet, title) in enumerate(FACETS.items()):
+        facet_counts = counts.get(facet, {})
+        chosen = selection[facet]
+        # Values that still match something, plus whatever is already chosen
+        options = [v for v, n in facet_counts.items() if n or v in chosen]
+        with cols[i % 3]:
+            selection[facet] = st.multiselect(
+                title,
+                options,
+                key=f"{key_prefix}{facet}",
+                format_func=lambda v, c=facet_counts: f"{v} ({c.get(v, 0)})",
+            )
+    return selection
@@ -0,0 +1,101 @@
+# lib/warmup.py
+# Warm start: prefetch the shared caches once per server process.
+#
+# Streamlit has no pre-traffic hook, so every page calls warm_start() at the top.
+# The first call in a process starts the prefetch on a background thread and, like
+# every later call, returns the progress so far without waiting for it.
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from lib.catalog import get_catalog
+from lib.drinkers import get_drinker_leaderboard
+from lib.feed import get_recent_events
+from lib.metrics import start_exporters
+from lib.rankings import WINDOW_DAYS, get_ranking_aggregates
+
+_lock = threading.Lock()
+_started_at: Optional[float] = None
+_finished_at: Optional[str] = None
+_seconds: Optional[float] = None
+# name -> {ok, seconds, error}, filled in as each task finishes
+_results: dict[str, dict] = {}
+_pending: list[str] = []
+
+
+def _tasks() -> dict[str, Callable[[], object]]:
+    # Catalog load also builds the label map and search keys
+    tasks: dict[str, Callable[[], object]] = {
+        "catalog": get_catalog,
+        "room_feed": get_recent_events,
+        "drinkers": get_drinker_leaderboard,
+    }
+    for window in WINDOW_DAYS:
+        tasks[f"rankings:{window}"] = lambda w=window: get_ranking_aggregates(w)
+    return tasks
+
+
+def _timed(fn: Callable[[], object]) -> dict:
+    t0 = time.perf_counter()
+    try:
+        fn()
+        return {"ok": True, "seconds": time.perf_counter() - t0, "error": None}
+    except Exception as e:
+        return {"ok": False, "seconds": time.perf_counter() - t0, "error": str(e)}
+
+
+def _run(tasks: dict[str, Callable[[], object]]) -> None:
+    global _finished_at, _seconds
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warmup") as ex:
+        futures = {ex.submit(_timed, fn): name for name, fn in tasks.items()}
+        for f in as_completed(futures):
+            name = futures[f]
+            with _lock:
+                _results[name] = f.result()
+                _pending.remove(name)
+    with _lock:
+        _seconds = time.perf_counter() - _started_at
+        _finished_at = datetime.now(timezone.utc).isoformat()
+
+
+def _snapshot() -> dict:
+    with _lock:
+        failed = sorted(name for name, r in _results.items() if not r["ok"])
+        done = _finished_at is not None
+        return {
+            "ready": done and not failed,
+            "running": not done,
+            "failed": failed,
+            "pending": list(_pending),
+            "seconds": _seconds if done else time.perf_counter() - _started_at,
+            "finished_at": _finished_at,
+            "tasks": dict(_results),
+        }
+
+
+def warm_start() -> dict:
+    """
+    Start the prefetch once per process (in the background) and return its progress:
+      {"ready": bool, "running": bool, "failed": [name], "pending": [name],
+       "seconds": float, "finished_at": iso | None, "tasks": {name: {ok, seconds, error}}}
+    Never waits. Failed tasks are not retried here; their caches simply load on first use.
+    """
+    global _started_at
+    with _lock:
+        if _started_at is None:
+            # Metrics endpoint/file, if configured; up before the prefetch so it shows in them
+            start_exporters()
+            tasks = _tasks()
+            _pending.extend(tasks)
+            _started_at = time.perf_counter()
+            threading.Thread(target=_run, args=(tasks,), name="warmup", daemon=True).start()
+    return _snapshot()
+
+
+def readiness() -> Optional[dict]:
+    """The warm-start progress, or None if warm_start() has not been called yet."""
+    return _snapshot() if _started_at is not None else None
@@ -7,30 +7,33 @@
 from __future__ import annotations
 
 import streamlit as st
-from supabase import create_client
 
-from lib.ui import apply_speakeasy_theme, card
-from lib.device_token import get_or_create_device_token
+from lib.ui import apply_speakeasy_theme, card, open_bottle, since_last_visit, staleness_banner
+from lib.catalog import bottle_label, get_catalog
+from lib.digest import get_digest
+from lib.feed import get_recent_events
+from lib.metrics import track_rerun
+from lib.pour_queue import POUR_WRITER, with_pending
+from lib.prefetch import prefetch_bottles
+from lib.resilience import execute
+from lib.session import resolve_identity
+from lib.supabase_client import get_client
+from lib.warmup import warm_start
 
 
 # ============================================================
 # SETUP
 # ============================================================
+track_rerun("room")
 st.set_page_config(page_title="Room", page_icon="🥃", layout="wide")
 apply_speakeasy_theme()
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_ANON_KEY"]
-sb = create_client(SUPABASE_URL, SUPABASE_KEY)
+sb = get_client()
+warm_start()
 
-device_token = get_or_create_device_token()
-display_name = (st.session_state.get("display_name") or "").strip() or None
-
-
-def bottle_label(b: dict) -> str:
-    brand = (b.get("brand") or "").strip()
-    expr = (b.get("expression") or "").strip()
-    return f"{brand} - {expr}" if expr else brand
+identity = resolve_identity()
+device_token = identity.device_token
+display_name = identity.display_name
 
 
 # ============================================================
@@ -50,6 +53,12 @@ else:
 # ============================================================
 st.title("The Room 🥃")
 st.caption("Overhear what people are ordering. Click into a bottle when something catches your eye.")
+
+try:
+    since_last_visit(get_digest(device_token, identity.last_visit_at), get_catalog().label_of)
+except Exception:
+    pass  # the digest is a nicety; the feed below reports backend trouble
+
 st.divider()
 
 # ============================================================
@@ -61,32 +70,43 @@ with controls_left:
 with controls_right:
     limit_n = st.number_input("Show", min_value=10, max_value=200, value=50, step=10)
 
-events = (
-    sb.table("events")
-    .select("id, created_at, message, bottle_id, rating, location, author_display_name")
-    .order("created_at", desc=True)
-    .limit(int(limit_n))
-    .execute()
-    .data
-) or []
+try:
+    # Pours still in this process's write queue show up right away
+    events = with_pending(get_recent_events(int(limit_n)), POUR_WRITER.pending(), int(limit_n))
+    catalog = get_catalog()
+except Exception:
+    card("The Room is quiet", "Can't reach the server right now. Try again in a minute.")
+    st.stop()
+
+staleness_banner()
 
 if not events:
     card("Nothing pouring yet", "No activity yet. Go to Bottle and drop the first pour.")
     st.stop()
 
-# Resolve bottle labels in one fetch
-bottle_ids = list({e.get("bottle_id") for e in events if e.get("bottle_id")})
-bottle_rows = []
-if bottle_ids:
-    bottle_rows = (
-        sb.table("bottles")
-        .select("id, brand, expression")
-        .in_("id", bottle_ids)
-        .execute()
-        .data
-    ) or []
-
-bottle_by_id = {b["id"]: bottle_label(b) for b in bottle_rows}
+# The newest pours are the likeliest to be opened; warm their Bottle pages in the background
+prefetch_bottles(e.get("bottle_id") for e in events)
+
+# Resolve bottle labels from the shared catalog; fetch only bottles newer than it
+bottle_by_id = {}
+missing_ids = []
+for bid in {e.get("bottle_id") for e in events if e.get("bottle_id")}:
+    if bid in catalog:
+        bottle_by_id[bid] = catalog.label_of(bid)
+    else:
+        missing_ids.append(bid)
+
+if missing_ids:
+    try:
+        bottle_rows = (
+            execute(
+                sb.table("bottles").select("id, brand, expression").in_("id", missing_ids),
+                table="bottles",
+            ).data
+        ) or []
+    except Exception:
+        bottle_rows = []  # labels fall back to "a bottle"
+    bottle_by_id.update({b["id"]: bottle_label(b) for b in bottle_rows})
 
 for e in events:
     name = (e.get("author_display_name") or "Someone").strip() or "Someone"
@@ -107,12 +127,9 @@ for e in events:
     if msg:
         st.write(msg)
 
-    st.caption(e.get("created_at", ""))
+    st.caption("posting…" if e.get("pending") else e.get("created_at", ""))
 
-    if st.button("Open bottle", key=f"open_bottle_{e['id']}"):
-        st.session_state["active_bottle_id"] = e.get("bottle_id")
-        st.session_state["active_bottle_label"] = btext
-        st.success("Active bottle set. Click Bottles in the sidebar.")
-        st.rerun()
+    if st.button("Open bottle", key=f"open_bottle_{e.get('id') or e['client_ref']}"):
+        open_bottle(e.get("bottle_id"), btext)
 
     st.divider()
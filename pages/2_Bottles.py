@@ -1,50 +1,47 @@
 # pages/2_Bottle.py
 from __future__ import annotations
 
-import re
+import hashlib
 from datetime import datetime, timezone
 
 import streamlit as st
-from supabase import create_client
 
-from lib.ui import apply_speakeasy_theme, card
-from lib.device_token import get_or_create_device_token
+from lib.ui import apply_speakeasy_theme, card, facet_filters, staleness_banner
+from lib.bulk_import import ImportInterrupted, get_import_plan, insert_pours
+from lib.catalog import bottle_label, clean_text, get_catalog, invalidate_catalog, norm_key
+from lib.facets import BitTest, get_facet_index
+from lib.feed import get_bottle_events
+from lib.merge import admin_passcode, check_admin_passcode, merge_bottles
+from lib.metrics import track_rerun
+from lib.pour_queue import POUR_WRITER, refresh_after_pours, with_pending
+from lib.rankings import WINDOW_DAYS
+from lib.ratelimit import BOTTLE_LIMITER, IMPORT_LIMITER, POUR_LIMITER, rejection_message
+from lib.resilience import execute
+from lib.session import resolve_identity
+from lib.supabase_client import get_client
+from lib.trends import get_bottle_trend
+from lib.warmup import warm_start
 
 
 # ============================================================
 # SETUP
 # ============================================================
+track_rerun("bottles")
 st.set_page_config(page_title="Bottle", page_icon="🥃", layout="wide")
 apply_speakeasy_theme()
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_ANON_KEY"]
-sb = create_client(SUPABASE_URL, SUPABASE_KEY)
+sb = get_client()
+warm_start()
 
-device_token = get_or_create_device_token()
-display_name = (st.session_state.get("display_name") or "").strip() or None
+identity = resolve_identity()
+device_token = identity.device_token
+display_name = identity.display_name
 
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _clean_text(s: str | None) -> str:
-    s = (s or "").strip()
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def _norm_key(s: str | None) -> str:
-    return _clean_text(s).lower()
-
-
-def bottle_label(b: dict) -> str:
-    brand = _clean_text(b.get("brand"))
-    expr = _clean_text(b.get("expression"))
-    return f"{brand} - {expr}" if expr else brand
-
-
 # ============================================================
 # SIDEBAR
 # ============================================================
@@ -64,27 +61,33 @@ st.title("Bottle Page 🥃")
 st.caption("Search the catalog, drop a pour, and build the board.")
 st.divider()
 
-# ---------- Load bottles for picker ----------
-bottles_list = (sb.table("bottles").select("id, brand, expression").execute().data) or []
-label_to_id = {bottle_label(b): b["id"] for b in bottles_list}
-all_labels = sorted(label_to_id.keys())
+# ---------- Load bottles for picker (shared catalog) ----------
+try:
+    catalog = get_catalog()
+except Exception:
+    card("Catalog unavailable", "Can't reach the server right now. Try again in a minute.")
+    st.stop()
+
+staleness_banner()
 
 search_text = st.text_input("Search bottles", placeholder="Try: Buffalo Trace, Four Roses, Maker's...")
 
-labels = all_labels
-if search_text.strip():
-    s = search_text.strip().lower()
-    labels = [x for x in all_labels if s in x.lower()]
+facet_index = get_facet_index(catalog)
+with st.expander("Filter bottles", expanded=False):
+    selection = facet_filters(facet_index, "bt_facet_")
+
+matched = BitTest(facet_index.match(selection), facet_index.n) if any(selection.values()) else None
+labels = catalog.search(search_text, rows=matched)
 
 if not labels:
-    card("No matches", "No bottles match your search.")
+    card("No matches", "No bottles match your search or filters.")
     st.stop()
 
 default_label = st.session_state.get("active_bottle_label")
 default_index = labels.index(default_label) if default_label in labels else 0
 
 selected_label = st.selectbox("Select a bottle", labels, index=default_index)
-bottle_id = label_to_id[selected_label]
+bottle_id = catalog.id_for_label(selected_label)
 
 st.session_state["active_bottle_id"] = bottle_id
 st.session_state["active_bottle_label"] = selected_label
@@ -115,34 +118,35 @@ with st.expander("Add a new bottle", expanded=False):
             new_barrel = st.text_input("Barrel Type (optional)", key="new_bottle_barrel_type")
             new_mashbill = st.text_input("Mashbill Style (optional)", key="new_bottle_mashbill_style")
 
-        add_clicked = st.button("Add bottle", key="add_bottle_btn", disabled=(not _clean_text(new_brand)))
+        add_clicked = st.button("Add bottle", key="add_bottle_btn", disabled=(not clean_text(new_brand)))
 
         if add_clicked:
-            brand_clean = _clean_text(new_brand)
-            expr_clean = _clean_text(new_expression)
+            brand_clean = clean_text(new_brand)
+            expr_clean = clean_text(new_expression)
 
             # ---------- Duplicate check (case-insensitive) ----------
             # Pull candidates by brand (cheap) then compare normalized keys in Python
             try:
                 candidates = (
-                    sb.table("bottles")
-                    .select("id, brand, expression")
-                    .ilike("brand", brand_clean)
-                    .limit(50)
-                    .execute()
-                    .data
+                    execute(
+                        sb.table("bottles")
+                        .select("id, brand, expression")
+                        .ilike("brand", brand_clean)
+                        .limit(50),
+                        table="bottles",
+                    ).data
                 ) or []
             except Exception:
                 candidates = []
 
-            target_brand_k = _norm_key(brand_clean)
-            target_expr_k = _norm_key(expr_clean)  # empty => ""
+            target_brand_k = norm_key(brand_clean)
+            target_expr_k = norm_key(expr_clean)  # empty => ""
 
             match = None
             for c in candidates:
-                if _norm_key(c.get("brand")) != target_brand_k:
+                if norm_key(c.get("brand")) != target_brand_k:
                     continue
-                c_expr_k = _norm_key(c.get("expression"))
+                c_expr_k = norm_key(c.get("expression"))
                 if c_expr_k == target_expr_k:
                     match = c
                     break
@@ -159,7 +163,7 @@ with st.expander("Add a new bottle", expanded=False):
             possible = []
             for c in candidates:
                 # same brand (normalized) but different expression, or brand contains overlap
-                if target_brand_k in _norm_key(c.get("brand")) or _norm_key(c.get("brand")) in target_brand_k:
+                if target_brand_k in norm_key(c.get("brand")) or norm_key(c.get("brand")) in target_brand_k:
                     possible.append(c)
 
             if possible and not expr_clean:
@@ -175,25 +179,32 @@ with st.expander("Add a new bottle", expanded=False):
             payload = {
                 "brand": brand_clean,
                 "expression": expr_clean if expr_clean else None,
-                "category": _clean_text(new_category) or None,
+                "category": clean_text(new_category) or None,
                 "proof": float(new_proof) if float(new_proof) > 0 else None,
-                "distillery": _clean_text(new_distillery) or None,
-                "distillery_location": _clean_text(new_location) or None,
-                "barrel_type": _clean_text(new_barrel) or None,
-                "mashbill_style": _clean_text(new_mashbill) or None,
+                "distillery": clean_text(new_distillery) or None,
+                "distillery_location": clean_text(new_location) or None,
+                "barrel_type": clean_text(new_barrel) or None,
+                "mashbill_style": clean_text(new_mashbill) or None,
                 # optional columns you might have:
                 # "created_by_device_token": device_token,
                 # "created_by_display_name": display_name,
             }
 
+            decision = BOTTLE_LIMITER.admit(device_token, payload)
+            if not decision.allowed:
+                st.warning(rejection_message(decision))
+                st.stop()
+
             try:
-                res = sb.table("bottles").insert(payload).execute().data or []
+                res = execute(sb.table("bottles").insert(payload), table="bottles", op="insert").data or []
                 if not res:
                     st.error("Bottle insert returned no rows.")
                     st.stop()
 
                 new_id = res[0]["id"]
                 new_label = bottle_label(res[0])
+                BOTTLE_LIMITER.record(device_token, payload)
+                invalidate_catalog()
 
                 st.session_state["active_bottle_id"] = new_id
                 st.session_state["active_bottle_label"] = new_label
@@ -209,21 +220,12 @@ st.divider()
 # ============================================================
 # BOTTLE DETAILS
 # ============================================================
-bottle_rows = (
-    sb.table("bottles")
-    .select("id, brand, expression, distillery, distillery_location, proof, barrel_type, mashbill_style, category")
-    .eq("id", bottle_id)
-    .limit(1)
-    .execute()
-    .data
-)
+b = catalog.row(bottle_id)
 
-if not bottle_rows:
+if not b:
     st.error("Selected bottle not found.")
     st.stop()
 
-b = bottle_rows[0]
-
 st.subheader(selected_label)
 
 meta_cols = st.columns(2)
@@ -236,6 +238,34 @@ with meta_cols[1]:
     st.write("Barrel Type:", b.get("barrel_type") or "N/A")
     st.write("Mashbill Style:", b.get("mashbill_style") or "N/A")
 
+# ============================================================
+# TRENDS (daily aggregates, downsampled to a fixed point count)
+# ============================================================
+trend_window = st.radio("Trend range", list(WINDOW_DAYS.keys()), index=3, horizontal=True, key="bt_trend_window")
+
+try:
+    series = get_bottle_trend(bottle_id, trend_window)
+except Exception:
+    series = None
+
+if series is None:
+    st.caption("Trends unavailable right now.")
+elif not any(p["pours"] for p in series):
+    st.caption("No pours in this range yet.")
+else:
+    chart = {
+        "period": [p["bucket"] for p in series],
+        "avg rating": [p["avg_rating"] for p in series],
+        "pours": [p["pours"] for p in series],
+    }
+    t1, t2 = st.columns(2)
+    with t1:
+        st.caption("Average rating")
+        st.line_chart(chart, x="period", y="avg rating", height=220)
+    with t2:
+        st.caption("Pours")
+        st.bar_chart(chart, x="period", y="pours", height=220)
+
 st.divider()
 
 # ============================================================
@@ -246,6 +276,9 @@ st.subheader("Drop a Pour")
 if not display_name:
     st.info("Set your drinking name on Welcome to post pours. Browsing is open.")
 
+for lost in POUR_WRITER.pop_failed(device_token):
+    st.error(f"A pour from {lost['created_at'][:16]} couldn't be saved: {lost['error']}")
+
 c1, c2 = st.columns([1, 2])
 with c1:
     rating_val = st.slider("Rating", 1, 10, 7)
@@ -271,9 +304,114 @@ if st.button("Post Pour", disabled=post_disabled, key="post_pour_bottle_btn"):
         "author_device_token": device_token,
         "created_at": utc_now_iso(),
     }
-    sb.table("events").insert(payload).execute()
+
+    decision = POUR_LIMITER.admit(device_token, payload)
+    if not decision.allowed:
+        st.warning(rejection_message(decision))
+        st.stop()
+
+    # Written in the background; caches refresh when the batch lands
+    POUR_WRITER.submit(payload)
+    POUR_LIMITER.record(device_token, payload)
     st.success("Pour posted.")
-    st.rerun()
+
+# ------------------------------------------------------------
+# BULK IMPORT (tasting nights)
+# ------------------------------------------------------------
+with st.expander("Bulk import pours (CSV)", expanded=False):
+    if not display_name:
+        st.info("Set your drinking name on Welcome to import pours.")
+    else:
+        st.caption(
+            "One row per pour. Columns: bottle, rating (1-10), notes, location. "
+            "Bottle names are matched against the catalog; nothing is posted until you confirm."
+        )
+        upload = st.file_uploader("CSV file", type=["csv"], key="bulk_pour_csv")
+
+        if upload is not None:
+            raw = upload.getvalue()
+            plan = get_import_plan(raw, catalog, display_name, device_token)
+
+            st.write(f"Ready to post: **{len(plan.payloads)}**  ·  Problems: **{len(plan.problems)}**")
+            if plan.problems:
+                st.warning("These rows will be skipped:")
+                st.dataframe(
+                    [{"line": ln, "problem": msg} for ln, msg in plan.problems],
+                    use_container_width=True,
+                    hide_index=True,
+                )
+            if plan.fuzzy:
+                st.caption("Matched by similarity. Check these before importing:")
+                st.dataframe(
+                    [{"line": ln, "typed": typed, "matched": label} for ln, typed, label in plan.fuzzy],
+                    use_container_width=True,
+                    hide_index=True,
+                )
+
+            if st.button(f"Import {len(plan.payloads)} pours", disabled=not plan.payloads, key="bulk_import_btn"):
+                digest = {"digest": hashlib.sha1(raw).hexdigest()}
+                decision = IMPORT_LIMITER.admit(device_token, digest)
+                if not decision.allowed:
+                    st.warning(rejection_message(decision))
+                    st.stop()
+
+                try:
+                    inserted = insert_pours(plan.payloads)
+                    IMPORT_LIMITER.record(device_token, digest)
+                except ImportInterrupted as e:
+                    st.error(
+                        f"Import stopped after {e.saved} new pours were saved: {e.cause}. "
+                        "Upload the same file again to post the rest; saved rows are not posted twice."
+                    )
+                    st.stop()
+                finally:
+                    # Caches are refreshed once for the whole batch, not per row
+                    refresh_after_pours(plan.payloads)
+
+                already = len(plan.payloads) - inserted
+                note = f" {already} were already posted from an earlier upload." if already else ""
+                st.success(f"Imported {inserted} pours.{note}")
+
+# ------------------------------------------------------------
+# MERGE DUPLICATES (admin; shown when ADMIN_PASSCODE is set)
+# ------------------------------------------------------------
+if admin_passcode():
+    with st.expander("Merge duplicates into this bottle (admin)", expanded=False):
+        passcode = st.text_input("Admin passcode", type="password", key="bt_merge_passcode")
+        access = check_admin_passcode(passcode, device_token) if passcode else None
+        if access is not None and access.locked_for:
+            st.error(f"Too many wrong passcodes. Try again in {max(1, int(round(access.locked_for)))}s.")
+        elif access is not None and not access.ok:
+            st.error("Wrong passcode.")
+        elif access is not None:
+            dup_search = st.text_input("Find duplicates", value=selected_label, key="bt_merge_search")
+            candidates = [lbl for lbl in catalog.search(dup_search)[:50] if lbl != selected_label]
+            dup_labels = st.multiselect("Duplicates to fold in", candidates, key="bt_merge_losers")
+            st.caption(
+                f"Every pour of the selected bottles moves to **{selected_label}**, "
+                "their stats are added to it, and they are removed from the catalog."
+            )
+            confirm = st.checkbox("I understand this can't be undone", key="bt_merge_confirm")
+            if st.button("Merge", disabled=not (dup_labels and confirm), key="bt_merge_btn"):
+                merge_progress = st.progress(0.0, text="Moving pours…")
+                try:
+                    result = merge_bottles(
+                        bottle_id,
+                        [catalog.id_for_label(lbl) for lbl in dup_labels],
+                        progress=lambda moved, total: merge_progress.progress(
+                            moved / total, text=f"Moving pours… {moved:,} / {total:,}"
+                        ),
+                    )
+                except Exception as e:
+                    merge_progress.empty()
+                    st.error(f"Merge failed: {e}. Running it again picks up where it stopped.")
+                    st.stop()
+                merge_progress.empty()
+                st.session_state.pop("bt_merge_losers", None)
+                st.success(
+                    f"Merged {result.bottles_removed} bottle(s), {result.pours_moved:,} pours moved "
+                    f"in {result.seconds:.1f}s."
+                )
 
 st.divider()
 
@@ -282,15 +420,13 @@ st.divider()
 # ============================================================
 st.subheader("Recent Pours")
 
-events = (
-    sb.table("events")
-    .select("id, created_at, message, rating, location, author_display_name")
-    .eq("bottle_id", bottle_id)
-    .order("created_at", desc=True)
-    .limit(50)
-    .execute()
-    .data
-) or []
+try:
+    events = with_pending(get_bottle_events(bottle_id), POUR_WRITER.pending(bottle_id))
+except Exception:
+    card("Pours unavailable", "Can't reach the server right now. Try again in a minute.")
+    st.stop()
+
+staleness_banner()
 
 if not events:
     card("No pours yet", "Be the first to post a pour for this bottle.")
@@ -324,5 +460,5 @@ for e in events:
     st.markdown(header)
     if msg:
         st.write(msg)
-    st.caption(e.get("created_at", ""))
+    st.caption("posting…" if e.get("pending") else e.get("created_at", ""))
     st.divider()
@@ -1,42 +1,47 @@
 # pages/3_Rankings.py
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
-
-import pandas as pd
 import streamlit as st
-from supabase import create_client
 
-from lib.device_token import get_or_create_device_token
-from lib.ui import apply_speakeasy_theme, card
+from lib.bayes import shrink_aggregates
+from lib.catalog import bottle_label, get_catalog
+from lib.drinkers import get_device_stats, get_drinker_leaderboard
+from lib.facets import FACETS, BitTest, bits_from_rows, get_facet_index
+from lib.locations import get_locations, location_label
+from lib.materialize import ViewNotReady
+from lib.metrics import track_rerun
+from lib.prefetch import prefetch_bottles
+from lib.rankings import WINDOW_DAYS, get_ranking_aggregates, ranking_freshness
+from lib.session import resolve_identity
+from lib.supabase_client import get_client
+from lib.trends import get_trends
+from lib.ui import apply_speakeasy_theme, card, facet_filters, open_bottle, staleness_banner
+from lib.warmup import warm_start
 
 
 # ============================================================
 # SETUP
 # ============================================================
+track_rerun("rankings")
 st.set_page_config(page_title="Rankings", page_icon="🏆", layout="wide")
 apply_speakeasy_theme()
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
-sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-
-device_token = get_or_create_device_token()
-display_name = (st.session_state.get("display_name") or "").strip() or None
-
-
-def bottle_label(brand: str | None, expression: str | None) -> str:
-    brand = (brand or "").strip()
-    expr = (expression or "").strip()
-    return f"{brand} - {expr}" if expr else brand
+sb = get_client()
+warm_start()
 
+identity = resolve_identity()
+device_token = identity.device_token
+display_name = identity.display_name
 
-def _utc_now() -> datetime:
-    return datetime.now(timezone.utc)
 
-
-def _iso(dt: datetime) -> str:
-    return dt.isoformat()
+META_COLS = [
+    "category",
+    "mashbill_style",
+    "proof",
+    "distillery",
+    "distillery_location",
+    "barrel_type",
+]
 
 
 def _reset_filters():
@@ -45,8 +50,10 @@ def _reset_filters():
     st.session_state["rk_window_choice"] = "All time"
     st.session_state["rk_min_pours"] = 1
     st.session_state["rk_limit_n"] = 50
-    st.session_state["rk_category_filter"] = "All"
-    st.session_state["rk_mashbill_filter"] = "All"
+    for facet in FACETS:
+        st.session_state[f"rk_facet_{facet}"] = []
+    st.session_state["rk_location"] = "Anywhere"
+    st.session_state["rk_rank_mode"] = "Average"
 
 
 # ============================================================
@@ -79,11 +86,11 @@ c0, c1, c2, c3, c4, c5 = st.columns([1.2, 2.2, 1.2, 1.2, 1.1, 1.2])
 with c0:
     scope = st.radio(
         "Scope",
-        ["Global", "My Stats"],
+        ["Global", "My Stats", "Drinkers"],
         horizontal=True,
         index=0,
         key="rk_scope",
-        help="My Stats ranks only your pours on this device.",
+        help="My Stats ranks only your pours on this device. Drinkers ranks people, all time.",
     )
 
 with c1:
@@ -96,7 +103,7 @@ with c1:
 with c2:
     window_choice = st.selectbox(
         "Time window",
-        ["All time", "Last 7 days", "Last 30 days", "Last 90 days"],
+        list(WINDOW_DAYS.keys()),
         index=0,  # <-- SANE DEFAULT
         key="rk_window_choice",
     )
@@ -127,6 +134,37 @@ with c5:
         _reset_filters()
         st.rerun()
 
+# Where: a bar or a city, from the location index (busiest first)
+where_options: dict = {"Anywhere": None}
+try:
+    for loc in get_locations():
+        where_options.setdefault(location_label(loc), (loc["kind"], loc["location_key"]))
+except Exception:
+    pass  # location filter just isn't offered
+
+location = None
+rank_mode = "Average"
+if scope != "Drinkers":
+    w1, w2 = st.columns([3, 2])
+    with w1:
+        if len(where_options) > 1:
+            where_choice = st.selectbox(
+                "Where",
+                list(where_options.keys()),
+                key="rk_location",
+                help="What's good at a bar, or across a city.",
+            )
+            location = where_options.get(where_choice)
+    with w2:
+        rank_mode = st.radio(
+            "Rank by",
+            ["Average", "Bayesian"],
+            horizontal=True,
+            key="rk_rank_mode",
+            help="Bayesian pulls bottles with few pours toward the overall average, "
+            "so one 10/10 can't outrank two hundred 9s.",
+        )
+
 
 # Guardrail: My Stats requires identity (otherwise it's empty and confusing)
 if scope == "My Stats" and not display_name:
@@ -138,127 +176,164 @@ if scope == "My Stats" and not display_name:
     st.stop()
 
 
-time_min_iso = None
-if window_choice != "All time":
-    days = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}[window_choice]
-    time_min_iso = _iso(_utc_now() - timedelta(days=days))
+# ============================================================
+# DRINKERS (per-device aggregates, all time)
+# ============================================================
+if scope == "Drinkers":
+    try:
+        drinkers = get_drinker_leaderboard()
+    except Exception:
+        card("Drinkers unavailable", "Can't reach the server right now. Try again in a minute.")
+        st.stop()
+
+    staleness_banner()
+
+    if (search_text or "").strip():
+        s = search_text.strip().lower()
+        drinkers = [d for d in drinkers if s in (d.get("display_name") or "").lower()]
+    drinkers = [d for d in drinkers if int(d.get("rated_count") or 0) >= int(min_pours)][: int(limit_n)]
+
+    st.divider()
+    st.subheader("Drinkers")
+    st.caption("All-time pours per drinker. The time window does not apply here.")
+
+    if not drinkers:
+        card("Nobody matches", "Try lowering <b>Min rated pours</b> or clearing the search.")
+        st.stop()
+
+    drinker_rows = [
+        {
+            "rank": i + 1,
+            "drinker": d.get("display_name"),
+            "pours": int(d.get("pour_count") or 0),
+            "rated_pours": int(d.get("rated_count") or 0),
+            "avg_rating": f"{float(d['avg_rating']):.2f}" if d.get("avg_rating") is not None else "—",
+            "last_pour": d.get("last_pour_at"),
+        }
+        for i, d in enumerate(drinkers)
+    ]
+    st.dataframe(drinker_rows, use_container_width=True, hide_index=True)
+    st.stop()
 
 
 # ============================================================
-# LOAD EVENTS (rated pours only)
+# LOAD AGGREGATES (rated pours only, shared cache)
 # ============================================================
-q = (
-    sb.table("events")
-    .select("bottle_id, rating, created_at, author_device_token")
-    .not_.is_("rating", "null")
-)
+scan_progress = st.empty()
 
-if scope == "My Stats":
-    q = q.eq("author_device_token", device_token)
 
-if time_min_iso:
-    q = q.gte("created_at", time_min_iso)
+def _show_scan_progress(scanned: int, fraction: float) -> None:
+    scan_progress.progress(fraction, text=f"Scanning rated pours… {scanned:,}")
 
-events_rows = (q.limit(10000).execute().data) or []
 
-if not events_rows:
-    who = "you" if scope == "My Stats" else "anyone"
-    card("Nothing to rank yet", f"No rated pours found for {who} in this time window.")
+try:
+    aggs = get_ranking_aggregates(
+        window_choice,
+        device_token if scope == "My Stats" else None,
+        progress=_show_scan_progress,
+        location=location,
+    )
+    catalog = get_catalog()
+except ViewNotReady as e:
+    scan_progress.empty()
+    if e.building:
+        card("Building the board…", "The first scan since the server started is still running. Refresh in a moment.")
+    else:
+        card("Rankings unavailable", "Can't reach the server right now. Try again in a minute.")
     st.stop()
+except Exception:
+    scan_progress.empty()
+    card("Rankings unavailable", "Can't reach the server right now. Try again in a minute.")
+    st.stop()
+
+scan_progress.empty()
 
-events_df = pd.DataFrame(events_rows)
-events_df = events_df[events_df["bottle_id"].notna()]
-events_df["rating"] = pd.to_numeric(events_df["rating"], errors="coerce")
-events_df = events_df[events_df["rating"].notna()]
+staleness_banner()
 
-if events_df.empty:
-    card("Nothing to rank yet", "No valid numeric ratings found.")
+if not aggs["rows"]:
+    who = "you" if scope == "My Stats" else "anyone"
+    card("Nothing to rank yet", f"No rated pours found for {who} in this time window.")
     st.stop()
 
 
 # ============================================================
-# LOAD BOTTLES METADATA
+# JOIN BOTTLES METADATA (shared catalog)
 # ============================================================
-bottle_ids = events_df["bottle_id"].dropna().unique().tolist()
-
-bottles_rows = (
-    sb.table("bottles")
-    .select("id, brand, expression, category, mashbill_style, proof, distillery, distillery_location, barrel_type")
-    .in_("id", bottle_ids)
-    .execute()
-    .data
-) or []
-
-if not bottles_rows:
+shrunk = shrink_aggregates(aggs) if rank_mode == "Bayesian" else None
+
+board = []
+for i, a in enumerate(aggs["rows"]):
+    b = catalog.row(a["bottle_id"]) or {}
+    row = {k: b.get(k) for k in META_COLS}
+    row.update(a)
+    row["label"] = bottle_label(b)
+    if shrunk is not None:
+        row["score"] = float(shrunk.score[i])
+        row["ci_low"] = float(shrunk.lower[i])
+        row["ci_high"] = float(shrunk.upper[i])
+    board.append(row)
+
+if not any(r["bottle_id"] in catalog for r in board):
     card("Missing bottle metadata", "Events exist but bottles could not be loaded.")
     st.stop()
 
-bottles_df = pd.DataFrame(bottles_rows)
-
 
 # ============================================================
-# AGGREGATE
+# MY PROFILE (per-device aggregates)
 # ============================================================
-agg = (
-    events_df.groupby("bottle_id", as_index=False)
-    .agg(
-        avg_rating=("rating", "mean"),
-        rating_count=("rating", "size"),
-    )
-)
-
-df = agg.merge(bottles_df, left_on="bottle_id", right_on="id", how="left")
-df["label"] = df.apply(lambda x: bottle_label(x.get("brand"), x.get("expression")), axis=1)
-
-df["avg_rating"] = df["avg_rating"].astype(float)
-df["rating_count"] = df["rating_count"].astype(int)
+if scope == "My Stats":
+    try:
+        me = get_device_stats(device_token)
+    except Exception:
+        me = None
+
+    if me and me["pour_count"]:
+        p1, p2, p3 = st.columns([1, 1, 2])
+        p1.metric("My pours", str(me["pour_count"]))
+        p2.metric("My avg", f"{me['avg_rating']:.2f}" if me["avg_rating"] is not None else "—")
+        with p3:
+            favs = [catalog.label_of(bid) for bid in me["favorites"] if bid in catalog]
+            if favs:
+                st.caption("Favorites: " + " · ".join(f"**{x}**" for x in favs))
+            mix = me["categories"][:4]
+            if mix:
+                total = sum(int(c["pour_count"]) for c in me["categories"]) or 1
+                st.caption(
+                    "Mix: " + " · ".join(f"{c['category']} {100 * int(c['pour_count']) / total:.0f}%" for c in mix)
+                )
 
 
 # ============================================================
 # MORE FILTERS (tucked away)
 # ============================================================
-with st.expander("More filters", expanded=False):
-    f1, f2 = st.columns([1, 1])
-
-    with f1:
-        categories = sorted([c for c in df["category"].dropna().unique().tolist() if str(c).strip()])
-        category_filter = st.selectbox(
-            "Category",
-            ["All"] + categories,
-            key="rk_category_filter",
-        )
+# Facet counts cover only the bottles on this board
+facet_index = get_facet_index(catalog)
+board_bits = bits_from_rows(
+    (i for i in (catalog.row_index(r["bottle_id"]) for r in board) if i is not None), facet_index.n
+)
 
-    with f2:
-        styles = sorted([c for c in df["mashbill_style"].dropna().unique().tolist() if str(c).strip()])
-        mashbill_filter = st.selectbox(
-            "Mashbill Style",
-            ["All"] + styles,
-            key="rk_mashbill_filter",
-        )
+with st.expander("More filters", expanded=False):
+    selection = facet_filters(facet_index, "rk_facet_", universe=board_bits)
 
 
 # ============================================================
 # APPLY FILTERS
 # ============================================================
-f = df.copy()
+f = board
 
 if (search_text or "").strip():
     s = search_text.strip().lower()
-    f = f[f["label"].str.lower().str.contains(s, na=False)]
+    f = [r for r in f if s in r["label"].lower()]
 
-category_filter = st.session_state.get("rk_category_filter", "All")
-mashbill_filter = st.session_state.get("rk_mashbill_filter", "All")
+if any(selection.values()):
+    matched = BitTest(facet_index.match(selection), facet_index.n)
+    f = [r for r in f if catalog.row_index(r["bottle_id"]) in matched]
 
-if category_filter != "All":
-    f = f[f["category"] == category_filter]
-
-if mashbill_filter != "All":
-    f = f[f["mashbill_style"] == mashbill_filter]
-
-f = f[f["rating_count"] >= int(min_pours)]
+f = [r for r in f if r["rating_count"] >= int(min_pours)]
 
 # Sort and limit
-f = f.sort_values(["avg_rating", "rating_count", "label"], ascending=[False, False, True]).head(int(limit_n))
+sort_col = "score" if shrunk is not None else "avg_rating"
+f = sorted(f, key=lambda r: (-r[sort_col], -r["rating_count"], r["label"]))[: int(limit_n)]
 
 
 # ============================================================
@@ -270,13 +345,24 @@ summary_left, summary_right, summary_third = st.columns([1, 1, 2])
 with summary_left:
     st.metric("Rated bottles", str(len(f)))
 with summary_right:
-    st.metric("Rated pours", str(len(events_df)))
+    st.metric("Rated pours", str(aggs["rated_pours"]))
 with summary_third:
     scope_label = "Global" if scope == "Global" else f"My Stats ({display_name})"
     st.caption(f"Scope: **{scope_label}**")
+    if location:
+        st.caption(f"What's good at **{where_choice}**")
+    elif scope == "Global":
+        age = ranking_freshness(window_choice)["age_seconds"]
+        if age is not None:
+            st.caption(f"Updated {int(age)}s ago" if age < 120 else f"Updated {int(age // 60)} min ago")
+    if shrunk is not None:
+        st.caption(
+            f"Bayesian: every bottle starts with {shrunk.prior_strength:.1f} pours' worth of the "
+            f"overall average ({shrunk.prior_mean:.2f})."
+        )
 
 # If empty because of filters, give the user a way out
-if f.empty:
+if not f:
     card(
         "Nothing matches your filters",
         "Try lowering <b>Min rated pours</b> to 1, switching to <b>All time</b>, or hit <b>Reset filters</b>.",
@@ -292,8 +378,11 @@ st.subheader("Leaderboard")
 # Keep it bar-vibe: top cards (buttons per row), then the full table below.
 top_cards_n = min(25, len(f))
 
+# The top few are the likeliest to be opened; warm their Bottle pages in the background
+prefetch_bottles(row["bottle_id"] for row in f[:top_cards_n])
+
 for i in range(top_cards_n):
-    row = f.iloc[i]
+    row = f[i]
     label = row["label"]
     avg_rating = float(row["avg_rating"])
     rating_count = int(row["rating_count"])
@@ -312,14 +401,39 @@ for i in range(top_cards_n):
     left, right = st.columns([6, 1])
     with left:
         st.markdown(f"**{i+1}. {label}**")
-        st.caption(f"Board Avg: {avg_rating:.2f}  |  Rated pours: {rating_count}  |  {meta}")
+        if shrunk is not None:
+            st.caption(
+                f"Score: {row['score']:.2f} (95%: {row['ci_low']:.2f}–{row['ci_high']:.2f})  |  "
+                f"Board Avg: {avg_rating:.2f}  |  Rated pours: {rating_count}  |  {meta}"
+            )
+        else:
+            st.caption(f"Board Avg: {avg_rating:.2f}  |  Rated pours: {rating_count}  |  {meta}")
     with right:
         if st.button("Open", key=f"rk_open_{row['bottle_id']}"):
-            st.session_state["active_bottle_id"] = row["bottle_id"]
-            st.session_state["active_bottle_label"] = label
-            st.success("Active bottle set. Click Bottles in the sidebar.")
-            st.rerun()
+            open_bottle(row["bottle_id"], label)
+
+    st.divider()
 
+# ============================================================
+# TRENDS (top bottles, global daily aggregates)
+# ============================================================
+TREND_TOP_N = 5
+
+# Trends are everyone's pours everywhere, so they are left out of a location view
+trend_rows = [] if location else f[:TREND_TOP_N]
+try:
+    trends = get_trends([r["bottle_id"] for r in trend_rows], window_choice)
+except Exception:
+    trends = {}
+
+if trends:
+    st.subheader(f"Top {len(trend_rows)} over time")
+    st.caption("Average rating per period across everyone's pours.")
+    first = trends[trend_rows[0]["bottle_id"]]
+    chart = {"period": [p["bucket"] for p in first]}
+    for r in trend_rows:
+        chart[r["label"]] = [p["avg_rating"] for p in trends[r["bottle_id"]]]
+    st.line_chart(chart, x="period", y=[r["label"] for r in trend_rows], height=280)
     st.divider()
 
 # Full table (for power users)
@@ -337,7 +451,13 @@ display_cols = [
     "barrel_type",
 ]
 
-display_df = f[display_cols].copy()
-display_df["avg_rating"] = display_df["avg_rating"].map(lambda x: f"{float(x):.2f}")
+if shrunk is not None:
+    display_cols[1:1] = ["score", "ci_low", "ci_high"]
+
+display_rows = [{c: r[c] for c in display_cols} for r in f]
+for r in display_rows:
+    for c in ("avg_rating", "score", "ci_low", "ci_high"):
+        if c in r:
+            r[c] = f"{float(r[c]):.2f}"
 
-st.dataframe(display_df, use_container_width=True, hide_index=True)
+st.dataframe(display_rows, use_container_width=True, hide_index=True)
@@ -0,0 +1,83 @@
+# scripts/archive_events.py
+# Move events older than the archive horizon from `events` to `events_archive`.
+#
+# Run from the repo root (needs SUPABASE_SERVICE_KEY; archive_events() is not granted to anon):
+#   python -m scripts.export_snapshots       # first: archived rows leave `events`
+#   python -m scripts.archive_events
+#   python -m scripts.archive_events --horizon-days 365 --batch-size 2000
+#
+# Only events the Parquet exporter has already copied (id <= its saved cursor) are
+# archived. --skip-export-check archives regardless, for deployments without snapshots.
+#
+# Each call moves one batch in its own transaction and folds it into
+# bottle_rating_archive, so the job can be stopped and re-run at any point.
+# Per-device, per-day and per-location rollups are insert-time triggers and are
+# unaffected. See supabase/migrations/20261019000600_events_archive.sql.
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Optional
+
+from lib.rankings import WINDOW_DAYS
+from lib.resilience import execute
+from lib.storage import read_state
+from lib.supabase_client import get_admin_client
+
+DEFAULT_HORIZON_DAYS = 180
+DEFAULT_BATCH_SIZE = 5000
+# One batch is one transaction; give it longer than an ordinary write
+BATCH_TIMEOUT_SECONDS = 60.0
+
+
+def archive_events(sb, horizon_days: int, batch_size: int, through_id: Optional[int] = None) -> int:
+    """Call archive_events() until a batch comes back empty. Returns events moved."""
+    params = {"horizon_days": horizon_days, "batch_size": batch_size, "through_id": through_id}
+    moved = 0
+    while True:
+        res = execute(
+            sb.rpc("archive_events", params), table="events", op="archive", timeout=BATCH_TIMEOUT_SECONDS
+        )
+        n = int(res.data or 0)
+        if not n:
+            return moved
+        moved += n
+        print(f"  moved {moved:,}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Move old events to the cold archive table.")
+    ap.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS, help="keep this many days hot")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ap.add_argument(
+        "--skip-export-check",
+        action="store_true",
+        help="archive without waiting for scripts.export_snapshots (archived events won't be in snapshots)",
+    )
+    args = ap.parse_args()
+
+    longest_window = max(d for d in WINDOW_DAYS.values() if d is not None)
+    if args.horizon_days <= longest_window:
+        ap.error(f"--horizon-days must exceed the longest Rankings window ({longest_window} days)")
+
+    through_id = None
+    if not args.skip_export_check:
+        state = read_state("events")
+        if state.get("key") != "id" or not state.get("cursor"):
+            ap.error(
+                "no Parquet export of events found; run `python -m scripts.export_snapshots` first "
+                "(or pass --skip-export-check)"
+            )
+        through_id = state["cursor"][0]
+
+    sb = get_admin_client()
+    if sb is None:
+        raise RuntimeError("Archiving needs SUPABASE_SERVICE_KEY (archive_events() is not granted to anon).")
+
+    t0 = time.perf_counter()
+    moved = archive_events(sb, args.horizon_days, args.batch_size, through_id)
+    print(f"Archive complete. Moved: {moved:,}  ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# scripts/export_snapshots.py
+# Export `events`, `bottles` and `bottle_merges` to partitioned Parquet under data/snapshots/.
+#
+# Run from the repo root:
+#   python -m scripts.export_snapshots
+#
+# Incremental: each run resumes from the keyset cursor saved by the previous run and
+# only writes new part files. Delete data/snapshots/<table>/ to re-export from scratch.
+#
+# Cursors follow server-assigned order, never the client-set created_at (queued pours,
+# retries and CSV imports land with earlier timestamps):
+#   events    by id, up to the highest id seen SETTLE_SECONDS before the read, so an
+#             insert that drew a lower id but had not committed yet is not skipped
+#   bottles   by (row_version, id): edited bottles are exported again (see
+#             lib/storage.load_bottles_snapshot for the newest-row view)
+# Run this before scripts/archive_events.py, which only archives exported events.
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from typing import Optional
+
+from lib.db import iter_keyset_pages, iter_keyset_rows
+from lib.resilience import execute
+from lib.storage import SNAPSHOT_DIR, new_run_id, read_state, write_partition, write_state
+from lib.supabase_client import get_admin_client, get_client
+
+EVENTS_COLUMNS = (
+    "id, created_at, event_type, bottle_id, rating, message, location, "
+    "author_display_name, author_device_token"
+)
+BOTTLES_COLUMNS = (
+    "id, brand, expression, category, proof, distillery, distillery_location, "
+    "parent_company, barrel_type, mashbill_style, row_version"
+)
+MERGES_COLUMNS = "loser_id, winner_id, merged_at"
+
+# Rows buffered before a flush to disk. Keeps memory bounded for years of pours.
+FLUSH_ROWS = 20000
+# Longer than any insert transaction (PostgREST's statement timeout is 8s)
+SETTLE_SECONDS = 10.0
+
+
+def _check_state(dataset: str, state: dict, key: str) -> None:
+    if state.get("cursor") and state.get("key") != key:
+        raise RuntimeError(
+            f"data/snapshots/{dataset}/ was written by an older export keyed on another column. "
+            f"Delete that folder and re-run to export it again."
+        )
+
+
+def fetch_max_event_id(sb) -> Optional[int]:
+    res = execute(sb.table("events").select("id").order("id", desc=True).limit(1), table="events")
+    return res.data[0]["id"] if res.data else None
+
+
+def export_events(sb, run_id: str, settle_seconds: float = SETTLE_SECONDS) -> int:
+    state = read_state("events")
+    _check_state("events", state, "id")
+    after = state.get("cursor")
+
+    high = fetch_max_event_id(sb)
+    if high is None or (after and high <= after[0]):
+        return 0
+    time.sleep(settle_seconds)
+
+    by_day: dict[str, list[dict]] = defaultdict(list)
+    buffered = 0
+    exported = 0
+    cursor = after
+
+    def flush() -> None:
+        nonlocal buffered
+        for day, rows in by_day.items():
+            write_partition("events", "day", day, rows, run_id)
+        by_day.clear()
+        buffered = 0
+        write_state("events", {"key": "id", "cursor": cursor, "last_run": run_id})
+
+    pages = iter_keyset_pages(
+        sb, "events", EVENTS_COLUMNS, keys=("id",), after=after, filters=lambda q: q.lte("id", high)
+    )
+    for page in pages:
+        for r in page:
+            day = str(r.get("created_at") or "")[:10] or "unknown"
+            by_day[day].append(r)
+        buffered += len(page)
+        exported += len(page)
+        cursor = [page[-1].get("id")]
+
+        if buffered >= FLUSH_ROWS:
+            flush()
+
+    if buffered:
+        flush()
+
+    return exported
+
+
+def export_bottles(sb, run_id: str) -> int:
+    state = read_state("bottles")
+    _check_state("bottles", state, "row_version")
+    after = state.get("cursor")
+
+    rows: list[dict] = []
+    cursor = after
+    for page in iter_keyset_pages(sb, "bottles", BOTTLES_COLUMNS, keys=("row_version", "id"), after=after):
+        rows.extend(page)
+        cursor = [page[-1].get("row_version"), page[-1].get("id")]
+
+    # Bottles are small; rows new or changed since the last run become one partition.
+    if rows:
+        write_partition("bottles", "run", run_id, rows, run_id)
+        write_state("bottles", {"key": "row_version", "cursor": cursor, "last_run": run_id})
+
+    return len(rows)
+
+
+def export_merges(sb, run_id: str) -> int:
+    """Copy bottle_merges whole when it changed; readers use the newest copy."""
+    rows = list(iter_keyset_rows(sb, "bottle_merges", MERGES_COLUMNS, keys=("loser_id",)))
+    fingerprint = [len(rows), max((str(r.get("merged_at")) for r in rows), default=None)]
+    if not rows or read_state("bottle_merges").get("fingerprint") == fingerprint:
+        return 0
+    write_partition("bottle_merges", "run", run_id, rows, run_id)
+    write_state("bottle_merges", {"fingerprint": fingerprint, "last_run": run_id})
+    return len(rows)
+
+
+def main() -> None:
+    # Service key when configured; the anon key can read these tables too
+    sb = get_admin_client() or get_client()
+
+    run_id = new_run_id()
+    n_events = export_events(sb, run_id)
+    n_bottles = export_bottles(sb, run_id)
+    n_merges = export_merges(sb, run_id)
+
+    print(
+        f"Export complete ({SNAPSHOT_DIR}). New events: {n_events}  "
+        f"New or changed bottles: {n_bottles}  Merges: {n_merges}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# scripts/load_test.py
+# Concurrent-session load test against the in-memory backend.
+#
+# Run from the repo root:
+#   python -m scripts.load_test --levels 1,2,4,8,16 --seconds 20 --backend-latency-ms 25
+#
+# Each simulated drinker is a set of Streamlit AppTest instances (one per page) sharing a
+# device token and drinking name. Sessions loop over weighted scripts (browse the Room,
+# search the catalog, post a pour, switch Rankings windows) against the in-memory
+# backend stand-in (lib/local_backend.py). Every AppTest run counts as one rerun.
+#
+# Every session runs in its own worker process: AppTest swaps a mock Streamlit Runtime
+# in and out of a process-wide slot on each run, so concurrent runs in one process break
+# each other. Workers share the on-disk shared cache (lib/shared_cache.py), like several
+# server processes would, but each seeds its own copy of the backend, so one session's
+# pours are not seen by the others.
+#
+# Per concurrency level the report shows throughput, rerun latency percentiles, backend
+# calls per second and the largest worker RSS, so the knee of the curve is easy to spot.
+# A level with any failed rerun is reported as FAILED instead of with percentiles.
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Must be set before any lib module reads them
+os.environ["VISCOSITY_BACKEND"] = "local"
+os.environ.setdefault("VISCOSITY_SHARED_CACHE_DIR", tempfile.mkdtemp(prefix="viscosity-loadtest-"))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from lib.local_backend import LocalBackend, seed_demo_data, set_local_backend  # noqa: E402
+from lib.rankings import WINDOW_DAYS  # noqa: E402
+from lib.ratelimit import POUR_LIMITER  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+ROOM_PAGE = str(ROOT / "pages" / "1_Bar Room.py")
+BOTTLES_PAGE = str(ROOT / "pages" / "2_Bottles.py")
+RANKINGS_PAGE = str(ROOT / "pages" / "3_Rankings.py")
+
+SEARCH_TERMS = ["buffalo", "four roses", "weller", "rye", "single barrel", "1792", "maker", "bond"]
+
+# script name -> relative weight
+SCRIPT_WEIGHTS = {
+    "browse_room": 4,
+    "search_catalog": 3,
+    "switch_rankings": 2,
+    "post_pour": 1,
+}
+
+RUN_TIMEOUT_SECONDS = 60
+# Worker stdout lines carrying results start with this; anything else is passed over
+MESSAGE_PREFIX = "@@load_test "
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS: KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_vals: list[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.first_error: str | None = None
+
+    def reset(self) -> None:
+        self.latencies.clear()
+        self.errors = 0
+        self.first_error = None
+
+    def timed(self, at: AppTest, action=None) -> AppTest:
+        """Run one rerun (optionally after a widget action) and record its latency."""
+        t0 = time.perf_counter()
+        error = None
+        try:
+            target = action(at) if action else at
+            target.run(timeout=RUN_TIMEOUT_SECONDS)
+            if at.exception:
+                error = f"page raised: {at.exception[0].message}"
+        except Exception as e:
+            error = repr(e)
+        self.latencies.append(time.perf_counter() - t0)
+        if error:
+            self.errors += 1
+            self.first_error = self.first_error or error
+        return at
+
+
+class DrinkerSession:
+    def __init__(self, n: int, rec: Recorder, rng: random.Random):
+        self.rec = rec
+        self.rng = rng
+        self.token = f"loadtest-device-{n}-{rng.randrange(1 << 30)}"
+        self.name = f"LoadBot {n}"
+        self.pages = {}
+        for key, path in (("room", ROOM_PAGE), ("bottles", BOTTLES_PAGE), ("rankings", RANKINGS_PAGE)):
+            at = AppTest.from_file(path, default_timeout=RUN_TIMEOUT_SECONDS)
+            at.query_params["t"] = self.token
+            at.session_state["display_name"] = self.name
+            self.pages[key] = at
+            rec.timed(at)
+
+    # ---- scripts ----
+    def browse_room(self) -> None:
+        room = self.pages["room"]
+        self.rec.timed(room)
+        if room.number_input:
+            show = self.rng.choice([10, 50, 100, 200])
+            self.rec.timed(room, lambda at: at.number_input[0].set_value(show))
+
+    def search_catalog(self) -> None:
+        bottles = self.pages["bottles"]
+        term = self.rng.choice(SEARCH_TERMS)
+        self.rec.timed(bottles, lambda at: at.text_input[0].input(term))
+        if bottles.selectbox and bottles.selectbox[0].options:
+            choice = self.rng.choice(bottles.selectbox[0].options)
+            self.rec.timed(bottles, lambda at: at.selectbox[0].select(choice))
+
+    def post_pour(self) -> None:
+        bottles = self.pages["bottles"]
+        if not bottles.slider:
+            self.rec.timed(bottles)
+            return
+        rating = self.rng.randint(1, 10)
+        bottles.slider[0].set_value(rating)
+        self.rec.timed(bottles, lambda at: at.button(key="post_pour_bottle_btn").click())
+
+    def switch_rankings(self) -> None:
+        window = self.rng.choice(list(WINDOW_DAYS))
+        self.rec.timed(self.pages["rankings"], lambda at: at.selectbox(key="rk_window_choice").select(window))
+
+    def step(self) -> None:
+        names = list(SCRIPT_WEIGHTS)
+        name = self.rng.choices(names, weights=[SCRIPT_WEIGHTS[n] for n in names])[0]
+        getattr(self, name)()
+
+
+def _send(msg: dict) -> None:
+    print(MESSAGE_PREFIX + json.dumps(msg), flush=True)
+
+
+def _receive(proc: subprocess.Popen) -> dict | None:
+    """The worker's next message, or None if it exited first."""
+    for line in proc.stdout:
+        if line.startswith(MESSAGE_PREFIX):
+            return json.loads(line[len(MESSAGE_PREFIX) :])
+    return None
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """One session in this process: set up, report ready, wait for "go", run, report."""
+    db = LocalBackend()
+    seed_demo_data(db, n_bottles=args.bottles, n_events=args.events, seed=args.seed)
+    db.latency_seconds = args.backend_latency_ms / 1000
+    set_local_backend(db)
+
+    rec = Recorder()
+    try:
+        session = DrinkerSession(args.worker, rec, random.Random(args.seed * 1000 + args.worker))
+    except Exception as e:
+        _send({"ready": False, "error": repr(e)})
+        return
+    if rec.errors:
+        _send({"ready": False, "error": rec.first_error})
+        return
+    _send({"ready": True})
+    sys.stdin.readline()
+
+    # Measure steady state only: session setup is excluded
+    rec.reset()
+    calls_before = db.total_calls()
+    rejected_before = POUR_LIMITER.stats()
+    t0 = time.perf_counter()
+    stop_at = t0 + args.seconds
+    while time.perf_counter() < stop_at:
+        session.step()
+    rejected_after = POUR_LIMITER.stats()
+    _send(
+        {
+            "latencies": rec.latencies,
+            "errors": rec.errors,
+            "first_error": rec.first_error,
+            "elapsed": time.perf_counter() - t0,
+            "backend_calls": db.total_calls() - calls_before,
+            "rss_mb": rss_mb(),
+            "pours_rejected": (rejected_after["rejected_device"] + rejected_after["rejected_global"])
+            - (rejected_before["rejected_device"] + rejected_before["rejected_global"]),
+        }
+    )
+
+
+def _spawn(n: int, seconds: float, args: argparse.Namespace, stderr) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "scripts.load_test", "--worker", str(n), "--seconds", str(seconds)]
+    cmd += ["--bottles", str(args.bottles), "--events", str(args.events)]
+    cmd += ["--backend-latency-ms", str(args.backend_latency_ms), "--seed", str(args.seed)]
+    return subprocess.Popen(
+        cmd, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True
+    )
+
+
+def run_level(sessions: int, seconds: float, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryFile("w+") as stderr:
+        procs = [_spawn(n, seconds, args, stderr) for n in range(sessions)]
+        started, setup_errors = [], []
+        for proc in procs:
+            msg = _receive(proc)
+            if msg and msg.get("ready"):
+                started.append(proc)
+            else:
+                setup_errors.append(msg["error"] if msg else f"worker exited with {proc.wait()}")
+
+        # Sessions start together once every worker is set up
+        for proc in started:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        results = [_receive(proc) for proc in started]
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+        if None in results:
+            stderr.seek(0)
+            setup_errors.append("worker exited mid-run: " + stderr.read()[-500:].strip())
+        results = [r for r in results if r]
+
+    lat = sorted(x for r in results for x in r["latencies"])
+    elapsed = max((r["elapsed"] for r in results), default=seconds)
+    errors = [r["first_error"] for r in results if r["errors"]]
+    return {
+        "sessions": sessions,
+        "reruns": len(lat),
+        "reruns_per_s": len(lat) / elapsed,
+        "p50_ms": percentile(lat, 50) * 1000,
+        "p95_ms": percentile(lat, 95) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000,
+        "backend_calls_per_s": sum(r["backend_calls"] for r in results) / elapsed,
+        "rss_mb": max((r["rss_mb"] for r in results), default=0.0),
+        "errors": sum(r["errors"] for r in results),
+        "first_error": errors[0] if errors else None,
+        "setup_failures": len(setup_errors),
+        "setup_error": setup_errors[0] if setup_errors else None,
+        "pours_rejected": sum(r["pours_rejected"] for r in results),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Concurrent-session load test against the in-memory backend.")
+    ap.add_argument("--levels", default="1,2,4,8,16", help="comma-separated concurrent session counts")
+    ap.add_argument("--seconds", type=float, default=20.0, help="measured duration per level")
+    ap.add_argument("--bottles", type=int, default=2000)
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--backend-latency-ms", type=float, default=20.0, help="simulated round trip per backend call")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return
+
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    header = (
+        f"{'sessions':>8} {'reruns':>7} {'rerun/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'calls/s':>8} {'RSS MB':>7} {'errors':>6} {'rejected':>8}"
+    )
+    print(f"bottles={args.bottles} events={args.events} backend latency={args.backend_latency_ms}ms")
+    print(header)
+    print("-" * len(header))
+    failed = False
+    for n in levels:
+        r = run_level(n, args.seconds, args)
+        if r["errors"] or r["setup_failures"]:
+            # Percentiles that include timeouts and crashes describe the harness, not the app
+            failed = True
+            print(f"{r['sessions']:>8} {r['reruns']:>7} FAILED: {r['errors']} rerun(s) errored", flush=True)
+            for reason in (r["first_error"], r["setup_error"]):
+                if reason:
+                    print(f"  {reason}")
+            if r["setup_failures"]:
+                print(f"  {r['setup_failures']} session(s) failed to start")
+            continue
+        print(
+            f"{r['sessions']:>8} {r['reruns']:>7} {r['reruns_per_s']:>8.1f} {r['p50_ms']:>8.0f} "
+            f"{r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['backend_calls_per_s']:>8.1f} "
+            f"{r['rss_mb']:>7.0f} {r['errors']:>6} {r['pours_rejected']:>8}",
+            flush=True,
+        )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# scripts/merge_bottles.py
+# Merge duplicate bottles into one: every pour and rollup of the losers moves to the winner.
+#
+# Run from the repo root (needs SUPABASE_SERVICE_KEY):
+#   python -m scripts.merge_bottles 42 57 311        # keep 42, fold in 57 and 311
+#
+# Interrupted merges can simply be re-run with the same arguments.
+from __future__ import annotations
+
+import argparse
+
+from lib.merge import MERGE_BATCH_SIZE, merge_bottles
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Merge duplicate bottles into one.")
+    ap.add_argument("winner", type=int, help="bottle id to keep")
+    ap.add_argument("losers", type=int, nargs="+", help="bottle ids to fold into the winner and delete")
+    ap.add_argument("--batch-size", type=int, default=MERGE_BATCH_SIZE)
+    args = ap.parse_args()
+
+    result = merge_bottles(
+        args.winner,
+        args.losers,
+        progress=lambda moved, total: print(f"  moved {moved:,} / ~{total:,} pours"),
+        batch_size=args.batch_size,
+    )
+    print(
+        f"Merge complete. Kept {result.winner}, removed {result.bottles_removed} bottle(s), "
+        f"moved {result.pours_moved:,} pours ({result.seconds:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
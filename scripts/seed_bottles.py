@@ -1,90 +1,71 @@
+# scripts/seed_bottles.py
+# Run from the repo root:
+#   python -m scripts.seed_bottles                                   # the bourbon workbook
+#   python -m scripts.seed_bottles --manifest sources.json           # several distributor lists
+#   python -m scripts.seed_bottles --manifest sources.json --dry-run # counts only, no writes
+#
+# Bottles already in the catalog (same label key) are skipped, so re-running is safe.
+# See lib/ingest.py and scripts/ingest_sources.example.json for the manifest format.
 from __future__ import annotations
 
-import os
+import argparse
+import time
 from pathlib import Path
 
-import pandas as pd
-import streamlit as st
-from supabase import create_client
+from lib.catalog import get_catalog, invalidate_catalog
+from lib.ingest import CHUNK_SIZE, SourceSpec, ingest, load_manifest
+from lib.supabase_client import get_admin_client
 
 EXCEL_PATH = Path(__file__).resolve().parents[1] / "data" / "bourbon_list.xlsx"
 SHEET_NAME = "250+ Bourbon Labels"
-CHUNK_SIZE = 200
 
-
-def _clean_str(x) -> str | None:
-    if x is None:
-        return None
-    s = str(x).strip()
-    return s if s else None
+DEFAULT_SOURCE = SourceSpec(
+    name="bourbon",
+    path=EXCEL_PATH,
+    sheet=SHEET_NAME,
+    columns={
+        "brand": "Brand / Label",
+        "expression": "Expression / Line",
+        "distillery": "Distillery (Production)",
+        "distillery_location": "Distillery Location",
+        "parent_company": "Parent Company / Owner",
+        "mashbill_style": "Mashbill Style",
+        "category": "Category (Core / Limited / Allocated / Craft / Sourced)",
+    },
+)
 
 
 def main() -> None:
-    if not EXCEL_PATH.exists():
-        raise FileNotFoundError(f"Excel file not found at: {EXCEL_PATH}")
-
-    service_key = os.environ.get("SUPABASE_SERVICE_KEY")
-    if not service_key:
-        raise RuntimeError("Missing SUPABASE_SERVICE_KEY env var. Set it in PowerShell before running.")
-
-    url = st.secrets["SUPABASE_URL"]
-    sb = create_client(url, service_key)
-
-    # Safety: prevent double seeding unless explicitly forced
-    existing = sb.table("bottles").select("id").limit(1).execute().data
-    if existing:
-        raise RuntimeError(
-            "bottles table already has rows. To avoid duplicates, aborting seed. "
-            "If you truly want to reseed, truncate the table in Supabase first."
-        )
-
-    df = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME)
-    df.columns = [str(c).strip() for c in df.columns]
-
-    records = []
-    for _, r in df.iterrows():
-        brand = _clean_str(r.get("Brand / Label"))
-        expression = _clean_str(r.get("Expression / Line"))
-        distillery = _clean_str(r.get("Distillery (Production)"))
-        distillery_location = _clean_str(r.get("Distillery Location"))
-        parent_company = _clean_str(r.get("Parent Company / Owner"))
-        mashbill_style = _clean_str(r.get("Mashbill Style"))
-        category = _clean_str(r.get("Category (Core / Limited / Allocated / Craft / Sourced)"))
-
-        if not brand:
-            continue
-
-        records.append(
-            {
-                "brand": brand,
-                "expression": expression,
-                "distillery": distillery,
-                "distillery_location": distillery_location,
-                "parent_company": parent_company,
-                "mashbill_style": mashbill_style,
-                "category": category,
-            }
-        )
-
-    # Dedupe to be safe (brand + expression + distillery)
-    dedup = {}
-    for rec in records:
-        key = (
-            (rec["brand"] or "").lower(),
-            (rec["expression"] or "").lower(),
-            (rec["distillery"] or "").lower(),
+    ap = argparse.ArgumentParser(description="Add bottles from distributor lists to the catalog.")
+    ap.add_argument("--manifest", type=Path, help="JSON list of sources (default: the bourbon workbook)")
+    ap.add_argument("--dry-run", action="store_true", help="report what would be inserted; write nothing")
+    ap.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = ap.parse_args()
+
+    sources = load_manifest(args.manifest) if args.manifest else [DEFAULT_SOURCE]
+    for s in sources:
+        if not s.path.exists():
+            raise FileNotFoundError(f"{s.name}: file not found at {s.path}")
+
+    sb = None
+    if not args.dry_run:
+        sb = get_admin_client()
+        if sb is None:
+            raise RuntimeError("Missing SUPABASE_SERVICE_KEY env var. Set it in PowerShell before running.")
+
+    t0 = time.perf_counter()
+    reports = ingest(sources, get_catalog(), sb=sb, dry_run=args.dry_run, chunk_size=args.chunk_size)
+    if not args.dry_run:
+        invalidate_catalog()
+
+    for r in reports:
+        print(
+            f"  {r.name}: read {r.read:,}, inserted {r.inserted:,}, already in catalog {r.in_catalog:,}, "
+            f"repeated {r.repeated:,}, no brand {r.skipped:,}"
         )
-        dedup[key] = rec
-
-    records = list(dedup.values())
-
-    inserted = 0
-    for i in range(0, len(records), CHUNK_SIZE):
-        chunk = records[i : i + CHUNK_SIZE]
-        sb.table("bottles").insert(chunk).execute()
-        inserted += len(chunk)
-
-    print(f"Seed complete. Inserted bottles: {inserted}")
+    verb = "Would insert" if args.dry_run else "Inserted"
+    total = sum(r.inserted for r in reports)
+    print(f"Seed complete. {verb} bottles: {total:,} ({time.perf_counter() - t0:.1f}s)")
 
 
 if __name__ == "__main__":
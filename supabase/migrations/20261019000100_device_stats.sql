@@ -0,0 +1,142 @@
+-- Per-device (drinker) aggregates, maintained by a trigger on events.
+--
+-- device_stats           one row per device: pour count, rating sum/count, first/last pour
+-- device_bottle_stats    one row per (device, bottle): powers My Stats and favorites
+-- device_category_stats  one row per (device, category): category mix
+-- drinker_leaderboard    public view without device tokens
+--
+-- Assumes bottles.id / events.bottle_id are bigint (Supabase default int8 identity).
+
+create table if not exists public.device_stats (
+  device_token   text primary key,
+  display_name   text,
+  pour_count     bigint not null default 0,
+  rated_count    bigint not null default 0,
+  rating_sum     double precision not null default 0,
+  first_pour_at  timestamptz,
+  last_pour_at   timestamptz,
+  updated_at     timestamptz not null default now()
+);
+
+create table if not exists public.device_bottle_stats (
+  device_token   text not null,
+  bottle_id      bigint not null,
+  pour_count     bigint not null default 0,
+  rated_count    bigint not null default 0,
+  rating_sum     double precision not null default 0,
+  last_pour_at   timestamptz,
+  primary key (device_token, bottle_id)
+);
+
+create table if not exists public.device_category_stats (
+  device_token   text not null,
+  category       text not null,
+  pour_count     bigint not null default 0,
+  primary key (device_token, category)
+);
+
+create index if not exists device_stats_pour_count_idx on public.device_stats (pour_count desc);
+
+
+create or replace function public.apply_event_to_device_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  is_rated int := case when new.rating is null then 0 else 1 end;
+  bottle_category text;
+begin
+  if new.author_device_token is null then
+    return new;
+  end if;
+
+  insert into device_stats as s
+    (device_token, display_name, pour_count, rated_count, rating_sum, first_pour_at, last_pour_at, updated_at)
+  values
+    (new.author_device_token, new.author_display_name, 1, is_rated, coalesce(new.rating, 0),
+     new.created_at, new.created_at, now())
+  on conflict (device_token) do update set
+    display_name  = coalesce(excluded.display_name, s.display_name),
+    pour_count    = s.pour_count + 1,
+    rated_count   = s.rated_count + excluded.rated_count,
+    rating_sum    = s.rating_sum + excluded.rating_sum,
+    first_pour_at = least(s.first_pour_at, excluded.first_pour_at),
+    last_pour_at  = greatest(s.last_pour_at, excluded.last_pour_at),
+    updated_at    = now();
+
+  if new.bottle_id is not null then
+    insert into device_bottle_stats as s
+      (device_token, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+    values
+      (new.author_device_token, new.bottle_id, 1, is_rated, coalesce(new.rating, 0), new.created_at)
+    on conflict (device_token, bottle_id) do update set
+      pour_count   = s.pour_count + 1,
+      rated_count  = s.rated_count + excluded.rated_count,
+      rating_sum   = s.rating_sum + excluded.rating_sum,
+      last_pour_at = greatest(s.last_pour_at, excluded.last_pour_at);
+
+    select nullif(trim(category), '') into bottle_category from bottles where id = new.bottle_id;
+    insert into device_category_stats as s (device_token, category, pour_count)
+    values (new.author_device_token, coalesce(bottle_category, 'Uncategorized'), 1)
+    on conflict (device_token, category) do update set
+      pour_count = s.pour_count + 1;
+  end if;
+
+  return new;
+end;
+$$;
+
+drop trigger if exists events_device_stats on public.events;
+create trigger events_device_stats
+  after insert on public.events
+  for each row execute function public.apply_event_to_device_stats();
+
+
+create or replace view public.drinker_leaderboard as
+select
+  md5(device_token)                                          as drinker_id,
+  coalesce(nullif(trim(display_name), ''), 'Someone')        as display_name,
+  pour_count,
+  rated_count,
+  case when rated_count > 0 then rating_sum / rated_count end as avg_rating,
+  first_pour_at,
+  last_pour_at
+from public.device_stats;
+
+
+-- Backfill from existing events (run once; the trigger keeps things current after)
+insert into public.device_stats
+  (device_token, display_name, pour_count, rated_count, rating_sum, first_pour_at, last_pour_at)
+select
+  author_device_token,
+  (array_agg(author_display_name order by created_at desc) filter (where author_display_name is not null))[1],
+  count(*),
+  count(rating),
+  coalesce(sum(rating), 0),
+  min(created_at),
+  max(created_at)
+from public.events
+where author_device_token is not null
+group by author_device_token
+on conflict (device_token) do nothing;
+
+insert into public.device_bottle_stats
+  (device_token, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+select author_device_token, bottle_id, count(*), count(rating), coalesce(sum(rating), 0), max(created_at)
+from public.events
+where author_device_token is not null and bottle_id is not null
+group by author_device_token, bottle_id
+on conflict (device_token, bottle_id) do nothing;
+
+insert into public.device_category_stats (device_token, category, pour_count)
+select e.author_device_token, coalesce(nullif(trim(b.category), ''), 'Uncategorized'), count(*)
+from public.events e
+join public.bottles b on b.id = e.bottle_id
+where e.author_device_token is not null
+group by 1, 2
+on conflict (device_token, category) do nothing;
+
+grant select on public.device_stats, public.device_bottle_stats, public.device_category_stats to anon, authenticated;
+grant select on public.drinker_leaderboard to anon, authenticated;
@@ -0,0 +1,60 @@
+-- Catalog versioning: one tiny row that changes whenever bottles change.
+--
+-- catalog_version        single row: version (bumped on every bottles insert/update/delete)
+--                        and row_count
+-- bottles.row_version    the catalog version that last wrote the row, so clients can
+--                        fetch only rows with row_version > the version they hold
+--
+-- The bump happens in a BEFORE trigger that updates catalog_version first. That row lock
+-- is held until commit, so bottles writers serialize and row_version order matches
+-- commit order: a client that has seen version V has seen every row_version <= V.
+
+create table if not exists public.catalog_version (
+  id         boolean primary key default true check (id),
+  version    bigint not null default 0,
+  row_count  bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+alter table public.bottles add column if not exists row_version bigint not null default 0;
+create index if not exists bottles_row_version_idx on public.bottles (row_version);
+
+create or replace function public.bump_catalog_version()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v bigint;
+begin
+  update public.catalog_version
+     set version = version + 1,
+         row_count = row_count + case tg_op when 'INSERT' then 1 when 'DELETE' then -1 else 0 end,
+         updated_at = now()
+   where id
+  returning version into v;
+
+  if tg_op = 'DELETE' then
+    return old;
+  end if;
+  new.row_version := v;
+  return new;
+end;
+$$;
+
+drop trigger if exists bottles_bump_catalog_version on public.bottles;
+create trigger bottles_bump_catalog_version
+  before insert or update or delete on public.bottles
+  for each row execute function public.bump_catalog_version();
+
+-- Backfill: every existing row belongs to version 1
+insert into public.catalog_version (id, version, row_count)
+select true, 1, count(*) from public.bottles
+on conflict (id) do update set version = excluded.version, row_count = excluded.row_count, updated_at = now();
+
+alter table public.bottles disable trigger bottles_bump_catalog_version;
+update public.bottles set row_version = 1;
+alter table public.bottles enable trigger bottles_bump_catalog_version;
+
+grant select on public.catalog_version to anon, authenticated;
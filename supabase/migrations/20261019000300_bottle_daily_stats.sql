@@ -0,0 +1,60 @@
+-- Per-bottle daily aggregates for trend charts, maintained by a trigger on events.
+--
+-- bottle_daily_stats   one row per (bottle, UTC day): pour count, rating sum/count
+--
+-- Charts read these rows and downsample them to a fixed number of points, so the
+-- payload depends on the date range, not on how many pours a bottle has.
+
+create table if not exists public.bottle_daily_stats (
+  bottle_id    bigint not null,
+  day          date not null,
+  pour_count   bigint not null default 0,
+  rated_count  bigint not null default 0,
+  rating_sum   double precision not null default 0,
+  primary key (bottle_id, day)
+);
+
+create index if not exists bottle_daily_stats_day_idx on public.bottle_daily_stats (day);
+
+create or replace function public.apply_event_to_bottle_daily_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  if new.bottle_id is null then
+    return new;
+  end if;
+
+  insert into bottle_daily_stats as s (bottle_id, day, pour_count, rated_count, rating_sum)
+  values (
+    new.bottle_id,
+    (new.created_at at time zone 'utc')::date,
+    1,
+    case when new.rating is null then 0 else 1 end,
+    coalesce(new.rating, 0)
+  )
+  on conflict (bottle_id, day) do update set
+    pour_count  = s.pour_count + 1,
+    rated_count = s.rated_count + excluded.rated_count,
+    rating_sum  = s.rating_sum + excluded.rating_sum;
+
+  return new;
+end;
+$$;
+
+drop trigger if exists events_bottle_daily_stats on public.events;
+create trigger events_bottle_daily_stats
+  after insert on public.events
+  for each row execute function public.apply_event_to_bottle_daily_stats();
+
+-- Backfill from existing events
+insert into public.bottle_daily_stats (bottle_id, day, pour_count, rated_count, rating_sum)
+select bottle_id, (created_at at time zone 'utc')::date, count(*), count(rating), coalesce(sum(rating), 0)
+from public.events
+where bottle_id is not null
+group by 1, 2
+on conflict (bottle_id, day) do nothing;
+
+grant select on public.bottle_daily_stats to anon, authenticated;
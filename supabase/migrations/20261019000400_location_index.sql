@@ -0,0 +1,147 @@
+-- Location index: canonical keys for the free-text events.location.
+--
+-- normalize_location(text)   lower-case, punctuation to spaces, leading "the " dropped;
+--                            mirrored by lib/locations.py normalize_location()
+-- events.location_key        normalized full location ("barrel house louisville")
+-- events.city_key            normalized text after the last comma ("louisville"), if any
+-- locations                  one row per (kind, key): display label and pour count
+-- location_bottle_stats      one row per (kind, key, bottle): powers "what's good here"
+--
+-- Location filters use these keys (btree) instead of ilike over events.location.
+
+create or replace function public.normalize_location(raw text)
+returns text
+language sql
+immutable
+as $$
+  select nullif(
+    regexp_replace(
+      trim(regexp_replace(regexp_replace(lower(coalesce(raw, '')), '[^a-z0-9]+', ' ', 'g'), '\s+', ' ', 'g')),
+      '^the ', ''
+    ),
+    ''
+  );
+$$;
+
+create or replace function public.city_of_location(raw text)
+returns text
+language sql
+immutable
+as $$
+  select case when position(',' in coalesce(raw, '')) > 0
+              then public.normalize_location(regexp_replace(raw, '^.*,', ''))
+         end;
+$$;
+
+alter table public.events add column if not exists location_key text;
+alter table public.events add column if not exists city_key text;
+create index if not exists events_location_key_idx on public.events (location_key, created_at) where location_key is not null;
+create index if not exists events_city_key_idx on public.events (city_key, created_at) where city_key is not null;
+
+create table if not exists public.locations (
+  kind          text not null check (kind in ('place', 'city')),
+  location_key  text not null,
+  label         text,
+  pour_count    bigint not null default 0,
+  last_pour_at  timestamptz,
+  primary key (kind, location_key)
+);
+
+create index if not exists locations_pour_count_idx on public.locations (pour_count desc);
+
+create table if not exists public.location_bottle_stats (
+  kind          text not null,
+  location_key  text not null,
+  bottle_id     bigint not null,
+  pour_count    bigint not null default 0,
+  rated_count   bigint not null default 0,
+  rating_sum    double precision not null default 0,
+  last_pour_at  timestamptz,
+  primary key (kind, location_key, bottle_id)
+);
+
+create or replace function public.stamp_event_location_keys()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.location_key := public.normalize_location(new.location);
+  new.city_key := public.city_of_location(new.location);
+  if new.city_key = new.location_key then
+    new.city_key := null;
+  end if;
+  return new;
+end;
+$$;
+
+create or replace function public.apply_event_to_location_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  k record;
+  is_rated int := case when new.rating is null then 0 else 1 end;
+begin
+  for k in
+    select 'place' as kind, new.location_key as key, trim(new.location) as label where new.location_key is not null
+    union all
+    select 'city', new.city_key, trim(regexp_replace(new.location, '^.*,', '')) where new.city_key is not null
+  loop
+    insert into locations as l (kind, location_key, label, pour_count, last_pour_at)
+    values (k.kind, k.key, k.label, 1, new.created_at)
+    on conflict (kind, location_key) do update set
+      label        = excluded.label,
+      pour_count   = l.pour_count + 1,
+      last_pour_at = greatest(l.last_pour_at, excluded.last_pour_at);
+
+    if new.bottle_id is not null then
+      insert into location_bottle_stats as s
+        (kind, location_key, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+      values (k.kind, k.key, new.bottle_id, 1, is_rated, coalesce(new.rating, 0), new.created_at)
+      on conflict (kind, location_key, bottle_id) do update set
+        pour_count   = s.pour_count + 1,
+        rated_count  = s.rated_count + excluded.rated_count,
+        rating_sum   = s.rating_sum + excluded.rating_sum,
+        last_pour_at = greatest(s.last_pour_at, excluded.last_pour_at);
+    end if;
+  end loop;
+
+  return new;
+end;
+$$;
+
+drop trigger if exists events_stamp_location_keys on public.events;
+create trigger events_stamp_location_keys
+  before insert or update of location on public.events
+  for each row execute function public.stamp_event_location_keys();
+
+drop trigger if exists events_location_stats on public.events;
+create trigger events_location_stats
+  after insert on public.events
+  for each row execute function public.apply_event_to_location_stats();
+
+-- Backfill
+update public.events
+   set location_key = public.normalize_location(location),
+       city_key = nullif(public.city_of_location(location), public.normalize_location(location))
+ where location is not null;
+
+insert into public.locations (kind, location_key, label, pour_count, last_pour_at)
+select 'place', location_key, max(trim(location)), count(*), max(created_at)
+from public.events where location_key is not null group by location_key
+union all
+select 'city', city_key, max(trim(regexp_replace(location, '^.*,', ''))), count(*), max(created_at)
+from public.events where city_key is not null group by city_key
+on conflict (kind, location_key) do nothing;
+
+insert into public.location_bottle_stats (kind, location_key, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+select 'place', location_key, bottle_id, count(*), count(rating), coalesce(sum(rating), 0), max(created_at)
+from public.events where location_key is not null and bottle_id is not null group by location_key, bottle_id
+union all
+select 'city', city_key, bottle_id, count(*), count(rating), coalesce(sum(rating), 0), max(created_at)
+from public.events where city_key is not null and bottle_id is not null group by city_key, bottle_id
+on conflict (kind, location_key, bottle_id) do nothing;
+
+grant select on public.locations, public.location_bottle_stats to anon, authenticated;
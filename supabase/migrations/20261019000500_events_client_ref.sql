@@ -0,0 +1,5 @@
+-- Client-generated reference per pour, so the write-behind queue can retry inserts
+-- without double-posting: the queue upserts on client_ref and ignores duplicates.
+
+alter table public.events add column if not exists client_ref text;
+create unique index if not exists events_client_ref_key on public.events (client_ref);
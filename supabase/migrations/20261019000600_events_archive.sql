@@ -0,0 +1,86 @@
+-- Hot/cold split for events.
+--
+-- events_archive          cold store: events older than the archive horizon, moved
+--                         out of public.events (no app-facing indexes beyond created_at)
+-- bottle_rating_archive   one row per bottle: rating rollup of everything archived,
+--                         added to the hot scan for all-time rankings
+-- archive_events()        moves one batch of old events; run repeatedly by
+--                         scripts/archive_events.py until it returns 0. through_id caps
+--                         the batch at the Parquet exporter's cursor, so nothing is
+--                         archived before scripts/export_snapshots.py has copied it
+--
+-- The aggregate triggers (device_stats, bottle_daily_stats, location stats) fire on
+-- insert only, so deleting archived rows from events leaves those rollups intact.
+-- The horizon must stay longer than the longest finite Rankings window (90 days):
+-- windowed rankings scan the hot table only.
+-- A migration that adds a column to events must add it to events_archive too.
+
+create table if not exists public.events_archive (like public.events including defaults);
+alter table public.events_archive add column if not exists archived_at timestamptz not null default now();
+create index if not exists events_archive_created_at_idx on public.events_archive (created_at, id);
+
+create table if not exists public.bottle_rating_archive (
+  bottle_id     bigint primary key,
+  pour_count    bigint not null default 0,
+  rated_count   bigint not null default 0,
+  rating_sum    double precision not null default 0,
+  rating_sumsq  double precision not null default 0,
+  archived_through timestamptz
+);
+
+drop function if exists public.archive_events(int, int);
+create or replace function public.archive_events(
+  horizon_days int default 180,
+  batch_size int default 5000,
+  through_id bigint default null
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  moved_count int;
+begin
+  if horizon_days < 91 then
+    raise exception 'archive horizon must exceed the 90-day rankings window (got % days)', horizon_days;
+  end if;
+
+  with batch as (
+    select id from events
+    where created_at < now() - make_interval(days => horizon_days)
+      and (through_id is null or id <= through_id)
+    order by created_at, id
+    limit batch_size
+    for update skip locked
+  ),
+  moved as (
+    delete from events e using batch b where e.id = b.id
+    returning e.*
+  ),
+  copied as (
+    insert into events_archive select * from moved
+  ),
+  rollup as (
+    insert into bottle_rating_archive as s
+      (bottle_id, pour_count, rated_count, rating_sum, rating_sumsq, archived_through)
+    select bottle_id, count(*), count(rating), coalesce(sum(rating), 0), coalesce(sum(rating * rating), 0),
+           max(created_at)
+    from moved
+    where bottle_id is not null
+    group by bottle_id
+    on conflict (bottle_id) do update set
+      pour_count       = s.pour_count + excluded.pour_count,
+      rated_count      = s.rated_count + excluded.rated_count,
+      rating_sum       = s.rating_sum + excluded.rating_sum,
+      rating_sumsq     = s.rating_sumsq + excluded.rating_sumsq,
+      archived_through = greatest(s.archived_through, excluded.archived_through)
+  )
+  select count(*) into moved_count from moved;
+
+  return moved_count;
+end;
+$$;
+
+revoke all on function public.archive_events(int, int, bigint) from public, anon, authenticated;
+grant select on public.bottle_rating_archive to anon, authenticated;
@@ -0,0 +1,164 @@
+-- Merge duplicate bottles into one (driven by lib/merge.py).
+--
+-- merge_bottle_events(winner, losers, batch_size)
+--     re-points up to batch_size events (hot, then archived) from the losers to the
+--     winner and returns how many; the caller repeats until it returns 0, so no single
+--     transaction holds locks on tens of thousands of rows
+-- finish_bottle_merge(winner, losers)
+--     re-points stragglers posted meanwhile, adds the losers' rollup rows into the
+--     winner's (no recompute from events), and deletes the loser bottles
+--
+-- The aggregate triggers fire on insert only, so re-pointing events does not touch
+-- the rollups; finish_bottle_merge moves them arithmetically instead.
+--
+-- bottle_merges keeps loser -> winner for every merged-away id, so Parquet snapshots
+-- exported before a merge (scripts/export_snapshots.py) can re-point their pours.
+
+create index if not exists events_bottle_id_idx on public.events (bottle_id, created_at);
+create index if not exists events_archive_bottle_id_idx on public.events_archive (bottle_id);
+
+create table if not exists public.bottle_merges (
+  loser_id   bigint primary key,
+  winner_id  bigint not null,
+  merged_at  timestamptz not null default now()
+);
+
+create or replace function public.merge_bottle_events(winner bigint, losers bigint[], batch_size int default 5000)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  n int;
+  m int := 0;
+begin
+  if winner = any(losers) then
+    raise exception 'winner % is also listed as a loser', winner;
+  end if;
+
+  with batch as (
+    select id from events where bottle_id = any(losers) limit batch_size for update skip locked
+  )
+  update events e set bottle_id = winner from batch b where e.id = b.id;
+  get diagnostics n = row_count;
+
+  if n < batch_size then
+    with batch as (
+      select id from events_archive where bottle_id = any(losers) limit batch_size - n for update skip locked
+    )
+    update events_archive e set bottle_id = winner from batch b where e.id = b.id;
+    get diagnostics m = row_count;
+  end if;
+
+  return n + m;
+end;
+$$;
+
+create or replace function public.finish_bottle_merge(winner bigint, losers bigint[])
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  winner_category text;
+  removed int;
+begin
+  if winner = any(losers) then
+    raise exception 'winner % is also listed as a loser', winner;
+  end if;
+  select coalesce(nullif(trim(category), ''), 'Uncategorized') into winner_category
+    from bottles where id = winner for update;
+  if not found then
+    raise exception 'winner bottle % not found', winner;
+  end if;
+
+  -- Pours posted to a loser after the last batch
+  update events set bottle_id = winner where bottle_id = any(losers);
+  update events_archive set bottle_id = winner where bottle_id = any(losers);
+
+  -- Category mix: the losers' pours now count under the winner's category
+  update device_category_stats s set pour_count = s.pour_count - m.n
+    from (
+      select d.device_token, coalesce(nullif(trim(b.category), ''), 'Uncategorized') as category, sum(d.pour_count) as n
+      from device_bottle_stats d join bottles b on b.id = d.bottle_id
+      where d.bottle_id = any(losers)
+      group by 1, 2
+    ) m
+   where s.device_token = m.device_token and s.category = m.category;
+
+  insert into device_category_stats as s (device_token, category, pour_count)
+  select device_token, winner_category, sum(pour_count)
+  from device_bottle_stats
+  where bottle_id = any(losers)
+  group by device_token
+  on conflict (device_token, category) do update set
+    pour_count = s.pour_count + excluded.pour_count;
+
+  delete from device_category_stats where pour_count <= 0;
+
+  insert into device_bottle_stats as s (device_token, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+  select device_token, winner, sum(pour_count), sum(rated_count), sum(rating_sum), max(last_pour_at)
+  from device_bottle_stats
+  where bottle_id = any(losers)
+  group by device_token
+  on conflict (device_token, bottle_id) do update set
+    pour_count   = s.pour_count + excluded.pour_count,
+    rated_count  = s.rated_count + excluded.rated_count,
+    rating_sum   = s.rating_sum + excluded.rating_sum,
+    last_pour_at = greatest(s.last_pour_at, excluded.last_pour_at);
+  delete from device_bottle_stats where bottle_id = any(losers);
+
+  insert into bottle_daily_stats as s (bottle_id, day, pour_count, rated_count, rating_sum)
+  select winner, day, sum(pour_count), sum(rated_count), sum(rating_sum)
+  from bottle_daily_stats
+  where bottle_id = any(losers)
+  group by day
+  on conflict (bottle_id, day) do update set
+    pour_count  = s.pour_count + excluded.pour_count,
+    rated_count = s.rated_count + excluded.rated_count,
+    rating_sum  = s.rating_sum + excluded.rating_sum;
+  delete from bottle_daily_stats where bottle_id = any(losers);
+
+  insert into location_bottle_stats as s (kind, location_key, bottle_id, pour_count, rated_count, rating_sum, last_pour_at)
+  select kind, location_key, winner, sum(pour_count), sum(rated_count), sum(rating_sum), max(last_pour_at)
+  from location_bottle_stats
+  where bottle_id = any(losers)
+  group by kind, location_key
+  on conflict (kind, location_key, bottle_id) do update set
+    pour_count   = s.pour_count + excluded.pour_count,
+    rated_count  = s.rated_count + excluded.rated_count,
+    rating_sum   = s.rating_sum + excluded.rating_sum,
+    last_pour_at = greatest(s.last_pour_at, excluded.last_pour_at);
+  delete from location_bottle_stats where bottle_id = any(losers);
+
+  insert into bottle_rating_archive as s (bottle_id, pour_count, rated_count, rating_sum, rating_sumsq, archived_through)
+  select winner, sum(pour_count), sum(rated_count), sum(rating_sum), sum(rating_sumsq), max(archived_through)
+  from bottle_rating_archive
+  where bottle_id = any(losers)
+  having count(*) > 0
+  on conflict (bottle_id) do update set
+    pour_count       = s.pour_count + excluded.pour_count,
+    rated_count      = s.rated_count + excluded.rated_count,
+    rating_sum       = s.rating_sum + excluded.rating_sum,
+    rating_sumsq     = s.rating_sumsq + excluded.rating_sumsq,
+    archived_through = greatest(s.archived_through, excluded.archived_through);
+  delete from bottle_rating_archive where bottle_id = any(losers);
+
+  -- Earlier merges into a loser now point at the winner, so the map never chains
+  update bottle_merges set winner_id = winner, merged_at = now() where winner_id = any(losers);
+  insert into bottle_merges (loser_id, winner_id)
+  select unnest(losers), winner
+  on conflict (loser_id) do update set winner_id = excluded.winner_id, merged_at = now();
+
+  -- Bumps catalog_version (and row_count), so clients refetch the catalog
+  delete from bottles where id = any(losers);
+  get diagnostics removed = row_count;
+  return removed;
+end;
+$$;
+
+revoke all on function public.merge_bottle_events(bigint, bigint[], int) from public, anon, authenticated;
+revoke all on function public.finish_bottle_merge(bigint, bigint[]) from public, anon, authenticated;
+grant select on public.bottle_merges to anon, authenticated;
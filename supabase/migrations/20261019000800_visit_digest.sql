@@ -0,0 +1,16 @@
+-- Indexes behind the "since your last visit" digest (lib/digest.py).
+--
+-- The digest reads forward from a device's previous device_sessions.last_seen_at:
+--   events    head count of created_at > cursor
+--   bottles   rows created after the cursor (created_at is added if the table lacks it;
+--             existing rows stay NULL, so they never count as new; only bottles
+--             inserted after this migration get now())
+-- bottle_daily_stats already has its day index for the per-bottle sums.
+
+create index if not exists events_created_at_idx on public.events (created_at);
+
+-- Nullable and without a default while it is added, so existing rows are not stamped
+-- with the migration time (which would list the whole catalog as "new" for 30 days)
+alter table public.bottles add column if not exists created_at timestamptz;
+alter table public.bottles alter column created_at set default now();
+create index if not exists bottles_created_at_idx on public.bottles (created_at);
@@ -0,0 +1,35 @@
+-- Keep device tokens private.
+--
+-- device_token is the only credential a drinker has, so the per-device tables must not
+-- be readable by anon: a plain select would list every token. Reads go through
+-- device_stats_for(token), which returns only the rows of the token it is given
+-- (one round trip for My Stats). drinker_leaderboard keeps working without the grant:
+-- a view reads its tables with its owner's privileges and exposes only md5(token).
+
+revoke select on public.device_stats, public.device_bottle_stats, public.device_category_stats
+  from anon, authenticated;
+
+create or replace function public.device_stats_for(token text)
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select json_build_object(
+    'bottles', coalesce(
+      (select json_agg(json_build_object(
+                'bottle_id', bottle_id, 'pour_count', pour_count,
+                'rated_count', rated_count, 'rating_sum', rating_sum))
+         from device_bottle_stats where device_token = token),
+      '[]'::json),
+    'categories', coalesce(
+      (select json_agg(json_build_object('category', category, 'pour_count', pour_count)
+                       order by pour_count desc)
+         from device_category_stats where device_token = token),
+      '[]'::json)
+  );
+$$;
+
+revoke all on function public.device_stats_for(text) from public;
+grant execute on function public.device_stats_for(text) to anon, authenticated;